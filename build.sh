@@ -1,6 +1,11 @@
 #!/bin/bash
 set -o errexit
 
+# Refuse to start on a configuration that would serve stale data (e.g. a per-process cache
+# with several workers, see core/checks.py); security warnings are reported but not fatal
+echo "Checking deployment settings..."
+python manage.py check --deploy --fail-level ERROR
+
 # Apply database migrations
 echo "Applying database migrations..."
 python manage.py migrate
@@ -9,6 +14,21 @@ python manage.py migrate
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
-# Start Gunicorn
+# Start the background job worker (AI generation) alongside the web server
+echo "Starting job worker..."
+python manage.py run_jobs &
+
+# APP_SERVER=asgi serves the ASGI app with uvicorn, so the async AI views wait on the event
+# loop instead of holding workers; the default is Gunicorn with WSGI. Both read WEB_CONCURRENCY.
+if [ "${APP_SERVER:-wsgi}" = "asgi" ]; then
+    echo "Starting Uvicorn (ASGI)..."
+    # Persistent DB connections are per thread, and ASGI runs each request's sync code in a fresh one
+    export CONN_MAX_AGE="${CONN_MAX_AGE:-0}"
+    exec uvicorn prep_cbt.asgi:application --host 0.0.0.0 --port 8000 \
+        --proxy-headers --forwarded-allow-ips='*' --no-access-log --timeout-keep-alive 5
+fi
+
+# Start Gunicorn. --preload imports and warms the app once in the master (core.startup), so
+# forked workers start warm and share the loaded code copy-on-write.
 echo "Starting Gunicorn..."
-exec gunicorn --bind 0.0.0.0:8000 prep_cbt.wsgi:application
+exec gunicorn --preload --bind 0.0.0.0:8000 prep_cbt.wsgi:application
@@ -0,0 +1,233 @@
+"""
+Content-addressed cache for AI responses with single-flight de-duplication.
+
+Responses are keyed by a SHA-256 of the endpoint and prompt and kept in a
+size-bounded, TTL'd process-local LRU plus the shared Django cache. When
+several callers ask for the same uncached prompt at once, only one of them
+calls Gemini: threads in the same process wait on the leader's result, and
+other processes wait on a short-lived lock key in the shared cache until the
+leader stores the response. Errors are shared with waiting callers but never
+cached, so the next request tries again. acached_call is the same for async
+callers: coroutines on one event loop share the leader's task, and the
+cross-process lock is honoured without blocking the loop.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+from .answer_cache import LRUCache
+
+RESPONSE_KEY = 'ai:response:{digest}'
+LOCK_KEY = 'ai:lock:{digest}'
+
+_stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'coalesced': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+    metrics.record_cache('ai', name)
+
+
+def _ttl():
+    return getattr(settings, 'AI_CACHE_TTL', 7 * 24 * 60 * 60)
+
+
+_local = LRUCache(getattr(settings, 'AI_CACHE_LOCAL_SIZE', 256), ttl=_ttl())
+
+
+def prompt_digest(prompt, namespace=''):
+    return hashlib.sha256(f"{namespace}\n{prompt}".encode('utf-8')).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+class SingleFlight:
+    """Runs fn once per key among concurrent callers in this process; the rest share its result."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            _count('coalesced')
+            call.event.wait()
+            return call.result
+
+        try:
+            call.result = fn()
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+
+_flight = SingleFlight()
+
+
+def _wait_for_other_process(response_key, lock_key, timeout):
+    """Polls the shared cache while another process holds the lock. Returns the text or None."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        text = cache.get(response_key)
+        if text is not None:
+            return text
+        if cache.get(lock_key) is None:
+            # Leader finished without storing anything (it failed)
+            return None
+        time.sleep(0.1)
+    return None
+
+
+def cached_call(prompt, fn, namespace=''):
+    """
+    Returns (text, error) for prompt, calling fn(prompt) -> (text, error)
+    only on a cache miss and at most once across concurrent callers.
+    """
+    digest = prompt_digest(prompt, namespace)
+    text = _local.get(digest)
+    if text is not None:
+        _count('local_hits')
+        return text, None
+
+    response_key = RESPONSE_KEY.format(digest=digest)
+    lock_key = LOCK_KEY.format(digest=digest)
+
+    def load():
+        text = cache.get(response_key)
+        if text is not None:
+            _count('shared_hits')
+            _local.set(digest, text)
+            return text, None
+
+        lock_timeout = getattr(settings, 'AI_CACHE_LOCK_TIMEOUT', 60)
+        have_lock = cache.add(lock_key, 1, timeout=lock_timeout)
+        if not have_lock:
+            text = _wait_for_other_process(response_key, lock_key, lock_timeout)
+            if text is not None:
+                _count('coalesced')
+                _local.set(digest, text)
+                return text, None
+
+        _count('misses')
+        try:
+            text, error = fn(prompt)
+            if not error and text is not None:
+                cache.set(response_key, text, timeout=_ttl())
+                _local.set(digest, text)
+            return text, error
+        finally:
+            if have_lock:
+                cache.delete(lock_key)
+
+    return _flight.do(digest, load)
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines: one task per key and event loop, awaited by every caller."""
+
+    def __init__(self):
+        self._tasks = weakref.WeakKeyDictionary()  # loop -> {key: task}
+
+    async def do(self, key, coro_fn):
+        tasks = self._tasks.setdefault(asyncio.get_running_loop(), {})
+        task = tasks.get(key)
+        if task is not None:
+            _count('coalesced')
+        else:
+            task = tasks[key] = asyncio.ensure_future(coro_fn())
+            task.add_done_callback(lambda _: tasks.pop(key, None))
+        # shield: a cancelled caller (client went away) must not cancel the shared call
+        return await asyncio.shield(task)
+
+
+_async_flight = AsyncSingleFlight()
+
+
+async def _await_other_process(response_key, lock_key, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        text = await cache.aget(response_key)
+        if text is not None:
+            return text
+        if await cache.aget(lock_key) is None:
+            return None
+        await asyncio.sleep(0.1)
+    return None
+
+
+async def acached_call(prompt, afn, namespace=''):
+    """
+    Async cached_call: returns (text, error) for prompt, awaiting
+    afn(prompt) -> (text, error) only on a miss, once across concurrent callers.
+    """
+    digest = prompt_digest(prompt, namespace)
+    text = _local.get(digest)
+    if text is not None:
+        _count('local_hits')
+        return text, None
+
+    response_key = RESPONSE_KEY.format(digest=digest)
+    lock_key = LOCK_KEY.format(digest=digest)
+
+    async def load():
+        text = await cache.aget(response_key)
+        if text is not None:
+            _count('shared_hits')
+            _local.set(digest, text)
+            return text, None
+
+        lock_timeout = getattr(settings, 'AI_CACHE_LOCK_TIMEOUT', 60)
+        have_lock = await cache.aadd(lock_key, 1, timeout=lock_timeout)
+        if not have_lock:
+            text = await _await_other_process(response_key, lock_key, lock_timeout)
+            if text is not None:
+                _count('coalesced')
+                _local.set(digest, text)
+                return text, None
+
+        _count('misses')
+        try:
+            text, error = await afn(prompt)
+            if not error and text is not None:
+                await cache.aset(response_key, text, timeout=_ttl())
+                _local.set(digest, text)
+            return text, error
+        finally:
+            if have_lock:
+                await cache.adelete(lock_key)
+
+    return await _async_flight.do(digest, load)
+
+
+def cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['local_size'] = len(_local)
+    return stats
+
+
+def reset_local_cache():
+    _local.clear()
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
@@ -0,0 +1,443 @@
+"""
+Reusable HTTP client for the Gemini API.
+
+One GeminiClient per process keeps a pooled keep-alive requests.Session,
+retries 429/5xx and connection errors with jittered exponential backoff,
+and trips a circuit breaker after repeated failures so callers fail fast
+instead of each waiting out the full timeout while the upstream is down.
+AsyncGeminiClient does the same on asyncio (httpx) for the async views,
+with a semaphore bounding the calls in flight. There is one per process,
+living on its own event loop thread (see agenerate_text), so its pool,
+breaker and semaphore are shared by every request, ASGI or WSGI alike.
+It has no Django model imports, so standalone scripts can use it directly.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import random
+import ssl
+import threading
+import time
+from collections import deque
+
+import requests
+from django.core.exceptions import ImproperlyConfigured
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent"
+GEMINI_MODELS_URL = "https://generativelanguage.googleapis.com/v1beta/models"
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after failure_threshold consecutive failed calls.
+    While open every call is refused until reset_timeout has passed, then a
+    single trial call is let through (half-open); its outcome closes or
+    re-opens the circuit.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning("Gemini circuit opened after %s failure(s)", self.failures)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class _BaseClient:
+    """Settings, breaker, metrics and backoff shared by the sync and async clients."""
+
+    def __init__(self, api_key, url=GEMINI_API_URL, connect_timeout=5.0, read_timeout=30.0,
+                 max_retries=2, backoff_base=0.5, backoff_max=8.0, pool_size=10,
+                 failure_threshold=5, reset_timeout=30.0):
+        self.api_key = api_key
+        self.url = url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_size = pool_size
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        # Header rather than ?key= so the key never shows up in logged URLs or errors
+        self.headers = {'x-goog-api-key': api_key or ''}
+
+        self._latencies = deque(maxlen=1000)
+        self._counters = {'calls': 0, 'failures': 0, 'retries': 0, 'short_circuited': 0}
+        self._metrics_lock = threading.Lock()
+
+    def _count(self, name, latency=None):
+        with self._metrics_lock:
+            self._counters[name] += 1
+            if latency is not None:
+                self._latencies.append(latency)
+        if name == 'calls' and latency is not None:
+            metrics.record_ai_call(latency)
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        # Full jitter: spreads retries from many workers instead of synchronising them
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    @staticmethod
+    def _retry_after(response):
+        try:
+            return float(response.headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            return None
+
+    def metrics(self):
+        """Call counters plus latency percentiles (seconds) over the last 1000 calls."""
+        with self._metrics_lock:
+            data = dict(self._counters)
+            latencies = sorted(self._latencies)
+        data['circuit'] = self.breaker.state
+        if latencies:
+            def pct(p):
+                return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+            data.update(
+                latency_avg=sum(latencies) / len(latencies),
+                latency_p50=pct(0.50),
+                latency_p95=pct(0.95),
+                latency_max=latencies[-1],
+            )
+        return data
+
+    @staticmethod
+    def _payload(prompt):
+        return {
+            "contents": [{
+                "parts": [{"text": prompt}]
+            }]
+        }
+
+    @staticmethod
+    def _extract_text(result, body):
+        try:
+            return result['candidates'][0]['content']['parts'][0]['text'], None
+        except (TypeError, KeyError, IndexError):
+            msg = f"Unexpected API response structure: {body}"
+            logger.error(msg)
+            return None, msg
+
+    def _missing_key(self):
+        if self.api_key:
+            return None
+        msg = "GOOGLE_API_KEY is not set."
+        logger.error(msg)
+        return msg
+
+
+class GeminiClient(_BaseClient):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timeout = (self.connect_timeout, self.read_timeout)
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        # Retries are handled here (with backoff and the breaker), not by urllib3
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        """
+        Sends a request with retries, backoff and the circuit breaker.
+        Returns (response, error_message); response is only set on HTTP 200.
+        """
+        if not self.breaker.allow():
+            self._count('short_circuited')
+            return None, "Gemini API is temporarily unavailable (circuit open)."
+
+        error = None
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except requests.exceptions.RequestException as e:
+                latency = time.perf_counter() - started
+                error = f"Gemini API Request Error: {e}"
+            else:
+                latency = time.perf_counter() - started
+                if response.status_code == 200:
+                    self._count('calls', latency)
+                    self.breaker.record_success()
+                    logger.debug("Gemini %s %s in %.0fms", method, response.status_code, latency * 1000)
+                    return response, None
+
+                error = f"Gemini API Error: Status {response.status_code} - Body: {response.text}"
+                if response.status_code not in RETRYABLE_STATUS:
+                    # The upstream answered; a bad request is not an outage
+                    self._count('calls', latency)
+                    self.breaker.record_success()
+                    logger.error(error)
+                    return None, error
+                retry_after = self._retry_after(response)
+
+            self._count('calls', latency)
+            if attempt < self.max_retries:
+                self._count('retries')
+                time.sleep(self._backoff(attempt, retry_after))
+
+        self._count('failures')
+        self.breaker.record_failure()
+        logger.error(error)
+        return None, error
+
+    def generate_text(self, prompt):
+        """Returns (text, error_message) for a single generateContent call."""
+        error = self._missing_key()
+        if error:
+            return None, error
+        response, error = self.request('POST', self.url, json=self._payload(prompt))
+        if error:
+            return None, error
+        try:
+            result = response.json()
+        except ValueError:
+            result = None
+        return self._extract_text(result, response.text)
+
+    def list_models(self, url=GEMINI_MODELS_URL):
+        """Returns (models, error_message) where models is the API's list of model dicts."""
+        response, error = self.request('GET', url)
+        if error:
+            return None, error
+        return response.json().get('models', []), None
+
+
+
+class AsyncGeminiClient(_BaseClient):
+    """
+    asyncio counterpart of GeminiClient for the async views. Its coroutines
+    must run on the client loop (see agenerate_text). At most
+    max_concurrency calls are in flight at once; the rest wait their turn
+    without holding a thread.
+    """
+
+    def __init__(self, *args, max_concurrency=100, **kwargs):
+        super().__init__(*args, **kwargs)
+        try:
+            import httpx
+        except ImportError:
+            raise ImproperlyConfigured("The async Gemini client requires httpx (pip install httpx).")
+        self._httpx = httpx
+        self.http = httpx.AsyncClient(
+            headers=self.headers,
+            verify=_ssl_context(),
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=self.pool_size),
+        )
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def request(self, method, url, **kwargs):
+        """Async GeminiClient.request: returns (response, error_message)."""
+        if not self.breaker.allow():
+            self._count('short_circuited')
+            return None, "Gemini API is temporarily unavailable (circuit open)."
+
+        error = None
+        async with self.semaphore:
+            for attempt in range(self.max_retries + 1):
+                retry_after = None
+                started = time.perf_counter()
+                try:
+                    response = await self.http.request(method, url, **kwargs)
+                except self._httpx.HTTPError as e:
+                    latency = time.perf_counter() - started
+                    error = f"Gemini API Request Error: {e}"
+                else:
+                    latency = time.perf_counter() - started
+                    if response.status_code == 200:
+                        self._count('calls', latency)
+                        self.breaker.record_success()
+                        logger.debug("Gemini %s %s in %.0fms", method, response.status_code, latency * 1000)
+                        return response, None
+
+                    error = f"Gemini API Error: Status {response.status_code} - Body: {response.text}"
+                    if response.status_code not in RETRYABLE_STATUS:
+                        self._count('calls', latency)
+                        self.breaker.record_success()
+                        logger.error(error)
+                        return None, error
+                    retry_after = self._retry_after(response)
+
+                self._count('calls', latency)
+                if attempt < self.max_retries:
+                    self._count('retries')
+                    await asyncio.sleep(self._backoff(attempt, retry_after))
+
+        self._count('failures')
+        self.breaker.record_failure()
+        logger.error(error)
+        return None, error
+
+    async def generate_text(self, prompt):
+        """Returns (text, error_message) for a single generateContent call."""
+        error = self._missing_key()
+        if error:
+            return None, error
+        response, error = await self.request('POST', self.url, json=self._payload(prompt))
+        if error:
+            return None, error
+        try:
+            result = response.json()
+        except ValueError:
+            result = None
+        return self._extract_text(result, response.text)
+
+    async def aclose(self):
+        await self.http.aclose()
+
+_client = None
+_client_config = None
+_client_lock = threading.Lock()
+
+
+def _settings_config(settings):
+    return (
+        settings.GOOGLE_API_KEY,
+        getattr(settings, 'GEMINI_API_URL', GEMINI_API_URL),
+        getattr(settings, 'GEMINI_CONNECT_TIMEOUT', 5.0),
+        getattr(settings, 'GEMINI_READ_TIMEOUT', 30.0),
+        getattr(settings, 'GEMINI_MAX_RETRIES', 2),
+        getattr(settings, 'GEMINI_BACKOFF_BASE', 0.5),
+        getattr(settings, 'GEMINI_BACKOFF_MAX', 8.0),
+        getattr(settings, 'GEMINI_POOL_SIZE', 10),
+        getattr(settings, 'GEMINI_BREAKER_THRESHOLD', 5),
+        getattr(settings, 'GEMINI_BREAKER_RESET', 30.0),
+    )
+
+
+def get_client():
+    """Returns the process-wide client, rebuilt if the relevant settings change."""
+    global _client, _client_config
+    from django.conf import settings
+
+    config = _settings_config(settings)
+    with _client_lock:
+        if _client is None or config != _client_config:
+            _client = GeminiClient(*config)
+            _client_config = config
+        return _client
+
+
+_async_client = None
+_async_client_config = None
+_client_loop = None
+_client_loop_pid = None
+_shared_ssl_context = None
+_ssl_lock = threading.Lock()
+
+
+def _ssl_context():
+    """One SSL context for every async client: loading the CA bundle is most of the cost of a new one."""
+    global _shared_ssl_context
+    with _ssl_lock:
+        if _shared_ssl_context is None:
+            _shared_ssl_context = ssl.create_default_context()
+            try:
+                import certifi
+                _shared_ssl_context.load_verify_locations(certifi.where())
+            except ImportError:
+                pass
+        return _shared_ssl_context
+
+
+def _get_client_loop():
+    """
+    The event loop the async client lives on, run by a daemon thread. Under
+    WSGI every async view gets a fresh, short-lived loop, so a client per loop
+    would mean a new pool and breaker per request. Started lazily and per
+    pid, as threads do not survive gunicorn's fork.
+    """
+    global _client_loop, _client_loop_pid, _async_client, _async_client_config
+    if _client_loop is None or _client_loop_pid != os.getpid():
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, name='gemini-async-client', daemon=True).start()
+        _client_loop, _client_loop_pid = loop, os.getpid()
+        # A client inherited from the parent process belongs to its loop; never reuse it
+        _async_client = _async_client_config = None
+    return _client_loop
+
+
+def _async_client_and_loop():
+    global _async_client, _async_client_config
+    from django.conf import settings
+
+    config = _settings_config(settings) + (getattr(settings, 'GEMINI_ASYNC_CONCURRENCY', 100),)
+    with _client_lock:
+        loop = _get_client_loop()
+        if _async_client is None or config != _async_client_config:
+            if _async_client is not None:
+                asyncio.run_coroutine_threadsafe(_async_client.aclose(), loop)
+            _async_client = AsyncGeminiClient(*config[:-1], max_concurrency=config[-1])
+            _async_client_config = config
+        return _async_client, loop
+
+
+def get_async_client():
+    """
+    Returns the process-wide AsyncGeminiClient, rebuilt (and the old one
+    closed) if the settings change. Run its coroutines with agenerate_text,
+    not on the caller's loop.
+    """
+    return _async_client_and_loop()[0]
+
+
+async def agenerate_text(prompt):
+    """
+    AsyncGeminiClient.generate_text run on the client loop and awaited from
+    the caller's loop. Returns (text, error_message).
+    """
+    client, loop = _async_client_and_loop()
+    context = contextvars.copy_context()
+
+    async def call():
+        # Carry the caller's context over, as sync_to_async does (the request's metrics, for one)
+        for var, value in context.items():
+            var.set(value)
+        return await client.generate_text(prompt)
+
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(call(), loop))
@@ -1,62 +1,68 @@
-import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from django.conf import settings
 import json
 import logging
+import re
 
-logger = logging.getLogger(__name__)
+from .ai_cache import acached_call, cached_call
+from .ai_client import GEMINI_API_URL, agenerate_text, get_async_client, get_client  # noqa: F401
+from .ingestion import clean_item
 
-GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent"
+logger = logging.getLogger(__name__)
 
-def generate_text_gemini(prompt):
+def generate_text_gemini(prompt, use_cache=True):
     """
     Helper function to call Gemini API via HTTP.
+    Goes through the shared pooled client (retries, backoff, circuit breaker)
+    and, unless use_cache is False, the prompt-hash response cache so
+    identical concurrent prompts cost a single upstream call. The cache
+    suits prompts whose answer should not change (explanations); pass
+    use_cache=False where a repeat should get fresh output.
     Returns (text, error_message).
     """
-    if not settings.GOOGLE_API_KEY:
-        msg = "GOOGLE_API_KEY is not set."
-        logger.error(msg)
-        return None, msg
+    client = get_client()
+    if not use_cache:
+        return client.generate_text(prompt)
+    return cached_call(prompt, client.generate_text, namespace=client.url)
 
-    headers = {'Content-Type': 'application/json'}
-    params = {'key': settings.GOOGLE_API_KEY}
-    data = {
-        "contents": [{
-            "parts": [{"text": prompt}]
-        }]
-    }
+async def agenerate_text_gemini(prompt, use_cache=True):
+    """
+    Async generate_text_gemini for async views: the same cache (so sync and
+    async callers share responses) in front of the process's
+    AsyncGeminiClient. Returns (text, error_message).
+    """
+    if not use_cache:
+        return await agenerate_text(prompt)
+    return await acached_call(prompt, agenerate_text, namespace=get_async_client().url)
 
-    try:
-        response = requests.post(GEMINI_API_URL, headers=headers, params=params, json=data, timeout=30)
-        
-        # Check for HTTP errors and log the body if failed
-        if response.status_code != 200:
-            msg = f"Gemini API Error: Status {response.status_code} - Body: {response.text}"
-            logger.error(msg)
-            return None, msg
-            
-        result = response.json()
-        # Extract text from response structure
-        try:
-            return result['candidates'][0]['content']['parts'][0]['text'], None
-        except (KeyError, IndexError):
-            msg = f"Unexpected API response structure: {result}"
-            logger.error(msg)
-            return None, msg
-            
-    except requests.exceptions.RequestException as e:
-        msg = f"Gemini API Request Error: {e}"
-        logger.error(msg)
-        return None, msg
+def _strip_code_fences(text):
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.startswith("```"):
+        text = text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return text.strip()
 
-def generate_quiz_content(subject, topic, num_questions=5, difficulty='medium'):
+
+def normalize_question_text(text):
+    """Lowercases and strips punctuation/extra whitespace so near-identical wording compares equal."""
+    text = re.sub(r'[^\w\s]', ' ', str(text).lower())
+    return ' '.join(text.split())
+
+
+def _generate_chunk(subject, topic, count, difficulty, chunk_number):
     """
-    Generates quiz questions using Google Gemini via REST API.
-    Returns (data, error_message).
+    Requests one chunk of questions. Returns (valid_items, error_message);
+    malformed items are dropped individually instead of failing the chunk.
     """
     prompt = f"""
     Create a multiple-choice quiz for the subject '{subject}' on the topic '{topic}'.
     Difficulty: {difficulty}.
-    Number of questions: {num_questions}.
+    Number of questions: {count}.
+    This is batch {chunk_number} of a larger question bank, so cover a different
+    aspect of the topic than an obvious first batch would.
     
     Return ONLY a raw JSON array (no markdown code blocks) where each object has:
     - "text": The question string.
@@ -65,37 +71,102 @@ def generate_quiz_content(subject, topic, num_questions=5, difficulty='medium'):
     - "rationale": A brief explanation of the answer.
     """
 
-    text, error = generate_text_gemini(prompt)
+    # Uncached: the prompt is the same for every request of this subject and topic, and asking
+    # again must produce new questions, not the ones already added (which dedup would then skip)
+    text, error = generate_text_gemini(prompt, use_cache=False)
     if error:
-        return None, error
+        return [], error
 
-    # Clean up markdown if present
-    if text.startswith("```json"):
-        text = text[7:]
-    if text.startswith("```"):
-        text = text[3:]
-    if text.endswith("```"):
-        text = text[:-3]
-        
+    text = _strip_code_fences(text)
     try:
-        data = json.loads(text.strip())
-        return data, None
+        data = json.loads(text)
     except json.JSONDecodeError as e:
         msg = f"JSON Decode Error: {e} - Content: {text}"
         logger.error(msg)
-        return None, msg
+        return [], msg
+    if not isinstance(data, list):
+        return [], f"Expected a JSON array, got {type(data).__name__}"
 
-def get_ai_explanation(question_text, correct_answer_text):
+    items = []
+    for index, item in enumerate(data):
+        try:
+            items.append(clean_item(index, item, difficulty, topic))
+        except ValueError as e:
+            logger.warning("Dropping generated question in batch %s: %s", chunk_number, e)
+    return items, None
+
+
+def generate_quiz_content(subject, topic, num_questions=5, difficulty='medium', progress=None):
     """
-    Gets an AI explanation using REST API.
-    Returns (explanation, error_message)
+    Generates quiz questions using Google Gemini via REST API.
+    Returns (data, error_message).
+
+    Large requests are split into chunks of AI_GENERATION_CHUNK_SIZE issued
+    concurrently (at most AI_GENERATION_CONCURRENCY at a time). Items are
+    validated one by one and de-duplicated by normalised text; only the
+    shortfall left by failed chunks or rejected items is requested again.
+    progress, if given, is called as progress(collected, num_questions).
     """
-    prompt = f"""
+    chunk_size = max(1, getattr(settings, 'AI_GENERATION_CHUNK_SIZE', 10))
+    concurrency = max(1, getattr(settings, 'AI_GENERATION_CONCURRENCY', 4))
+    max_rounds = 1 + max(0, getattr(settings, 'AI_GENERATION_RETRIES', 2))
+
+    collected = []
+    seen = set()
+    last_error = None
+    chunk_number = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(max_rounds):
+            missing = num_questions - len(collected)
+            if missing <= 0:
+                break
+
+            futures = []
+            while missing > 0:
+                count = min(chunk_size, missing)
+                chunk_number += 1
+                futures.append(pool.submit(_generate_chunk, subject, topic, count, difficulty, chunk_number))
+                missing -= count
+
+            for future in as_completed(futures):
+                items, error = future.result()
+                if error:
+                    last_error = error
+                for item in items:
+                    key = normalize_question_text(item['text'])
+                    if key in seen or len(collected) >= num_questions:
+                        continue
+                    seen.add(key)
+                    collected.append(item)
+                if progress:
+                    progress(len(collected), num_questions)
+
+    if not collected:
+        return None, last_error or "The AI returned no usable questions."
+    if len(collected) < num_questions:
+        logger.warning("Generated %s of %s requested questions", len(collected), num_questions)
+    return collected, None
+
+def explanation_prompt(question_text, correct_answer_text):
+    return f"""
     Explain why '{correct_answer_text}' is the correct answer to the question: '{question_text}'.
     Provide a concise, helpful explanation for a student.
     """
-    
-    explanation, error = generate_text_gemini(prompt)
+
+def get_ai_explanation(question_text, correct_answer_text):
+    """
+    Gets an AI explanation using REST API.
+    Returns (explanation, error_message)
+    """
+    explanation, error = generate_text_gemini(explanation_prompt(question_text, correct_answer_text))
+    if error:
+        return None, error
+    return explanation, None
+
+async def aget_ai_explanation(question_text, correct_answer_text):
+    """Async get_ai_explanation. Returns (explanation, error_message)."""
+    explanation, error = await agenerate_text_gemini(explanation_prompt(question_text, correct_answer_text))
     if error:
         return None, error
     return explanation, None
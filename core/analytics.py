@@ -0,0 +1,242 @@
+"""
+Item analysis for quizzes (classical test theory).
+
+Attempts are pulled into columnar NumPy arrays once and every statistic is a
+vectorised pass over an (attempts x questions) matrix, so the work scales with
+the number of answer rows rather than with ORM round trips:
+
+- difficulty (p-value): share of attempts answering each question correctly
+- discrimination: point-biserial correlation between an item and the rest
+  of the test (total score minus that item)
+- option selection counts/shares and the mean total score of each option's
+  choosers (a good distractor attracts weaker candidates)
+- KR-20 reliability and a histogram of percentage scores
+
+For sampled quizzes each attempt only counts towards the questions its
+paper contained, and scores are percentages of that paper; KR-20 assumes
+one common paper and is left out.
+
+Only results with recorded AttemptAnswer rows are analysed. Reports are
+cached per quiz version and attempt count, so they are recomputed only when
+the quiz changes or new attempts arrive.
+"""
+from operator import itemgetter
+
+import numpy as np
+from django.db import connections
+from django.db.models import F
+
+from .answer_cache import get_question_payload, versioned
+from .models import AttemptAnswer, ExamAttempt, QuizStats, Result
+
+HISTOGRAM_BINS = 10
+# Answer rows are read as result_id << ID_BITS | option_id, FETCH_SIZE rows at a time
+ID_BITS = 32
+FETCH_SIZE = 50_000
+
+
+def load_responses(quiz_id):
+    """
+    Returns (question_ids, option_ids, option_question, option_correct, choices, served)
+    where choices is an int32 (attempts x questions) matrix of global option
+    indexes, -1 where a question was left unanswered, and served the matching
+    bool matrix of the questions each attempt was given (see served_matrix).
+    """
+    questions = get_question_payload(quiz_id)
+    question_ids = np.array([q['id'] for q in questions], dtype=np.int64)
+    option_ids, option_question, option_correct = [], [], []
+    for column, question in enumerate(questions):
+        for option in question['options']:
+            option_ids.append(option['id'])
+            option_question.append(column)
+            option_correct.append(option['is_correct'])
+    option_ids = np.array(option_ids, dtype=np.int64)
+    option_question = np.array(option_question, dtype=np.int32)
+    option_correct = np.array(option_correct, dtype=bool)
+
+    # One packed integer per answer row, read straight off the cursor: building
+    # model-layer tuples for every row would dominate the load on large quizzes
+    rows = AttemptAnswer.objects.filter(result__quiz_id=quiz_id).values_list(
+        F('result_id') * (1 << ID_BITS) + F('option_id')
+    )
+    sql, params = rows.query.sql_with_params()
+    chunks = []
+    with connections[rows.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        while batch := cursor.fetchmany(FETCH_SIZE):
+            chunks.append(np.fromiter(map(itemgetter(0), batch), dtype=np.int64, count=len(batch)))
+    packed = np.concatenate(chunks) if chunks else np.empty(0, np.int64)
+
+    if not len(packed) or not len(question_ids) or not len(option_ids):
+        empty = (0, len(question_ids))
+        return question_ids, option_ids, option_question, option_correct, np.empty(empty, np.int32), np.ones(empty, bool)
+
+    result_ids, attempt_index = np.unique(packed >> ID_BITS, return_inverse=True)
+    answer_options = packed & ((1 << ID_BITS) - 1)
+
+    # Map option ids to positions with a binary search over the sorted ids; an
+    # answer's column is its option's question
+    option_order = np.argsort(option_ids)
+    option_pos = np.clip(np.searchsorted(option_ids, answer_options, sorter=option_order), 0, len(option_ids) - 1)
+    option_index = option_order[option_pos]
+    column = option_question[option_index]
+
+    # Drop rows pointing at options that no longer belong to the quiz
+    valid = option_ids[option_index] == answer_options
+
+    choices = np.full((len(result_ids), len(question_ids)), -1, dtype=np.int32)
+    choices[attempt_index[valid], column[valid]] = option_index[valid]
+    served = served_matrix(quiz_id, result_ids, question_ids)
+    choices[~served] = -1
+    return question_ids, option_ids, option_question, option_correct, choices, served
+
+
+def served_matrix(quiz_id, result_ids, question_ids):
+    """
+    Bool (results x questions) matrix of the questions on each result's
+    paper: the whole quiz, except for the sampled attempt of the result's
+    student (one attempt per student and quiz).
+    """
+    served = np.ones((len(result_ids), len(question_ids)), dtype=bool)
+    papers = dict(
+        ExamAttempt.objects.filter(quiz_id=quiz_id, selection__isnull=False).values_list('student_id', 'selection')
+    )
+    if not papers:
+        return served
+    students = dict(Result.objects.filter(quiz_id=quiz_id).values_list('id', 'student_id'))
+    for row, result_id in enumerate(result_ids.tolist()):
+        paper = papers.get(students.get(result_id))
+        if paper is not None:
+            served[row] = np.isin(question_ids, np.frombuffer(bytes(paper), dtype='<i8'))
+    return served
+
+
+def analyse(choices, option_correct, n_questions=None, served=None, option_question=None):
+    """
+    Computes the item statistics from a choices matrix (see load_responses).
+    served restricts each attempt to the questions it was given (default:
+    all of them); option_question then lets option shares count only the
+    attempts that saw the option. Pure NumPy; returns a dict of arrays and
+    scalars.
+    """
+    n_attempts = choices.shape[0]
+    n_questions = choices.shape[1] if n_questions is None else n_questions
+    n_options = len(option_correct)
+    if served is None:
+        served = np.ones(choices.shape, dtype=bool)
+
+    answered = choices >= 0
+    correct = np.zeros(choices.shape, dtype=bool)
+    correct[answered] = option_correct[choices[answered]]
+    scored = correct.astype(np.float64)
+
+    totals = scored.sum(axis=1)
+    paper_sizes = served.sum(axis=1)
+    served_counts = served.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p_values = np.where(served_counts > 0, scored.sum(axis=0) / np.maximum(served_counts, 1), np.nan)
+    if not n_attempts:
+        p_values = np.zeros(n_questions)
+
+    # Point-biserial item-rest correlation, all items at once, over the attempts served each item
+    rest = totals[:, None] - scored
+    if n_attempts > 1:
+        item_centered = np.where(served, scored - p_values, 0.0)
+        rest_means = (rest * served).sum(axis=0) / np.maximum(served_counts, 1)
+        rest_centered = np.where(served, rest - rest_means, 0.0)
+        covariance = (item_centered * rest_centered).sum(axis=0)
+        denominator = np.sqrt((item_centered ** 2).sum(axis=0) * (rest_centered ** 2).sum(axis=0))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            discrimination = np.where(denominator > 0, covariance / denominator, np.nan)
+    else:
+        discrimination = np.full(n_questions, np.nan)
+
+    # Option selection counts and the mean total score of each option's choosers
+    chosen = choices[answered]
+    chooser_totals = np.broadcast_to(totals[:, None], choices.shape)[answered]
+    option_counts = np.bincount(chosen, minlength=n_options)
+    option_total_sums = np.bincount(chosen, weights=chooser_totals, minlength=n_options)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        option_mean_totals = np.where(option_counts > 0, option_total_sums / np.maximum(option_counts, 1), np.nan)
+    option_attempts = served_counts[option_question] if option_question is not None else np.full(n_options, n_attempts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        option_shares = np.where(option_attempts > 0, option_counts / np.maximum(option_attempts, 1), 0.0)
+    omitted = (served & ~answered).sum(axis=0)
+
+    # KR-20 reliability; only defined when every attempt sat the same paper
+    total_variance = totals.var() if n_attempts > 1 else 0.0
+    if n_questions > 1 and total_variance > 0 and served.all():
+        kr20 = (n_questions / (n_questions - 1)) * (1 - (p_values * (1 - p_values)).sum() / total_variance)
+    else:
+        kr20 = np.nan
+
+    percentages = np.where(paper_sizes > 0, totals / np.maximum(paper_sizes, 1) * 100, 0.0)
+    histogram, bin_edges = np.histogram(percentages, bins=HISTOGRAM_BINS, range=(0, 100))
+
+    return {
+        'attempts': n_attempts,
+        'p_values': p_values,
+        'discrimination': discrimination,
+        'omitted': omitted,
+        'option_counts': option_counts,
+        'option_shares': option_shares,
+        'option_mean_totals': option_mean_totals,
+        'kr20': kr20,
+        'mean_score': float(percentages.mean()) if n_attempts else None,
+        'histogram': histogram,
+        'bin_edges': bin_edges,
+    }
+
+
+def _number(value, digits=3):
+    value = float(value)
+    return None if np.isnan(value) else round(value, digits)
+
+
+def build_report(quiz_id):
+    """Loads responses and returns a JSON-serialisable item analysis report."""
+    question_ids, _, option_question, option_correct, choices, served = load_responses(quiz_id)
+    stats = analyse(choices, option_correct, len(question_ids), served, option_question)
+
+    questions = []
+    option_index = 0
+    for column, question in enumerate(get_question_payload(quiz_id)):
+        options = []
+        for option in question['options']:
+            options.append({
+                'id': option['id'],
+                'text': option['text'],
+                'is_correct': option['is_correct'],
+                'count': int(stats['option_counts'][option_index]),
+                'share': _number(stats['option_shares'][option_index]),
+                'mean_total': _number(stats['option_mean_totals'][option_index], 2),
+            })
+            option_index += 1
+        questions.append({
+            'id': question['id'],
+            'text': question['text'],
+            'p_value': _number(stats['p_values'][column]),
+            'discrimination': _number(stats['discrimination'][column]),
+            'omitted': int(stats['omitted'][column]),
+            'options': options,
+        })
+
+    edges = stats['bin_edges']
+    return {
+        'quiz_id': quiz_id,
+        'attempts': stats['attempts'],
+        'question_count': len(question_ids),
+        'mean_score': _number(stats['mean_score'], 2) if stats['mean_score'] is not None else None,
+        'kr20': _number(stats['kr20']),
+        'histogram': [
+            {'from': float(edges[i]), 'to': float(edges[i + 1]), 'count': int(count)}
+            for i, count in enumerate(stats['histogram'])
+        ],
+        'questions': questions,
+    }
+
+
+def get_report(quiz_id):
+    """Cached build_report(); recomputed when the quiz changes or its attempt count moves."""
+    attempts = QuizStats.objects.filter(quiz_id=quiz_id).values_list('attempt_count', flat=True).first()
+    return versioned(quiz_id, f'analysis:{attempts}', build_report)
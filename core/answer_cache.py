@@ -0,0 +1,251 @@
+"""
+Versioned cache for per-quiz answer keys and question payloads.
+
+Lookups go through a small process-local LRU first, then the shared Django
+cache, and only then the database. Every entry is keyed by the quiz's current
+version, which is bumped by the signal handlers in core.signals whenever a
+Quiz, Question or Option is saved or deleted, so stale entries are never
+served and simply age out.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+from .models import Question
+
+VERSION_KEY = 'quiz:{quiz_id}:version'
+ENTRY_KEY = 'quiz:{quiz_id}:{version}:{kind}'
+
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU mapping with optional per-entry TTL (seconds)."""
+
+    def __init__(self, max_size=128, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            expires_at, value = self._data[key]
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_local = LRUCache(getattr(settings, 'QUIZ_CACHE_LOCAL_SIZE', 128))
+_stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    _count_many(name, 1)
+
+
+def _count_many(name, amount):
+    if amount:
+        with _stats_lock:
+            _stats[name] += amount
+        metrics.record_cache('answer', name, amount)
+
+
+def _timeout():
+    return getattr(settings, 'QUIZ_CACHE_TIMEOUT', 60 * 60)
+
+
+def _new_version():
+    # Millisecond timestamp + random suffix: unique, and doubles as Last-Modified
+    return f"{int(time.time() * 1000):x}-{uuid.uuid4().hex[:8]}"
+
+
+def get_quiz_version(quiz_id):
+    """Returns the current cache version token for a quiz, creating one if needed."""
+    key = VERSION_KEY.format(quiz_id=quiz_id)
+    version = cache.get(key)
+    if version is None:
+        # add() so that concurrent first readers agree on a single token
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_quiz_version(quiz_id):
+    """
+    Moves a quiz to a fresh version. A random token (rather than a counter)
+    means a version key lost to eviction can never resurrect old entries.
+    """
+    version = _new_version()
+    cache.set(VERSION_KEY.format(quiz_id=quiz_id), version, timeout=None)
+    return version
+
+
+def version_timestamp(version):
+    """
+    The time (epoch seconds) a version token was issued, or None if unknown.
+    A token recreated after eviction reports a later time than the actual
+    change, which only ever costs a client a full response.
+    """
+    try:
+        return int(version.split('-', 1)[0], 16) / 1000
+    except (AttributeError, ValueError):
+        return None
+
+
+def versioned(quiz_id, kind, loader):
+    """
+    Returns loader(quiz_id) cached under the quiz's current version: local LRU,
+    then the shared cache, then the loader itself.
+    """
+    version = get_quiz_version(quiz_id)
+    local_key = (quiz_id, version, kind)
+
+    value = _local.get(local_key)
+    if value is not None:
+        _count('local_hits')
+        return value
+
+    shared_key = ENTRY_KEY.format(quiz_id=quiz_id, version=version, kind=kind)
+    value = cache.get(shared_key)
+    if value is not None:
+        _count('shared_hits')
+    else:
+        _count('misses')
+        value = loader(quiz_id)
+        cache.set(shared_key, value, timeout=_timeout())
+
+    _local.set(local_key, value)
+    return value
+
+
+def versioned_many(quiz_id, kind, keys, loader):
+    """
+    Like versioned() for many small entries at once, e.g. one per question:
+    returns {key: value} for keys, with loader(quiz_id, missing_keys) -> {key: value}
+    called only for entries found in neither the local LRU nor the shared cache.
+    """
+    version = get_quiz_version(quiz_id)
+    found, missing = {}, []
+    for key in keys:
+        value = _local.get((quiz_id, version, kind, key))
+        if value is None:
+            missing.append(key)
+        else:
+            found[key] = value
+    _count_many('local_hits', len(found))
+    if not missing:
+        return found
+
+    shared_keys = {ENTRY_KEY.format(quiz_id=quiz_id, version=version, kind=f'{kind}:{key}'): key for key in missing}
+    shared = cache.get_many(list(shared_keys))
+    _count_many('shared_hits', len(shared))
+    fetched = {shared_keys[shared_key]: value for shared_key, value in shared.items()}
+
+    still_missing = [key for key in missing if key not in fetched]
+    if still_missing:
+        _count_many('misses', len(still_missing))
+        loaded = loader(quiz_id, still_missing)
+        cache.set_many(
+            {ENTRY_KEY.format(quiz_id=quiz_id, version=version, kind=f'{kind}:{key}'): value for key, value in loaded.items()},
+            timeout=_timeout(),
+        )
+        fetched.update(loaded)
+
+    for key, value in fetched.items():
+        _local.set((quiz_id, version, kind, key), value)
+    found.update(fetched)
+    return found
+
+
+def load_question_payload(quiz_id, question_ids=None):
+    """
+    Builds the plain-data question list used to render quiz_result:
+    a list of {'id', 'text', 'rationale', 'options': [{'id', 'text', 'is_correct'}]}.
+    question_ids limits it to those questions.
+    """
+    questions = Question.objects.filter(quiz_id=quiz_id).order_by('id').prefetch_related('options')
+    if question_ids is not None:
+        questions = questions.filter(id__in=question_ids)
+    return [
+        {
+            'id': question.id,
+            'text': question.text,
+            'rationale': question.rationale,
+            'options': [
+                {'id': option.id, 'text': option.text, 'is_correct': option.is_correct}
+                for option in question.options.all()
+            ],
+        }
+        for question in questions
+    ]
+
+
+def get_answer_key(quiz_id):
+    from .grading import load_answer_key
+    return versioned(quiz_id, 'answer_key', load_answer_key)
+
+
+def get_answer_key_subset(quiz_id, question_ids):
+    """
+    AnswerKey for just question_ids (a sampled paper), in that order. Like
+    get_question_subset, entries are cached per question and shared by every
+    attempt on the quiz, so the pool's whole key is never loaded.
+    """
+    from .grading import answer_key_from_entries, load_question_keys
+    entries = versioned_many(quiz_id, 'answer_key', question_ids, load_question_keys)
+    return answer_key_from_entries(quiz_id, question_ids, entries)
+
+
+def get_question_payload(quiz_id):
+    return versioned(quiz_id, 'questions', load_question_payload)
+
+
+def get_question_subset(quiz_id, question_ids):
+    """
+    Payload entries for just question_ids, in that order, cached per question
+    so large question pools are never loaded whole.
+    """
+    def load(quiz_id, missing):
+        return {question['id']: question for question in load_question_payload(quiz_id, missing)}
+
+    payload = versioned_many(quiz_id, 'question', question_ids, load)
+    return [payload[question_id] for question_id in question_ids if question_id in payload]
+
+
+def cache_stats():
+    """Returns a snapshot of hit/miss counters and the local cache size."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['local_size'] = len(_local)
+    return stats
+
+
+def reset_local_cache():
+    _local.clear()
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
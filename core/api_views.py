@@ -1,10 +1,59 @@
+from django.db.models import Prefetch
+from django.db.models.functions import Coalesce
 from rest_framework import viewsets, permissions
-from .models import User, Subject, Quiz, Question, Result
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.response import Response
+from .analytics import get_report
+from .conditional import add_validators, not_modified, quiz_validators
+from .exports import export_response, parse_filters, teacher_results
+from .models import User, Subject, Quiz, Question, Option, Result
 from .serializers import (
-    UserSerializer, SubjectSerializer, QuizSerializer,
-    QuestionSerializer, ResultSerializer
+    UserSerializer, SubjectSerializer, QuizListSerializer, QuizDetailSerializer,
+    QuestionSerializer, ResultSerializer, requested_set
 )
 
+
+class SparseFieldsViewMixin:
+    """Passes ?fields=a,b to the (SparseFieldsMixin) serializer."""
+
+    def get_serializer(self, *args, **kwargs):
+        fields = requested_set(self.request, 'fields')
+        if fields and self.request.method == 'GET':
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+
+class ConditionalQuizMixin:
+    """
+    Answers GETs for a single quiz's content with ETag/Last-Modified
+    validators and 304s (see core.conditional). Subclasses return the quiz
+    id a request is about from conditional_quiz_id(), or None to opt out.
+    """
+
+    def conditional_quiz_id(self):
+        return None
+
+    def _conditional(self, handler, request, *args, **kwargs):
+        quiz_id = self.conditional_quiz_id()
+        if quiz_id is None:
+            return handler(request, *args, **kwargs)
+        etag, last_modified = quiz_validators(request, quiz_id, request.accepted_renderer.format)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            add_validators(response, etag, last_modified)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(super().retrieve, request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(super().list, request, *args, **kwargs)
+
+
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
@@ -19,18 +68,65 @@ class SubjectViewSet(viewsets.ModelViewSet):
     serializer_class = SubjectSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
-class QuizViewSet(viewsets.ModelViewSet):
+class QuizViewSet(ConditionalQuizMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Quiz.objects.all()
-    serializer_class = QuizSerializer
+    serializer_class = QuizDetailSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filterset_fields = ['subject', 'creator']
 
-class QuestionViewSet(viewsets.ModelViewSet):
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return QuizListSerializer
+        return QuizDetailSerializer
+
+    def conditional_quiz_id(self):
+        pk = self.kwargs.get('pk')
+        return int(pk) if self.action == 'retrieve' and str(pk).isdigit() else None
+
+    def get_queryset(self):
+        # One query per relation regardless of page size (see core.tests)
+        quizzes = Quiz.objects.select_related('subject').annotate(
+            question_count=Coalesce('stats__question_count', 0)
+        )
+        expand = requested_set(self.request, 'expand')
+        if self.action == 'retrieve' or expand & {'questions', 'options'}:
+            quizzes = quizzes.prefetch_related(Prefetch('questions', queryset=Question.objects.order_by('id')))
+            if 'options' in expand:
+                quizzes = quizzes.prefetch_related(Prefetch('questions__options', queryset=Option.objects.order_by('id')))
+        return quizzes
+
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def analysis(self, request, pk=None):
+        # Item analysis is only for the quiz's own teacher
+        quiz = self.get_object()
+        if quiz.creator_id != request.user.id:
+            raise PermissionDenied("Only the quiz creator can view its analysis.")
+        return Response(get_report(quiz.id))
+
+class QuestionViewSet(ConditionalQuizMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Question.objects.all()
     serializer_class = QuestionSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filterset_fields = ['quiz', 'difficulty']
 
+    def get_queryset(self):
+        questions = Question.objects.all()
+        if 'options' in requested_set(self.request, 'expand'):
+            # quiz is joined so the serializer can tell whether to reveal answers
+            questions = questions.select_related('quiz').prefetch_related(
+                Prefetch('options', queryset=Option.objects.order_by('id'))
+            )
+        return questions
+
+    def conditional_quiz_id(self):
+        # Only when the response is confined to one quiz
+        if self.action == 'retrieve':
+            return Question.objects.filter(pk=self.kwargs.get('pk')).values_list('quiz_id', flat=True).first()
+        quiz = self.request.query_params.get('quiz')
+        if self.action == 'list' and quiz and quiz.isdigit():
+            return int(quiz)
+        return None
+
 class ResultViewSet(viewsets.ModelViewSet):
     queryset = Result.objects.all()
     serializer_class = ResultSerializer
@@ -47,3 +143,18 @@ class ResultViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         serializer.save(student=self.request.user)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        # Streamed instead of serialised into one list; ?type=, ?answers=, ?quiz=, ?subject=, ?from=, ?to=
+        if not request.user.is_teacher:
+            raise PermissionDenied("Only teachers can export results.")
+        try:
+            results = teacher_results(request.user, **parse_filters(request.query_params))
+            return export_response(
+                results,
+                file_format=request.query_params.get('type', 'csv'),
+                answers=request.query_params.get('answers') in ('1', 'true'),
+            )
+        except ValueError as e:
+            raise ValidationError({'error': str(e)})
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    name = 'core'
+
+    def ready(self):
+        # Register cache invalidation signal handlers, background job handlers, the
+        # per-request query recorder (core.metrics, on connection_created) and system checks
+        from . import checks, metrics, signals, tasks  # noqa: F401
@@ -0,0 +1,84 @@
+"""
+Authentication backend that caches the logged-in user.
+
+AuthenticationMiddleware resolves request.user through the backend's
+get_user(user_id) on every request; ModelBackend answers that with a query.
+CachedModelBackend keeps the User row in the shared Django cache instead, so
+together with the cached_db session engine a warm authenticated request
+(sessions, request.user and the student/teacher role checks, which read
+request.user's flags) costs no queries at all.
+
+Entries hold every User field except the password hash, which must not
+sit in a shared (possibly on-disk) cache, plus the session auth HMAC that
+Django derives from it to verify sessions (see User.get_session_auth_hash).
+Users are rebuilt with the password deferred, so anything that does need it
+loads it from the database.
+
+Entries are keyed by user id, the value the session stores, so one save
+invalidates every session of that user. core.signals drops the entry after
+any User save or delete commits and on logout; USER_CACHE_TIMEOUT bounds
+what a bulk .update() (which sends no signal) can leave stale.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from . import metrics
+
+USER_KEY = 'auth:user:v2:{user_id}'
+
+
+def _key(user_id):
+    return USER_KEY.format(user_id=user_id)
+
+
+def _timeout():
+    return getattr(settings, 'USER_CACHE_TIMEOUT', 300)
+
+
+def invalidate_user(user_id):
+    cache.delete(_key(user_id))
+
+
+def _to_cache(user):
+    fields = [field.attname for field in user._meta.concrete_fields if field.attname != 'password']
+    return fields, [getattr(user, name) for name in fields], user.get_session_auth_hash()
+
+
+def _from_cache(entry):
+    fields, values, session_auth_hash = entry
+    user = get_user_model().from_db(DEFAULT_DB_ALIAS, fields, values)
+    user.cached_session_auth_hash = session_auth_hash
+    return user
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        entry = cache.get(_key(user_id))
+        if entry is not None:
+            metrics.record_cache('user', 'hits')
+            user = _from_cache(entry)
+            return user if self.user_can_authenticate(user) else None
+        metrics.record_cache('user', 'misses')
+        try:
+            user = get_user_model()._default_manager.get(pk=user_id)
+        except get_user_model().DoesNotExist:
+            return None
+        cache.set(_key(user_id), _to_cache(user), _timeout())
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        entry = await cache.aget(_key(user_id))
+        if entry is not None:
+            metrics.record_cache('user', 'hits')
+            user = _from_cache(entry)
+            return user if self.user_can_authenticate(user) else None
+        metrics.record_cache('user', 'misses')
+        try:
+            user = await get_user_model()._default_manager.aget(pk=user_id)
+        except get_user_model().DoesNotExist:
+            return None
+        await cache.aset(_key(user_id), _to_cache(user), _timeout())
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,43 @@
+"""
+Deployment checks (manage.py check --deploy; build.sh runs them before
+starting the server).
+
+Quiz versions (core.answer_cache), conditional GET validators, the AI
+response cache, cached_db sessions and the cached request.user are all
+invalidated through the default cache. A process-local backend only
+invalidates the process that made the change, so every other web worker
+and the run_jobs worker would keep serving stale answer keys, 304s,
+sessions and roles.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    # Stores nothing, so quiz versions never stick and the local LRU keeps the first payload
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def serving_processes():
+    """Processes sharing the data: web workers, plus run_jobs unless jobs run in the request."""
+    workers = getattr(settings, 'WEB_CONCURRENCY', 1)
+    return workers + (0 if getattr(settings, 'BACKGROUND_JOBS_EAGER', False) else 1)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    backend = settings.CACHES['default']['BACKEND']
+    processes = serving_processes()
+    if backend not in PROCESS_LOCAL_CACHES or processes < 2:
+        return []
+    return [Error(
+        f"The default cache ({backend.rsplit('.', 1)[-1]}) is local to one process, but "
+        f"{processes} processes serve this site, so cache invalidations would not reach the others.",
+        hint=(
+            "Set CACHE_BACKEND to a shared backend: django.core.cache.backends.redis.RedisCache with "
+            "CACHE_LOCATION=redis://..., or FileBasedCache with a directory when every process runs on one "
+            "host. Or run a single process (WEB_CONCURRENCY=1, BACKGROUND_JOBS_EAGER=1)."
+        ),
+        id='core.E001',
+    )]
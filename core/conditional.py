@@ -0,0 +1,85 @@
+"""
+Conditional GET for quiz content.
+
+Validators come from the per-quiz version token in core.answer_cache, which
+is bumped whenever the quiz, its questions/options or its subject change.
+The ETag is a hash of that token plus everything else the representation
+depends on (path, query string, renderer and the requesting user, since the
+quiz creator sees correct options). Checking them costs a cache lookup, so a
+matching If-None-Match or If-Modified-Since is answered with 304 before any
+query or serialization runs.
+
+Responses are per-user, so they are marked private and must be revalidated:
+browsers and mobile clients keep a copy, shared proxies do not.
+"""
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .answer_cache import get_quiz_version, version_timestamp
+
+logger = logging.getLogger(__name__)
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def quiz_validators(request, quiz_id, accepted_format=None):
+    """Returns (etag, last_modified) for request's view of a quiz's content."""
+    version = get_quiz_version(quiz_id)
+    user_id = request.user.id if request.user.is_authenticated else 0
+    variant = '|'.join([
+        version,
+        request.path,
+        '&'.join(sorted(request.GET.urlencode().split('&'))),
+        accepted_format or '',
+        str(user_id),
+    ])
+    etag = quote_etag(hashlib.sha1(variant.encode()).hexdigest()[:24])
+    timestamp = version_timestamp(version)
+    last_modified = datetime.fromtimestamp(int(timestamp), tz=timezone.utc) if timestamp else None
+    return etag, last_modified
+
+
+def _record(hit, request):
+    with _stats_lock:
+        _stats['hits' if hit else 'misses'] += 1
+        hits, total = _stats['hits'], _stats['hits'] + _stats['misses']
+    logger.debug("Conditional GET %s: %s", 'hit' if hit else 'miss', request.path)
+    if total % max(1, getattr(settings, 'CONDITIONAL_LOG_EVERY', 100)) == 0:
+        logger.info("Conditional GET hit ratio %.1f%% (%s of %s requests)", 100 * hits / total, hits, total)
+
+
+def not_modified(request, etag, last_modified):
+    """Returns a 304 response if the client's copy is current, otherwise None."""
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified and last_modified.timestamp()
+    )
+    hit = response is not None and response.status_code == 304
+    _record(hit, request)
+    if hit:
+        add_validators(response, etag, last_modified)
+    return response
+
+
+def add_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Cookie', 'Authorization'])
+    return response
+
+
+def conditional_stats():
+    """Snapshot of conditional GET hits/misses since the process started."""
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / total if total else None
+    return stats
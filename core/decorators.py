@@ -1,16 +1,26 @@
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
 from django.http import HttpResponseForbidden
 from django.contrib.auth.decorators import login_required
 
+def _role_required(view_func, has_role):
+    # Async views must not touch the lazy request.user (a sync query); they await request.auser()
+    if iscoroutinefunction(view_func):
+        async def wrapper(request, *args, **kwargs):
+            user = await request.auser()
+            if user.is_authenticated and has_role(user):
+                return await view_func(request, *args, **kwargs)
+            return HttpResponseForbidden("You don't have permission to access this page.")
+    else:
+        def wrapper(request, *args, **kwargs):
+            if request.user.is_authenticated and has_role(request.user):
+                return view_func(request, *args, **kwargs)
+            return HttpResponseForbidden("You don't have permission to access this page.")
+    return wraps(view_func)(wrapper)
+
 def student_required(view_func):
-    def wrapper(request, *args, **kwargs):
-        if request.user.is_authenticated and request.user.is_student:
-            return view_func(request, *args, **kwargs)
-        return HttpResponseForbidden("You don't have permission to access this page.")
-    return wrapper
+    return _role_required(view_func, lambda user: user.is_student)
 
 def teacher_required(view_func):
-    def wrapper(request, *args, **kwargs):
-        if request.user.is_authenticated and request.user.is_teacher:
-            return view_func(request, *args, **kwargs)
-        return HttpResponseForbidden("You don't have permission to access this page.")
-    return wrapper
\ No newline at end of file
+    return _role_required(view_func, lambda user: user.is_teacher)
@@ -0,0 +1,282 @@
+"""
+Near-duplicate question detection.
+
+Repeated AI generation on the same topic tends to produce the same question
+reworded slightly. Each question's text is normalised (lowercase words, no
+punctuation), cut into overlapping 3-word shingles and reduced to a 64-value
+MinHash signature, whose matching fraction estimates the Jaccard similarity
+of two shingle sets. Signatures are split into 16 bands of 4 values for
+locality-sensitive hashing: two questions become candidates when any band
+matches exactly, which at similarity 0.8 happens with probability > 0.999.
+A lookup is therefore 16 dict probes plus a signature comparison for the
+candidates sharing the most bands (at most MAX_CANDIDATES), independent of
+the size of the bank.
+
+One index per subject is kept in process memory (a 256-byte signature
+and 16 bucket entries per question). It is topped up with newly created
+questions on every check and rebuilt from scratch after DEDUP_INDEX_TTL
+seconds, so edits and deletions are picked up eventually. Matches are re-checked against the database
+before they are acted on.
+"""
+import re
+import threading
+import time
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+
+from .models import Question
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+MAX_CANDIDATES = 64
+
+# Multiply-shift hashing: the top 32 bits of (a*x + b) mod 2**64 for random
+# odd a give NUM_PERM independent hash functions without a modulo (uint64
+# arithmetic wraps). The fixed seed keeps signatures comparable across
+# processes and restarts.
+_random = np.random.RandomState(20240917)
+_A = _random.randint(0, 2 ** 63, size=NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_B = _random.randint(0, 2 ** 63, size=NUM_PERM, dtype=np.uint64)
+_SHIFT = np.uint64(32)
+# Folds each band's ROWS values into one integer dict key
+_BAND_MIX = _random.randint(0, 2 ** 63, size=ROWS, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+
+
+def normalise(text):
+    return re.findall(r'\w+', (text or '').lower())
+
+
+def shingles(text):
+    words = normalise(text)
+    if len(words) <= SHINGLE_SIZE:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def signature(text):
+    """The MinHash signature of text (uint32 array of NUM_PERM), or None if it has no words."""
+    hashes = [zlib.crc32(shingle.encode()) for shingle in shingles(text)]
+    if not hashes:
+        return None
+    values = np.array(hashes, dtype=np.uint64)[:, None]
+    return ((values * _A + _B) >> _SHIFT).min(axis=0).astype(np.uint32)
+
+
+def signatures(texts):
+    """
+    Signatures for many texts at once, one (shingles x NUM_PERM) pass per
+    call instead of one per text. Returns (positions, matrix): the indexes
+    of the texts that have words and their signatures, row for row.
+    """
+    hashes, lengths = [], []
+    for text in texts:
+        text_hashes = [zlib.crc32(shingle.encode()) for shingle in shingles(text)]
+        hashes.extend(text_hashes)
+        lengths.append(len(text_hashes))
+    lengths = np.array(lengths, dtype=np.intp)
+    positions = np.flatnonzero(lengths)
+    if not len(positions):
+        return positions, np.empty((0, NUM_PERM), dtype=np.uint32)
+    values = np.array(hashes, dtype=np.uint64)[:, None] * _A
+    values += _B
+    values >>= _SHIFT
+    starts = np.concatenate([[0], np.cumsum(lengths[positions])[:-1]])
+    return positions, np.minimum.reduceat(values.astype(np.uint32), starts, axis=0)
+
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.count_nonzero(first == second)) / NUM_PERM
+
+
+def band_keys(matrix):
+    """LSH bucket keys, one row of BANDS ints per signature row."""
+    bands = matrix.reshape(-1, BANDS, ROWS).astype(np.uint64)
+    return (bands * _BAND_MIX).sum(axis=2).tolist()
+
+
+class DedupIndex:
+    """MinHash/LSH index mapping keys (question ids) to signatures."""
+
+    def __init__(self, capacity=1024):
+        self.keys = []
+        self._signatures = np.empty((capacity, NUM_PERM), dtype=np.uint32)
+        self._buckets = [defaultdict(list) for _ in range(BANDS)]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, sig):
+        self.add_many([key], sig.reshape(1, NUM_PERM))
+
+    def add_many(self, keys, matrix):
+        start = len(self.keys)
+        needed = start + len(keys)
+        if needed > len(self._signatures):
+            grown = np.empty((max(needed, 2 * len(self._signatures)), NUM_PERM), dtype=np.uint32)
+            grown[:start] = self._signatures[:start]
+            self._signatures = grown
+        self._signatures[start:needed] = matrix
+        self.keys.extend(keys)
+        for position, row in enumerate(band_keys(matrix), start):
+            for buckets, band_key in zip(self._buckets, row):
+                buckets[band_key].append(position)
+
+    def matches(self, sig, threshold):
+        """[(key, similarity)] of indexed entries at least threshold similar to sig, best first."""
+        hits = [buckets.get(band_key) for buckets, band_key in zip(self._buckets, band_keys(sig)[0])]
+        hits = [bucket for bucket in hits if bucket]
+        if not hits:
+            return []
+        # Each entry sits once in every band bucket it shares with sig, so counts are shared bands
+        positions, counts = np.unique(np.concatenate(hits), return_counts=True)
+        if len(positions) > MAX_CANDIDATES:
+            # A crowded bucket must not crowd out the real match, which shares several bands
+            positions = positions[np.argsort(-counts, kind='stable')[:MAX_CANDIDATES]]
+        scores = np.count_nonzero(self._signatures[positions] == sig, axis=1) / NUM_PERM
+        found = [(self.keys[position], float(score)) for position, score in zip(positions, scores) if score >= threshold]
+        found.sort(key=lambda match: (-match[1], match[0]))
+        return found
+
+
+# --- Per-subject indexes of the question bank ---
+
+@dataclass
+class _SubjectIndex:
+    index: DedupIndex
+    last_id: int
+    built_at: float
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def _subject_questions(subject_id):
+    if subject_id is None:
+        return Question.objects.filter(Q(quiz__subject__isnull=True))
+    return Question.objects.filter(quiz__subject_id=subject_id)
+
+
+def _add_rows(entry, rows, chunk_size=2000):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            _add_chunk(entry, chunk)
+            chunk = []
+    if chunk:
+        _add_chunk(entry, chunk)
+
+
+def _add_chunk(entry, rows):
+    ids = [question_id for question_id, _ in rows]
+    positions, matrix = signatures([text for _, text in rows])
+    entry.index.add_many([ids[position] for position in positions], matrix)
+    entry.last_id = max(entry.last_id, ids[-1])
+
+
+def subject_index(subject_id):
+    """The dedup index over a subject's questions, built or topped up as needed."""
+    ttl = getattr(settings, 'DEDUP_INDEX_TTL', 600)
+    with _lock:
+        entry = _indexes.get(subject_id)
+        if entry is None or time.monotonic() - entry.built_at > ttl:
+            entry = _SubjectIndex(DedupIndex(), 0, time.monotonic())
+            rows = _subject_questions(subject_id).order_by('id').values_list('id', 'text')
+            _add_rows(entry, rows.iterator(chunk_size=5000))
+            _indexes[subject_id] = entry
+        else:
+            rows = _subject_questions(subject_id).filter(id__gt=entry.last_id).order_by('id').values_list('id', 'text')
+            _add_rows(entry, rows)
+        return entry.index
+
+
+def clear_indexes():
+    with _lock:
+        _indexes.clear()
+
+
+@dataclass
+class Duplicate:
+    position: int            # index of the item in the screened list
+    question_id: int = None  # existing question it repeats, or
+    earlier: int = None      # position of an earlier item in the same list
+    similarity: float = 1.0
+
+
+def screen_items(subject_id, items, threshold=None):
+    """
+    Finds near-duplicates among validated ingestion items: each item is
+    checked against the subject's bank and against the items before it.
+    Returns {position: Duplicate} for the items that repeat something.
+    """
+    if threshold is None:
+        threshold = getattr(settings, 'DEDUP_THRESHOLD', 0.8)
+    bank = subject_index(subject_id)
+    batch = DedupIndex(capacity=max(16, len(items)))
+    found = {}
+    for position, item in enumerate(items):
+        sig = signature(item['text'])
+        if sig is None:
+            continue
+        matches = bank.matches(sig, threshold)
+        if matches:
+            found[position] = Duplicate(position, question_id=matches[0][0], similarity=matches[0][1])
+        else:
+            earlier = batch.matches(sig, threshold)
+            if earlier:
+                found[position] = Duplicate(position, earlier=earlier[0][0], similarity=earlier[0][1])
+        batch.add(position, sig)
+
+    # The bank index may be up to DEDUP_INDEX_TTL old: drop matches whose question is gone
+    matched_ids = {duplicate.question_id for duplicate in found.values() if duplicate.question_id}
+    if matched_ids:
+        existing = set(Question.objects.filter(id__in=matched_ids).values_list('id', flat=True))
+        found = {
+            position: duplicate for position, duplicate in found.items()
+            if duplicate.question_id is None or duplicate.question_id in existing
+        }
+    return found
+
+
+def find_clusters(subject_id, threshold=None):
+    """
+    Groups a subject's questions into near-duplicate clusters (connected
+    components of the similarity graph). Returns lists of question ids with
+    two or more members, each sorted, largest clusters first.
+    """
+    if threshold is None:
+        threshold = getattr(settings, 'DEDUP_THRESHOLD', 0.8)
+    index = DedupIndex()
+    parent = {}
+
+    def root(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    rows = _subject_questions(subject_id).order_by('id').values_list('id', 'text')
+    for question_id, text in rows.iterator(chunk_size=5000):
+        sig = signature(text)
+        if sig is None:
+            continue
+        parent[question_id] = question_id
+        for other, _ in index.matches(sig, threshold):
+            parent[root(question_id)] = root(other)
+        index.add(question_id, sig)
+
+    clusters = {}
+    for question_id in parent:
+        clusters.setdefault(root(question_id), []).append(question_id)
+    groups = [sorted(members) for members in clusters.values() if len(members) > 1]
+    groups.sort(key=lambda members: (-len(members), members[0]))
+    return groups
@@ -0,0 +1,157 @@
+"""
+Server-side exam sessions.
+
+An ExamAttempt is opened when a student first loads take_quiz and fixes the
+deadline on the server. Answers are upserted one at a time by the autosave
+endpoint while the exam runs, so submission only has to grade and seal rows
+that are already stored instead of writing the whole sheet at the deadline.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, ExpressionWrapper, Q, Value
+from django.utils import timezone
+
+from .answer_cache import get_answer_key, get_answer_key_subset
+from .grading import grade_answers
+from .models import AttemptAnswer, ExamAttempt, Result
+from .sampling import new_seed, sample_for_quiz
+
+
+class AttemptClosed(Exception):
+    """Raised when an answer arrives for a submitted or expired attempt."""
+
+
+class InvalidAnswer(Exception):
+    """Raised when an option does not belong to the question or quiz."""
+
+
+def _grace_seconds():
+    return getattr(settings, 'EXAM_SUBMIT_GRACE_SECONDS', 30)
+
+
+def start_attempt(student, quiz):
+    """
+    Returns the student's attempt for a quiz, opening one with a fresh
+    deadline (and, for sampled quizzes, a freshly drawn paper) if needed.
+    """
+    now = timezone.now()
+    seed = new_seed()
+    attempt, _ = ExamAttempt.objects.get_or_create(
+        student=student,
+        quiz=quiz,
+        defaults={
+            'started_at': now,
+            'deadline': now + timedelta(minutes=quiz.time_limit_minutes),
+            'seed': seed,
+            # Callable, so the draw only happens when the attempt is created
+            'selection': lambda: sample_for_quiz(quiz, seed),
+        },
+    )
+    return attempt
+
+
+def attempt_answer_key(attempt):
+    """The answer key for the questions this attempt was given."""
+    question_ids = attempt.selected_question_ids
+    if question_ids is None:
+        return get_answer_key(attempt.quiz_id)
+    return get_answer_key_subset(attempt.quiz_id, question_ids)
+
+
+def student_answer_key(student_id, quiz):
+    """
+    The answer key a student's sheet for a quiz is graded against: the
+    questions their attempt was given, or the whole quiz when it is not
+    sampled. Returns None for a sampled quiz the student never started.
+    """
+    attempt = ExamAttempt.objects.filter(student_id=student_id, quiz_id=quiz.id).only('quiz_id', 'selection').first()
+    if attempt is not None:
+        return attempt_answer_key(attempt)
+    return None if quiz.questions_per_attempt else get_answer_key(quiz.id)
+
+
+def saved_answers(attempt):
+    """Returns {question_id: option_id} for everything autosaved so far."""
+    return dict(attempt.answers.values_list('question_id', 'option_id'))
+
+
+def _upsert_answers(attempt, selections):
+    # INSERT ... ON CONFLICT (attempt, question) DO UPDATE, one statement for any number of rows
+    rows = [
+        AttemptAnswer(attempt=attempt, question_id=question_id, option_id=option_id)
+        for question_id, option_id in selections.items()
+    ]
+    AttemptAnswer.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['attempt', 'question'],
+        update_fields=['option', 'answered_at'],
+    )
+
+
+def save_answer(attempt, question_id, option_id):
+    """
+    Upserts a single answer for an open attempt.
+    The option is checked against the cached answer key, so no extra query is
+    needed. The attempt row is locked as in submit_attempt, so an autosave
+    racing a submission either lands before grading or is rejected.
+    """
+    if not attempt.accepts_answers(_grace_seconds()):
+        raise AttemptClosed("This attempt is closed.")
+
+    grade = grade_answers(attempt_answer_key(attempt), {question_id: option_id})
+    if not grade.selections:
+        raise InvalidAnswer("Option does not belong to this question.")
+
+    with transaction.atomic():
+        # Re-read under the lock: the attempt may have been submitted since it was loaded
+        locked = ExamAttempt.objects.select_for_update().only('deadline', 'submitted_at').get(pk=attempt.pk)
+        if not locked.accepts_answers(_grace_seconds()):
+            raise AttemptClosed("This attempt is closed.")
+        _upsert_answers(attempt, grade.selections)
+
+
+def submit_attempt(attempt, answers=None):
+    """
+    Grades and seals an attempt, returning its Result.
+
+    answers (e.g. the final form POST) only overrides stored rows while the
+    attempt still accepts answers; late submissions are graded on what was
+    autosaved before the deadline. Submitting twice returns the same Result.
+    """
+    with transaction.atomic():
+        attempt = ExamAttempt.objects.select_for_update().get(pk=attempt.pk)
+        if attempt.result_id:
+            return attempt.result
+
+        answer_key = attempt_answer_key(attempt)
+        stored = saved_answers(attempt)
+        sheet = dict(stored)
+        if answers and attempt.accepts_answers(_grace_seconds()):
+            sheet.update(answers)
+        grade = grade_answers(answer_key, sheet)
+
+        result = Result.objects.create(student_id=attempt.student_id, quiz_id=attempt.quiz_id, score=grade.percentage)
+
+        # Only answers that never made it through autosave need writing now
+        pending = {
+            question_id: option_id
+            for question_id, option_id in grade.selections.items()
+            if stored.get(question_id) != option_id
+        }
+        if pending:
+            _upsert_answers(attempt, pending)
+
+        correct_option_ids = set().union(*answer_key.correct.values())
+        if correct_option_ids:
+            is_correct = ExpressionWrapper(Q(option_id__in=correct_option_ids), output_field=BooleanField())
+        else:
+            is_correct = Value(False)
+        attempt.answers.update(result=result, is_correct=is_correct)
+
+        attempt.result = result
+        attempt.submitted_at = timezone.now()
+        attempt.save(update_fields=['result', 'submitted_at'])
+    return result
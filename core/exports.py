@@ -0,0 +1,174 @@
+"""
+Streaming result exports for teachers.
+
+Rows come straight from values_list(...).iterator(chunk_size=...) so no model
+instances are built and only one chunk is held in memory at a time (Postgres
+uses a server-side cursor). CSV is generated lazily into a
+StreamingHttpResponse; XLSX goes through openpyxl's write-only workbook,
+which spools rows to disk, and the finished file is streamed back from a
+temporary file. Either way memory stays flat however many attempts a quiz has.
+
+Free-text cells (titles, usernames, question and option text) that a
+spreadsheet would read as a formula are prefixed with a quote, so an export
+opened in Excel or LibreOffice cannot run anything (CSV/formula injection).
+"""
+import csv
+import tempfile
+from datetime import datetime, time, timedelta
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import AttemptAnswer, Result
+
+EXPORT_CHUNK_SIZE = 2000
+CSV_ROWS_PER_CHUNK = 500
+
+RESULT_HEADER = ['result_id', 'quiz_id', 'quiz', 'subject', 'student', 'score', 'completed_on']
+ANSWER_HEADER = ['result_id', 'quiz_id', 'student', 'question_id', 'question', 'option', 'is_correct', 'answered_at']
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Leading characters that make spreadsheet software treat a cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def parse_filters(params):
+    """
+    Reads quiz, subject, from and to (YYYY-MM-DD, inclusive) out of a
+    QueryDict. Raises ValueError with a user-facing message on bad input.
+    """
+    filters = {}
+    for name in ('quiz', 'subject'):
+        value = params.get(name)
+        if value:
+            try:
+                filters[f'{name}_id'] = int(value)
+            except ValueError:
+                raise ValueError(f"Invalid {name} id: {value}")
+    for name, key in (('from', 'since'), ('to', 'until')):
+        value = params.get(name)
+        if value:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(f"Invalid '{name}' date (expected YYYY-MM-DD): {value}")
+            if key == 'until':
+                day += timedelta(days=1)
+            filters[key] = timezone.make_aware(datetime.combine(day, time.min))
+    return filters
+
+
+def teacher_results(teacher, quiz_id=None, subject_id=None, since=None, until=None):
+    """Results for the teacher's own quizzes, narrowed by the optional filters."""
+    results = Result.objects.filter(quiz__creator=teacher)
+    if quiz_id:
+        results = results.filter(quiz_id=quiz_id)
+    if subject_id:
+        results = results.filter(quiz__subject_id=subject_id)
+    if since:
+        results = results.filter(completed_on__gte=since)
+    if until:
+        results = results.filter(completed_on__lt=until)
+    return results
+
+
+def _timestamp(value):
+    # Local wall-clock time without tz/microseconds: readable in CSV, valid for openpyxl
+    if value is None:
+        return None
+    return timezone.localtime(value).replace(tzinfo=None, microsecond=0)
+
+
+def _text(value):
+    # Quote-prefix anything a spreadsheet would evaluate as a formula
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def result_rows(results):
+    rows = results.order_by('id').values_list(
+        'id', 'quiz_id', 'quiz__title', 'quiz__subject__name', 'student__username', 'score', 'completed_on',
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    for result_id, quiz_id, title, subject, student, score, completed_on in rows:
+        yield result_id, quiz_id, _text(title), _text(subject), _text(student), score, _timestamp(completed_on)
+
+
+def answer_rows(results):
+    """One row per recorded answer of the given results (results without AttemptAnswers have none)."""
+    rows = AttemptAnswer.objects.filter(result__in=results.values('id')).order_by(
+        'result_id', 'question_id'
+    ).values_list(
+        'result_id', 'result__quiz_id', 'result__student__username', 'question_id',
+        'question__text', 'option__text', 'is_correct', 'answered_at',
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    for result_id, quiz_id, student, question_id, question, option, is_correct, answered_at in rows:
+        yield (
+            result_id, quiz_id, _text(student), question_id, _text(question), _text(option), is_correct,
+            _timestamp(answered_at),
+        )
+
+
+class _Echo:
+    """File-like object whose write() hands the line back instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows):
+    """Yields CSV text in blocks of CSV_ROWS_PER_CHUNK rows."""
+    writer = csv.writer(_Echo())
+    block = [writer.writerow(header)]
+    for row in rows:
+        block.append(writer.writerow(row))
+        if len(block) >= CSV_ROWS_PER_CHUNK:
+            yield ''.join(block)
+            block = []
+    if block:
+        yield ''.join(block)
+
+
+def write_xlsx(header, rows, file, title='Results'):
+    """Writes rows into an XLSX file (path or binary file object) with constant memory."""
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ValueError("XLSX export requires openpyxl to be installed.")
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(file)
+
+
+def export_rows(results, answers=False):
+    """Returns (header, rows) for a results or per-answer export."""
+    if answers:
+        return ANSWER_HEADER, answer_rows(results)
+    return RESULT_HEADER, result_rows(results)
+
+
+def export_response(results, file_format='csv', answers=False):
+    """Builds the download response for the given Result queryset."""
+    header, rows = export_rows(results, answers)
+    name = 'answers' if answers else 'results'
+    filename = f"{name}-{timezone.localdate():%Y%m%d}.{file_format}"
+
+    if file_format == 'csv':
+        response = StreamingHttpResponse(iter_csv(header, rows), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    if file_format == 'xlsx':
+        # FileResponse closes (and so deletes) the temporary file once sent
+        spool = tempfile.TemporaryFile()
+        try:
+            write_xlsx(header, rows, spool, title=name.title())
+        except Exception:
+            spool.close()
+            raise
+        spool.seek(0)
+        return FileResponse(spool, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+    raise ValueError(f"Unsupported export format: {file_format}")
@@ -34,7 +34,7 @@ class TeacherRegistrationForm(UserCreationForm):
 class QuizForm(forms.ModelForm):
     class Meta:
         model = Quiz
-        fields = ['title', 'subject', 'time_limit_minutes']
+        fields = ['title', 'subject', 'time_limit_minutes', 'shuffle_options', 'questions_per_attempt']
 
 class QuestionForm(forms.ModelForm):
     class Meta:
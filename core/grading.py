@@ -0,0 +1,174 @@
+from dataclasses import dataclass, field
+
+from .models import AttemptAnswer, Question
+
+
+@dataclass(frozen=True)
+class AnswerKey:
+    """
+    Compact, read-only answer key for one quiz.
+
+    question_ids keeps the quiz's question order, option_question maps every
+    option id to the question it belongs to and correct maps each question id
+    to the frozenset of its correct option ids.
+    """
+    quiz_id: int
+    question_ids: tuple
+    option_question: dict
+    correct: dict
+
+    @property
+    def total_questions(self):
+        return len(self.question_ids)
+
+
+@dataclass
+class GradeResult:
+    correct_count: int
+    total_questions: int
+    # question_id -> option_id, only for options that belong to the question
+    selections: dict = field(default_factory=dict)
+    correct_question_ids: set = field(default_factory=set)
+
+    @property
+    def percentage(self):
+        if not self.total_questions:
+            return 0
+        return (self.correct_count / self.total_questions) * 100
+
+
+def load_answer_key(quiz_id):
+    """
+    Loads the answer key for a quiz in a single query.
+    Questions without options are still counted towards the total.
+    """
+    rows = (
+        Question.objects.filter(quiz_id=quiz_id)
+        .order_by('id')
+        .values_list('id', 'options__id', 'options__is_correct')
+    )
+
+    question_ids = []
+    option_question = {}
+    correct = {}
+    for question_id, option_id, is_correct in rows:
+        if question_id not in correct:
+            question_ids.append(question_id)
+            correct[question_id] = set()
+        if option_id is None:
+            continue
+        option_question[option_id] = question_id
+        if is_correct:
+            correct[question_id].add(option_id)
+
+    return AnswerKey(
+        quiz_id=quiz_id,
+        question_ids=tuple(question_ids),
+        option_question=option_question,
+        correct={qid: frozenset(ids) for qid, ids in correct.items()},
+    )
+
+
+def load_question_keys(quiz_id, question_ids):
+    """
+    Per-question answer key entries for question_ids in a single query:
+    {question_id: (option_ids, correct_option_ids)}.
+    """
+    rows = (
+        Question.objects.filter(quiz_id=quiz_id, id__in=question_ids)
+        .order_by('id')
+        .values_list('id', 'options__id', 'options__is_correct')
+    )
+    entries = {}
+    for question_id, option_id, is_correct in rows:
+        option_ids, correct = entries.setdefault(question_id, ([], set()))
+        if option_id is None:
+            continue
+        option_ids.append(option_id)
+        if is_correct:
+            correct.add(option_id)
+    return {
+        question_id: (tuple(option_ids), frozenset(correct))
+        for question_id, (option_ids, correct) in entries.items()
+    }
+
+
+def answer_key_from_entries(quiz_id, question_ids, entries):
+    """Assembles an AnswerKey for question_ids, in that order, from load_question_keys() entries."""
+    question_ids = tuple(question_id for question_id in question_ids if question_id in entries)
+    return AnswerKey(
+        quiz_id=quiz_id,
+        question_ids=question_ids,
+        option_question={
+            option_id: question_id
+            for question_id in question_ids
+            for option_id in entries[question_id][0]
+        },
+        correct={question_id: entries[question_id][1] for question_id in question_ids},
+    )
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def answers_from_post(data, prefix='question_'):
+    """
+    Extracts {question_id: option_id} from submitted form data where each
+    answer is posted as 'question_<id>' = '<option id>'.
+    """
+    answers = {}
+    for key, value in data.items():
+        if not key.startswith(prefix):
+            continue
+        question_id = _to_int(key[len(prefix):])
+        option_id = _to_int(value)
+        if question_id is not None and option_id is not None:
+            answers[question_id] = option_id
+    return answers
+
+
+def grade_answers(answer_key, answers):
+    """
+    Scores a whole answer sheet in memory against an AnswerKey.
+
+    answers maps question ids to selected option ids (ints or numeric strings).
+    Options that do not exist or belong to a different question are ignored,
+    so a tampered submission can never score a point.
+    """
+    selections = {}
+    correct_question_ids = set()
+    for raw_question_id, raw_option_id in answers.items():
+        question_id = _to_int(raw_question_id)
+        option_id = _to_int(raw_option_id)
+        if question_id is None or option_id is None:
+            continue
+        if answer_key.option_question.get(option_id) != question_id:
+            continue
+        selections[question_id] = option_id
+        if option_id in answer_key.correct.get(question_id, ()):
+            correct_question_ids.add(question_id)
+
+    return GradeResult(
+        correct_count=len(correct_question_ids),
+        total_questions=answer_key.total_questions,
+        selections=selections,
+        correct_question_ids=correct_question_ids,
+    )
+
+
+def build_attempt_answers(result, grade):
+    """Returns unsaved AttemptAnswer rows for every valid selection in a GradeResult."""
+    return [
+        AttemptAnswer(
+            result=result,
+            question_id=question_id,
+            option_id=option_id,
+            is_correct=question_id in grade.correct_question_ids,
+        )
+        for question_id, option_id in grade.selections.items()
+    ]
+
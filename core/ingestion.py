@@ -0,0 +1,222 @@
+"""
+Bulk question ingestion.
+
+Shared by generate_quiz_ai and the import_questions management command.
+The whole payload is validated up front and then written with bulk_create
+inside a single transaction, so a bad item never leaves a half-built quiz.
+Items are screened against the subject's existing questions (core.dedup)
+first: near-duplicates are skipped, flagged via Question.duplicate_of, or
+kept, per the duplicates argument or QUESTION_DEDUP_MODE.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from .answer_cache import bump_quiz_version
+from .dedup import screen_items
+from .models import Option, Question, Quiz
+from .search import index_questions
+from .stats import questions_added
+
+DIFFICULTIES = {choice for choice, _ in Question.DIFFICULTY_CHOICES}
+BATCH_SIZE = 1000
+DEDUP_MODES = ('skip', 'flag', 'keep')
+
+
+class IngestionError(Exception):
+    """Raised when a payload fails validation. errors holds one message per bad item."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} invalid question(s): " + "; ".join(errors[:5]))
+
+
+class AllDuplicatesError(Exception):
+    """
+    Raised in skip mode when every item is a near-duplicate of an existing
+    question: nothing was wrong with the payload, there is just nothing new.
+    """
+
+    def __init__(self, count):
+        self.count = count
+        super().__init__(f"all {count} question(s) are near-duplicates of existing questions")
+
+
+def clean_item(index, item, default_difficulty='medium', default_topic=None):
+    """Validates and normalises one question dict. Raises ValueError describing the problem."""
+    if not isinstance(item, dict):
+        raise ValueError(f"item {index}: expected an object")
+
+    text = str(item.get('text') or '').strip()
+    if not text:
+        raise ValueError(f"item {index}: missing question text")
+
+    options = item.get('options')
+    if not isinstance(options, (list, tuple)) or len(options) < 2:
+        raise ValueError(f"item {index}: needs at least 2 options")
+    options = [str(option).strip() for option in options]
+    if not all(options):
+        raise ValueError(f"item {index}: options cannot be empty")
+    max_length = Option._meta.get_field('text').max_length
+    if any(len(option) > max_length for option in options):
+        raise ValueError(f"item {index}: options must be at most {max_length} characters")
+
+    try:
+        correct_index = int(item.get('correct_index'))
+    except (TypeError, ValueError):
+        raise ValueError(f"item {index}: correct_index must be an integer")
+    if not 0 <= correct_index < len(options):
+        raise ValueError(f"item {index}: correct_index {correct_index} out of range")
+
+    difficulty = item.get('difficulty') or default_difficulty
+    if difficulty not in DIFFICULTIES:
+        raise ValueError(f"item {index}: unknown difficulty '{difficulty}'")
+
+    topic = item.get('topic') or default_topic
+    if topic and len(topic) > Question._meta.get_field('topic').max_length:
+        raise ValueError(f"item {index}: topic is too long")
+
+    return {
+        'text': text,
+        'options': options,
+        'correct_index': correct_index,
+        'rationale': str(item.get('rationale') or ''),
+        'difficulty': difficulty,
+        'topic': topic,
+    }
+
+
+def validate_questions(items, default_difficulty='medium', default_topic=None):
+    """
+    Validates a parsed payload (the list returned by generate_quiz_content or
+    read from an import file). Returns the cleaned items or raises IngestionError.
+    """
+    if not isinstance(items, (list, tuple)) or not items:
+        raise IngestionError(["payload must be a non-empty list of questions"])
+
+    cleaned, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            cleaned.append(clean_item(index, item, default_difficulty, default_topic))
+        except ValueError as e:
+            errors.append(str(e))
+    if errors:
+        raise IngestionError(errors)
+    return cleaned
+
+
+def dedup_mode(duplicates=None):
+    mode = duplicates or getattr(settings, 'QUESTION_DEDUP_MODE', 'skip')
+    if mode not in DEDUP_MODES:
+        raise ValueError(f"unknown duplicates mode '{mode}' (expected one of {', '.join(DEDUP_MODES)})")
+    return mode
+
+
+def bulk_add_questions(quiz, items, batch_size=BATCH_SIZE, duplicates=None):
+    """
+    Writes already validated items to an existing quiz: one bulk INSERT for
+    the questions and one for their options (per batch_size rows).
+    Returns the number of questions created, which is less than len(items)
+    when near-duplicates are skipped; raises AllDuplicatesError if that
+    would leave none.
+    """
+    mode = dedup_mode(duplicates)
+    found = screen_items(quiz.subject_id, items) if mode != 'keep' else {}
+    if mode == 'skip' and found:
+        items = [item for position, item in enumerate(items) if position not in found]
+        if not items:
+            raise AllDuplicatesError(len(found))
+        found = {}
+
+    # A flagged question with no rationale borrows its original's, saving an AI call later
+    originals = dict(Question.objects.filter(
+        id__in={duplicate.question_id for duplicate in found.values() if duplicate.question_id}
+    ).values_list('id', 'rationale')) if found else {}
+    new_questions = []
+    for position, item in enumerate(items):
+        question = Question(
+            quiz=quiz,
+            text=item['text'],
+            difficulty=item['difficulty'],
+            topic=item['topic'],
+            rationale=item['rationale'],
+        )
+        duplicate = found.get(position)
+        if duplicate and duplicate.question_id:
+            question.duplicate_of_id = duplicate.question_id
+            question.rationale = question.rationale or originals.get(duplicate.question_id) or ''
+        new_questions.append(question)
+    questions = Question.objects.bulk_create(new_questions, batch_size=batch_size)
+
+    # Repeats within the payload can only point at their original once it has an id
+    repeats = []
+    for position, duplicate in found.items():
+        if duplicate.earlier is not None:
+            questions[position].duplicate_of_id = questions[duplicate.earlier].id
+            repeats.append(questions[position])
+    if repeats:
+        Question.objects.bulk_update(repeats, ['duplicate_of'], batch_size=batch_size)
+
+    Option.objects.bulk_create(
+        [
+            Option(question=question, text=option_text, is_correct=(i == item['correct_index']))
+            for question, item in zip(questions, items)
+            for i, option_text in enumerate(item['options'])
+        ],
+        batch_size=batch_size,
+    )
+    # bulk_create skips post_save, so update counters, search documents and cached answer keys explicitly
+    questions_added(quiz.id, len(questions))
+    index_questions(questions)
+    transaction.on_commit(lambda: bump_quiz_version(quiz.id))
+    return len(questions)
+
+
+def copy_questions(quiz, question_ids, batch_size=BATCH_SIZE):
+    """
+    Copies existing questions (with all their options and correct flags)
+    into quiz, e.g. when reusing questions found in the question bank.
+    Returns the number of questions copied.
+    """
+    sources = list(Question.objects.filter(id__in=question_ids).order_by('id').prefetch_related('options'))
+    copies = Question.objects.bulk_create(
+        [
+            Question(quiz=quiz, text=source.text, difficulty=source.difficulty,
+                     topic=source.topic, rationale=source.rationale)
+            for source in sources
+        ],
+        batch_size=batch_size,
+    )
+    Option.objects.bulk_create(
+        [
+            Option(question=copy, text=option.text, is_correct=option.is_correct)
+            for copy, source in zip(copies, sources)
+            for option in source.options.all()
+        ],
+        batch_size=batch_size,
+    )
+    questions_added(quiz.id, len(copies))
+    index_questions(copies)
+    transaction.on_commit(lambda: bump_quiz_version(quiz.id))
+    return len(copies)
+
+
+def ingest_questions(quiz, items, default_difficulty='medium', default_topic=None, batch_size=BATCH_SIZE,
+                     duplicates=None):
+    """Validates items and adds them to an existing quiz atomically. Returns the number added."""
+    cleaned = validate_questions(items, default_difficulty, default_topic)
+    with transaction.atomic():
+        return bulk_add_questions(quiz, cleaned, batch_size, duplicates)
+
+
+def create_quiz_with_questions(quiz_fields, items, default_difficulty='medium', default_topic=None, batch_size=BATCH_SIZE,
+                               duplicates=None):
+    """
+    Validates items, then creates the quiz with all of its questions and
+    options in one transaction. quiz_fields are passed to Quiz(...).
+    Returns the new Quiz.
+    """
+    cleaned = validate_questions(items, default_difficulty, default_topic)
+    with transaction.atomic():
+        quiz = Quiz.objects.create(**quiz_fields)
+        bulk_add_questions(quiz, cleaned, batch_size, duplicates)
+    return quiz
@@ -0,0 +1,111 @@
+"""
+Minimal database-backed job queue.
+
+enqueue() stores a BackgroundJob row and returns immediately; the run_jobs
+management command claims pending rows with a conditional UPDATE (safe with
+several workers and on SQLite, no broker needed) and runs the handler
+registered for the job's kind. Handlers live in core.tasks.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+
+
+class JobError(Exception):
+    """Expected failure inside a handler; the message is shown to the user as-is."""
+
+
+def register(kind):
+    """Decorator registering a handler(job) -> result dict for a job kind."""
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(kind, payload=None, user=None):
+    if kind not in HANDLERS:
+        raise ValueError(f"No handler registered for job kind '{kind}'")
+    job = BackgroundJob.objects.create(kind=kind, payload=payload or {}, created_by=user)
+    if getattr(settings, 'BACKGROUND_JOBS_EAGER', False):
+        # Run in-process (tests / local development without a worker)
+        if claim_job(job.id):
+            job.refresh_from_db()
+            run_job(job)
+            job.refresh_from_db()
+    return job
+
+
+def update_progress(job, progress, message=''):
+    """Records handler progress (0-100) with a single UPDATE."""
+    job.progress = progress
+    job.message = message[:255]
+    BackgroundJob.objects.filter(id=job.id).update(progress=progress, message=job.message)
+
+
+def claim_job(job_id):
+    """Atomically moves a pending job to running. Returns True if this caller won it."""
+    return BackgroundJob.objects.filter(id=job_id, status=BackgroundJob.STATUS_PENDING).update(
+        status=BackgroundJob.STATUS_RUNNING,
+        started_at=timezone.now(),
+        attempts=F('attempts') + 1,
+    ) == 1
+
+
+def claim_next_job(kinds=None):
+    """Claims the oldest pending job, or returns None when the queue is empty."""
+    pending = BackgroundJob.objects.filter(status=BackgroundJob.STATUS_PENDING)
+    if kinds:
+        pending = pending.filter(kind__in=kinds)
+    for job_id in pending.order_by('created_at').values_list('id', flat=True)[:10]:
+        if claim_job(job_id):
+            return BackgroundJob.objects.get(id=job_id)
+    return None
+
+
+def _finish(job, status, **fields):
+    fields.update(status=status, finished_at=timezone.now())
+    BackgroundJob.objects.filter(id=job.id).update(**fields)
+
+
+def run_job(job):
+    """Runs a claimed job and records success or failure. Never raises."""
+    handler = HANDLERS.get(job.kind)
+    if handler is None:
+        _finish(job, BackgroundJob.STATUS_FAILED, error=f"Unknown job kind '{job.kind}'")
+        return
+
+    try:
+        result = handler(job)
+    except JobError as e:
+        logger.warning("Job %s failed: %s", job.id, e)
+        _finish(job, BackgroundJob.STATUS_FAILED, error=str(e))
+    except Exception as e:
+        logger.exception("Job %s crashed", job.id)
+        _finish(job, BackgroundJob.STATUS_FAILED, error=f"Unexpected error: {e}")
+    else:
+        _finish(job, BackgroundJob.STATUS_SUCCEEDED, result=result, progress=100)
+
+
+def requeue_stale_jobs(timeout_seconds, max_attempts=3):
+    """
+    Returns jobs stuck in 'running' (e.g. the worker was killed) to the queue,
+    or fails them once they have used up max_attempts. Returns the number requeued.
+    """
+    cutoff = timezone.now() - timedelta(seconds=timeout_seconds)
+    stale = BackgroundJob.objects.filter(status=BackgroundJob.STATUS_RUNNING, started_at__lt=cutoff)
+    stale.filter(attempts__gte=max_attempts).update(
+        status=BackgroundJob.STATUS_FAILED,
+        finished_at=timezone.now(),
+        error="Worker stopped responding.",
+    )
+    return stale.filter(attempts__lt=max_attempts).update(status=BackgroundJob.STATUS_PENDING)
@@ -0,0 +1,327 @@
+"""
+Exam-spike load simulation.
+
+Seeds a synthetic school (teachers, subjects, quizzes, thousands of students)
+and replays an exam's traffic through the full middleware stack with
+Django's test client, one logged-in client per user and a thread pool for
+concurrency. The phases run in the order a real exam produces them:
+
+    dashboards   every student and teacher loads their dashboard
+    start        every student opens the exam at once (cold caches)
+    autosave     each student autosaves a few answers
+    submit       the deadline burst: every student submits at once
+    results      every student opens their result page
+    explain      students ask for AI explanations (stubbed Gemini)
+
+Each request records its latency, status and query count; each phase is
+summarised as throughput, p50/p95/p99 latency and queries per request.
+Reports are plain dicts, so they can be saved as JSON and compared
+between releases (see the benchmark_exam command).
+
+Gemini is never called: GeminiClient.generate_text and its async
+counterpart are replaced by stubs that sleep for ai_latency seconds, so the
+explanation phase measures the app's own caching and storage of rationales.
+"""
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import ai_cache, answer_cache
+from .ai_client import AsyncGeminiClient, GeminiClient
+from .ingestion import bulk_add_questions
+from .models import Option, Quiz, Subject, User
+
+PASSWORD = 'benchmark'
+STUB_EXPLANATION = "This option is correct because it matches the definition given in the syllabus."
+
+
+@dataclass
+class LoadConfig:
+    teachers: int = 5
+    subjects: int = 3
+    quizzes: int = 10
+    questions: int = 40
+    students: int = 500
+    concurrency: int = 16
+    autosaves: int = 5
+    explanations: int = 200
+    ai_latency: float = 0.2
+    seed: int = 1
+
+
+@dataclass
+class Dataset:
+    teacher_ids: list
+    student_ids: list
+    quiz_ids: list
+    exam_quiz_id: int
+    answer_options: dict  # question_id -> [option_id, ...] for the exam quiz
+
+
+def seed_dataset(config):
+    """Creates the synthetic users, subjects and quizzes. Returns a Dataset."""
+    rng = random.Random(config.seed)
+    password = make_password(PASSWORD)
+    run = rng.randrange(16 ** 6)
+
+    teachers = User.objects.bulk_create([
+        User(username=f'bench{run:06x}_teacher{i}', password=password, is_teacher=True)
+        for i in range(config.teachers)
+    ])
+    students = User.objects.bulk_create([
+        User(username=f'bench{run:06x}_student{i}', password=password, is_student=True)
+        for i in range(config.students)
+    ], batch_size=1000)
+    subjects = [
+        Subject.objects.get_or_create(name=f'Benchmark subject {i}')[0] for i in range(config.subjects)
+    ]
+
+    quiz_ids = []
+    for i in range(config.quizzes):
+        subject = subjects[i % len(subjects)]
+        quiz = Quiz.objects.create(
+            title=f'Benchmark quiz {i}',
+            subject=subject,
+            subject_text=subject.name,
+            creator=teachers[i % len(teachers)],
+            time_limit_minutes=60,
+        )
+        bulk_add_questions(quiz, [
+            {
+                'text': f'Benchmark question {q} of quiz {quiz.id}: which option is correct?',
+                'options': [f'Option {o}' for o in range(4)],
+                'correct_index': rng.randrange(4),
+                'rationale': '',
+                'difficulty': rng.choice(['easy', 'medium', 'hard']),
+                'topic': f'Topic {q % 5}',
+            }
+            for q in range(config.questions)
+        ], duplicates='keep')
+        quiz_ids.append(quiz.id)
+
+    exam_quiz_id = quiz_ids[0]
+    answer_options = {}
+    for question_id, option_id in Option.objects.filter(
+        question__quiz_id=exam_quiz_id
+    ).order_by('id').values_list('question_id', 'id'):
+        answer_options.setdefault(question_id, []).append(option_id)
+
+    return Dataset(
+        teacher_ids=[teacher.id for teacher in teachers],
+        student_ids=[student.id for student in students],
+        quiz_ids=quiz_ids,
+        exam_quiz_id=exam_quiz_id,
+        answer_options=answer_options,
+    )
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(p * len(values))) - 1))]
+
+
+class Recorder:
+    """Collects (latency, status, queries) samples for one phase, from many threads."""
+
+    def __init__(self, name):
+        self.name = name
+        self.samples = []
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def record(self, latency, status, queries):
+        with self._lock:
+            self.samples.append((latency, status, queries))
+
+    def fail(self, error):
+        with self._lock:
+            self.errors.append(repr(error))
+
+    def summary(self, elapsed):
+        latencies = sorted(sample[0] for sample in self.samples)
+        queries = [sample[2] for sample in self.samples]
+        failed = sum(1 for sample in self.samples if sample[1] >= 500) + len(self.errors)
+        count = len(self.samples)
+
+        def ms(value):
+            return round(value * 1000, 2) if value is not None else None
+
+        return {
+            'phase': self.name,
+            'requests': count,
+            'errors': failed,
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(count / elapsed, 1) if elapsed else None,
+            'p50_ms': ms(percentile(latencies, 0.50)),
+            'p95_ms': ms(percentile(latencies, 0.95)),
+            'p99_ms': ms(percentile(latencies, 0.99)),
+            'max_ms': ms(latencies[-1] if latencies else None),
+            'queries_avg': round(sum(queries) / count, 2) if count else None,
+            'queries_max': max(queries) if queries else None,
+            'sample_errors': self.errors[:5],
+        }
+
+
+def run_phase(name, tasks, concurrency):
+    """
+    Runs tasks (callables returning a response) on concurrency threads.
+    With concurrency 1 they run inline, on the caller's connection.
+    Returns (summary, responses) with responses in task order.
+    """
+    recorder = Recorder(name)
+
+    def timed(task):
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = task()
+                latency = time.perf_counter() - started
+            recorder.record(latency, response.status_code, len(queries))
+            return response
+        except Exception as e:  # keep the run going; failures are reported per phase
+            recorder.fail(e)
+            return None
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        responses = [timed(task) for task in tasks]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            responses = list(pool.map(timed, tasks))
+    return recorder.summary(time.perf_counter() - started), responses
+
+
+def _stub_generate_text(latency):
+    def generate_text(self, prompt):
+        time.sleep(latency)
+        return STUB_EXPLANATION, None
+    return generate_text
+
+
+def _stub_agenerate_text(latency):
+    async def generate_text(self, prompt):
+        await asyncio.sleep(latency)
+        return STUB_EXPLANATION, None
+    return generate_text
+
+
+def logged_in_clients(user_ids):
+    users = User.objects.in_bulk(user_ids)
+    clients = {}
+    for user_id in user_ids:
+        client = Client()
+        client.force_login(users[user_id])
+        clients[user_id] = client
+    return clients
+
+
+def run_load(config, dataset=None, progress=None):
+    """
+    Seeds (unless a dataset is given) and replays the exam traffic.
+    progress, if given, is called with each phase summary as it finishes.
+    Returns the report dict.
+    """
+    rng = random.Random(config.seed)
+    seeding_started = time.perf_counter()
+    if dataset is None:
+        dataset = seed_dataset(config)
+    teacher_clients = logged_in_clients(dataset.teacher_ids)
+    student_clients = logged_in_clients(dataset.student_ids)
+    setup_elapsed = time.perf_counter() - seeding_started
+
+    # The exam starts cold, like the first request after a deploy
+    cache.clear()
+    answer_cache.reset_local_cache()
+    ai_cache.reset_local_cache()
+
+    quiz_id = dataset.exam_quiz_id
+    take_url = reverse('take_quiz', args=[quiz_id])
+    autosave_url = reverse('autosave_answer', args=[quiz_id])
+    question_ids = list(dataset.answer_options)
+    phases = []
+
+    def phase(name, tasks):
+        summary, responses = run_phase(name, tasks, config.concurrency)
+        phases.append(summary)
+        if progress:
+            progress(summary)
+        return responses
+
+    phase('dashboards', [
+        (lambda client=client: client.get(reverse('student_dashboard'))) for client in student_clients.values()
+    ] + [
+        (lambda client=client: client.get(reverse('teacher_dashboard'))) for client in teacher_clients.values()
+    ])
+
+    phase('start', [(lambda client=client: client.get(take_url)) for client in student_clients.values()])
+
+    picks = {
+        student_id: {
+            question_id: rng.choice(dataset.answer_options[question_id]) for question_id in question_ids
+        }
+        for student_id in dataset.student_ids
+    }
+    autosaves = []
+    for student_id, client in student_clients.items():
+        for question_id in rng.sample(question_ids, min(config.autosaves, len(question_ids))):
+            data = {'question_id': question_id, 'option_id': picks[student_id][question_id]}
+            autosaves.append(lambda client=client, data=data: client.post(autosave_url, data))
+    rng.shuffle(autosaves)
+    phase('autosave', autosaves)
+
+    submissions = phase('submit', [
+        (lambda client=client, answers={f'question_{q}': o for q, o in picks[student_id].items()}:
+            client.post(take_url, answers))
+        for student_id, client in student_clients.items()
+    ])
+
+    result_urls = [
+        (client, response['Location']) for client, response in zip(student_clients.values(), submissions)
+        if response is not None and response.status_code == 302
+    ]
+    phase('results', [(lambda client=client, url=url: client.get(url)) for client, url in result_urls])
+
+    explain_url = reverse('get_explanation_ai')
+    clients = list(student_clients.values())
+    with mock.patch.object(GeminiClient, 'generate_text', _stub_generate_text(config.ai_latency)), \
+            mock.patch.object(AsyncGeminiClient, 'generate_text', _stub_agenerate_text(config.ai_latency)):
+        phase('explain', [
+            (lambda client=rng.choice(clients), question_id=rng.choice(question_ids):
+                client.get(explain_url, {'question_id': question_id}))
+            for _ in range(config.explanations)
+        ])
+
+    return {
+        'config': asdict(config),
+        'database': connection.vendor,
+        'setup_s': round(setup_elapsed, 2),
+        'phases': phases,
+    }
+
+
+def compare_reports(baseline, current, metrics=('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_avg')):
+    """[(phase, metric, before, after, change)] for phases present in both reports."""
+    before = {summary['phase']: summary for summary in baseline.get('phases', [])}
+    rows = []
+    for summary in current.get('phases', []):
+        old = before.get(summary['phase'])
+        if old is None:
+            continue
+        for metric in metrics:
+            a, b = old.get(metric), summary.get(metric)
+            change = (b - a) / a if a and b is not None else None
+            rows.append((summary['phase'], metric, a, b, change))
+    return rows
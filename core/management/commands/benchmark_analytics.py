@@ -0,0 +1,124 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from core import analytics
+from core.ingestion import bulk_add_questions
+from core.models import AttemptAnswer, Option, Quiz, Result, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed one quiz with a large number of graded attempts into a throwaway database and time the "
+        "item analysis: loading the responses, the NumPy statistics and the whole report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--attempts', type=int, default=100_000)
+        parser.add_argument('--questions', type=int, default=10)
+        parser.add_argument('--options', type=int, default=4, help="Options per question")
+        parser.add_argument('--repeat', type=int, default=3, help="Timed runs; the fastest is reported")
+        parser.add_argument('--target', type=float, default=1.0,
+                            help="Exit with an error if loading the responses takes longer (seconds)")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--keepdb', action='store_true', help="Keep the benchmark database afterwards")
+
+    def handle(self, *args, **options):
+        if options['attempts'] < 1 or options['questions'] < 1 or options['options'] < 2 or options['repeat'] < 1:
+            raise CommandError("attempts, questions and repeat must be at least 1, options at least 2.")
+
+        # Same throwaway database as benchmark_exam, so real data is never touched
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+            test_settings['NAME'] = os.path.join(tempfile.gettempdir(), 'prepcbt_benchmark.sqlite3')
+        old_name = connection.settings_dict['NAME']
+        self.stdout.write(f"Creating benchmark database ({connection.vendor})...")
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            started = time.perf_counter()
+            quiz_id = self._seed(options)
+            self.stdout.write(f"Seeded {options['attempts']} attempts in {time.perf_counter() - started:.1f}s")
+            with override_settings(DEBUG=False):
+                timings = self._time(quiz_id, options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        for name, seconds in timings.items():
+            self.stdout.write(f"  {name:<15} {seconds * 1000:9.1f} ms")
+        if timings['load_responses'] > options['target']:
+            raise CommandError(
+                f"load_responses took {timings['load_responses']:.3f}s, over the {options['target']}s target."
+            )
+        self.stdout.write(self.style.SUCCESS(f"load_responses is within the {options['target']}s target."))
+
+    def _seed(self, options):
+        rng = np.random.default_rng(options['seed'])
+        n_attempts, n_questions, n_options = options['attempts'], options['questions'], options['options']
+        # A per-run prefix keeps usernames unique when --keepdb reuses the database
+        run = os.urandom(3).hex()
+        teacher = User.objects.create(username=f'bench{run}_analyst', is_teacher=True)
+        students = User.objects.bulk_create([
+            User(username=f'bench{run}_candidate{i}', is_student=True) for i in range(min(n_attempts, 1000))
+        ])
+        quiz = Quiz.objects.create(title='Analytics benchmark', creator=teacher, time_limit_minutes=60)
+        bulk_add_questions(quiz, [
+            {
+                'text': f'Analytics benchmark question {q}',
+                'options': [f'Option {o}' for o in range(n_options)],
+                'correct_index': int(rng.integers(n_options)),
+                'rationale': '',
+                'difficulty': 'medium',
+                'topic': '',
+            }
+            for q in range(n_questions)
+        ], duplicates='keep')
+        option_rows = list(Option.objects.filter(question__quiz=quiz).order_by('question_id', 'id').values_list(
+            'question_id', 'id', 'is_correct'
+        ))
+        question_ids = [row[0] for row in option_rows[::n_options]]
+        option_ids = [[row[1] for row in option_rows[i:i + n_options]] for i in range(0, len(option_rows), n_options)]
+        correct_index = np.array([row[2] for row in option_rows]).reshape(n_questions, n_options).argmax(axis=1).tolist()
+
+        # Abler candidates pick the right option more often; a few questions are left unanswered
+        ability = rng.random(n_attempts)
+        for start in range(0, n_attempts, 10_000):
+            stop = min(start + 10_000, n_attempts)
+            results = Result.objects.bulk_create([
+                Result(student=students[i % len(students)], quiz=quiz, score=0) for i in range(start, stop)
+            ])
+            shape = (stop - start, n_questions)
+            right = rng.random(shape) < ability[start:stop, None]
+            picked = np.where(right, correct_index, rng.integers(n_options, size=shape)).tolist()
+            answered = rng.random(shape) > 0.05
+            AttemptAnswer.objects.bulk_create([
+                AttemptAnswer(
+                    result_id=result.id,
+                    question_id=question_ids[column],
+                    option_id=option_ids[column][picked[row][column]],
+                    is_correct=picked[row][column] == correct_index[column],
+                )
+                for row, result in enumerate(results)
+                for column in np.flatnonzero(answered[row]).tolist()
+            ], batch_size=5000)
+        return quiz.id
+
+    def _time(self, quiz_id, repeat):
+        # One untimed run fills the question payload cache, as it would be in production
+        analytics.build_report(quiz_id)
+        timings = {'load_responses': [], 'analyse': [], 'build_report': []}
+        for _ in range(repeat):
+            started = time.perf_counter()
+            question_ids, _, option_question, option_correct, choices, served = analytics.load_responses(quiz_id)
+            loaded = time.perf_counter()
+            analytics.analyse(choices, option_correct, len(question_ids), served, option_question)
+            analysed = time.perf_counter()
+            analytics.build_report(quiz_id)
+            timings['load_responses'].append(loaded - started)
+            timings['analyse'].append(analysed - loaded)
+            timings['build_report'].append(time.perf_counter() - analysed)
+        return {name: min(values) for name, values in timings.items()}
@@ -0,0 +1,124 @@
+import json
+import os
+import platform
+import subprocess
+import tempfile
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from core.loadtest import LoadConfig, compare_reports, run_load
+
+COLUMNS = ('phase', 'requests', 'errors', 'throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_avg', 'queries_max')
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR,
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic school into a throwaway database and replay an exam spike (dashboards, "
+        "simultaneous starts, autosaves, the deadline submit burst, results, stubbed AI explanations), "
+        "reporting p50/p95/p99 latency, throughput and queries per request."
+    )
+
+    def add_arguments(self, parser):
+        defaults = LoadConfig()
+        parser.add_argument('--students', type=int, default=defaults.students)
+        parser.add_argument('--teachers', type=int, default=defaults.teachers)
+        parser.add_argument('--subjects', type=int, default=defaults.subjects)
+        parser.add_argument('--quizzes', type=int, default=defaults.quizzes)
+        parser.add_argument('--questions', type=int, default=defaults.questions, help="Questions per quiz")
+        parser.add_argument('--concurrency', type=int, default=defaults.concurrency, help="Simultaneous requests")
+        parser.add_argument('--autosaves', type=int, default=defaults.autosaves, help="Autosaves per student")
+        parser.add_argument('--explanations', type=int, default=defaults.explanations,
+                            help="AI explanation requests in the last phase")
+        parser.add_argument('--ai-latency', type=float, default=defaults.ai_latency,
+                            help="Seconds the stubbed Gemini call takes")
+        parser.add_argument('--seed', type=int, default=defaults.seed, help="Random seed for data and traffic")
+        parser.add_argument('--json', dest='json_path', help="Write the full report to this file")
+        parser.add_argument('--compare', help="A previous --json report to compare against")
+        parser.add_argument('--keepdb', action='store_true', help="Keep the benchmark database afterwards")
+
+    def handle(self, *args, **options):
+        config = LoadConfig(**{
+            field: options[field] for field in (
+                'teachers', 'subjects', 'quizzes', 'questions', 'students',
+                'concurrency', 'autosaves', 'explanations', 'ai_latency', 'seed',
+            )
+        })
+        if config.students < 1 or config.teachers < 1 or config.subjects < 1 or config.quizzes < 1 \
+                or config.questions < 1:
+            raise CommandError("students, teachers, subjects, quizzes and questions must all be at least 1.")
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read {options['compare']}: {e}")
+
+        # A test database (migrated from scratch) so real data is never touched. SQLite gets a
+        # file rather than the test runner's in-memory default so every thread shares it.
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+            test_settings['NAME'] = os.path.join(tempfile.gettempdir(), 'prepcbt_benchmark.sqlite3')
+        old_name = connection.settings_dict['NAME']
+        self.stdout.write(f"Creating benchmark database ({connection.vendor})...")
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            # Production-like settings: no DEBUG query log; the test client's host allowed
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                report = run_load(config, progress=self._print_phase)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        report.update(
+            revision=git_revision(),
+            python=platform.python_version(),
+            django=django.get_version(),
+        )
+        self._print_table(report)
+        if baseline:
+            self._print_comparison(baseline, report)
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['json_path']}")
+
+    def _print_phase(self, summary):
+        self.stdout.write(
+            f"  {summary['phase']}: {summary['requests']} requests in {summary['elapsed_s']}s"
+            + (self.style.ERROR(f" ({summary['errors']} errors)") if summary['errors'] else '')
+        )
+
+    def _print_table(self, report):
+        rows = [COLUMNS] + [tuple('' if phase[c] is None else str(phase[c]) for c in COLUMNS) for phase in report['phases']]
+        widths = [max(len(row[i]) for row in rows) for i in range(len(COLUMNS))]
+        self.stdout.write('')
+        for n, row in enumerate(rows):
+            line = '  '.join(value.ljust(width) if i == 0 else value.rjust(width) for i, (value, width) in enumerate(zip(row, widths)))
+            self.stdout.write(self.style.MIGRATE_HEADING(line) if n == 0 else line)
+        for phase in report['phases']:
+            for error in phase['sample_errors']:
+                self.stdout.write(self.style.ERROR(f"{phase['phase']}: {error}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Setup {report['setup_s']}s; revision {report['revision'] or 'unknown'}, {report['database']}."
+        ))
+
+    def _print_comparison(self, baseline, report):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\nCompared with {baseline.get('revision') or 'baseline'}:"
+        ))
+        for phase, metric, before, after, change in compare_reports(baseline, report):
+            delta = f"{change:+.1%}" if change is not None else 'n/a'
+            self.stdout.write(f"  {phase:<11} {metric:<15} {before!s:>10} -> {after!s:<10} {delta}")
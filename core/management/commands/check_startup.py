@@ -0,0 +1,139 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter: builds the WSGI application the way a server does, then
+# serves each path twice through it. Prints one JSON line of timings on stdout.
+CHILD = r'''
+import json, sys, time
+from wsgiref.util import setup_testing_defaults
+
+started = time.perf_counter()
+from prep_cbt.wsgi import application
+ready = time.perf_counter()
+from core import startup
+
+
+def get(path, host):
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'HTTP_HOST': host}
+    setup_testing_defaults(environ)
+    statuses = []
+    request_started = time.perf_counter()
+    response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        b''.join(response)
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
+    return int(statuses[0].split()[0]), time.perf_counter() - request_started
+
+
+host, paths = sys.argv[1], sys.argv[2:]
+first = [get(paths[0], host)]
+first_response_at = time.time()
+first += [get(path, host) for path in paths[1:]]
+second = [get(path, host) for path in paths]
+report = startup.last_report or {}
+print(json.dumps({
+    # prep_cbt.wsgi runs the warm-up on import; count it separately
+    'ready_s': ready - started - report.get('warmup_s', 0),
+    'warmup_s': report.get('warmup_s', 0),
+    'steps': report.get('steps', {}),
+    'first_response_at': first_response_at,
+    'first': first,
+    'second': second,
+}))
+'''
+
+METRICS = (
+    ('time_to_first_response_ms', 'first response'),
+    ('process_ms', 'process total'),
+    ('ready_ms', 'app import'),
+    ('warmup_ms', 'warm-up'),
+    ('first_ms', 'first requests'),
+    ('second_ms', 'repeat requests'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure cold start: launch fresh processes that build the WSGI application (with and without "
+        "the core.startup warm-up) and time each phase up to the first response."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', action='append', dest='paths',
+                            help="Path to request (repeatable; default: / and the login page)")
+        parser.add_argument('--host', default='127.0.0.1', help="Host header (must be in ALLOWED_HOSTS)")
+        parser.add_argument('--runs', type=int, default=3, help="Processes per mode; medians are reported")
+        parser.add_argument('--mode', choices=['both', 'warm', 'cold'], default='both')
+        parser.add_argument('--json', dest='json_path', help="Write the raw measurements to this file")
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError("--runs must be at least 1.")
+        paths = options['paths'] or ['/', '/login/']
+        modes = ['cold', 'warm'] if options['mode'] == 'both' else [options['mode']]
+
+        results = {}
+        for mode in modes:
+            runs = [self._run_child(mode, options['host'], paths) for _ in range(options['runs'])]
+            results[mode] = {'runs': runs, 'median': self._medians(runs)}
+            self._print_mode(mode, results[mode]['median'], runs[-1])
+
+        if len(modes) == 2:
+            cold, warm = results['cold']['median'], results['warm']['median']
+            self.stdout.write(self.style.SUCCESS(
+                f"Warm-up moves {cold['first_ms'] - warm['first_ms']:.0f}ms out of the first requests "
+                f"(first requests {cold['first_ms']:.0f}ms -> {warm['first_ms']:.0f}ms); "
+                f"time to first response {cold['time_to_first_response_ms']:.0f}ms -> "
+                f"{warm['time_to_first_response_ms']:.0f}ms."
+            ))
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({'paths': paths, 'results': results}, f, indent=2)
+            self.stdout.write(f"Report written to {options['json_path']}")
+
+    def _run_child(self, mode, host, paths):
+        env = dict(os.environ, STARTUP_WARMUP='1' if mode == 'warm' else '0', PERF_LOG_LEVEL='WARNING')
+        launched = time.time()
+        completed = subprocess.run(
+            [sys.executable, '-c', CHILD, host, *paths],
+            capture_output=True, text=True, cwd=settings.BASE_DIR, env=env,
+        )
+        finished = time.time()
+        if completed.returncode != 0:
+            raise CommandError(f"The {mode} start-up process failed:\n{completed.stderr.strip()}")
+        child = json.loads(completed.stdout.strip().splitlines()[-1])
+        statuses = sorted({status for status, _ in child['first'] + child['second']})
+        return {
+            'time_to_first_response_ms': (child['first_response_at'] - launched) * 1000,
+            'process_ms': (finished - launched) * 1000,
+            'ready_ms': child['ready_s'] * 1000,
+            'warmup_ms': child['warmup_s'] * 1000,
+            'first_ms': sum(latency for _, latency in child['first']) * 1000,
+            'second_ms': sum(latency for _, latency in child['second']) * 1000,
+            'steps_ms': {name: seconds * 1000 for name, seconds in child['steps'].items()},
+            'statuses': statuses,
+        }
+
+    @staticmethod
+    def _medians(runs):
+        return {key: statistics.median(run[key] for run in runs) for key, _ in METRICS}
+
+    def _print_mode(self, mode, median, last_run):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{'Warm-up on' if mode == 'warm' else 'Warm-up off'} (median of runs; statuses {last_run['statuses']}):"
+        ))
+        for key, label in METRICS:
+            self.stdout.write(f"  {label:<16} {median[key]:>8.1f}ms")
+        if last_run['steps_ms']:
+            self.stdout.write('  steps: ' + ', '.join(
+                f"{name} {ms:.0f}ms" for name, ms in last_run['steps_ms'].items()
+            ))
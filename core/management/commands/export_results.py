@@ -0,0 +1,66 @@
+import resource
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exports import export_rows, iter_csv, parse_filters, teacher_results, write_xlsx
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = "Export a teacher's results (or per-question answers) to CSV/XLSX using the streaming exporter."
+
+    def add_arguments(self, parser):
+        parser.add_argument('teacher', help="Username of the teacher whose quizzes are exported")
+        parser.add_argument('--output', '-o', help="File to write (CSV defaults to stdout)")
+        parser.add_argument('--type', choices=['csv', 'xlsx'], default='csv')
+        parser.add_argument('--answers', action='store_true', help="One row per recorded answer instead of per result")
+        parser.add_argument('--quiz', help="Only this quiz id")
+        parser.add_argument('--subject', help="Only quizzes in this subject id")
+        parser.add_argument('--from', dest='from', help="Completed on or after YYYY-MM-DD")
+        parser.add_argument('--to', help="Completed on or before YYYY-MM-DD")
+        parser.add_argument('--stats', action='store_true',
+                            help="Report rows, elapsed time and peak RSS on stderr (for benchmarking memory use)")
+
+    def handle(self, *args, **options):
+        teacher = User.objects.filter(username=options['teacher'], is_teacher=True).first()
+        if teacher is None:
+            raise CommandError(f"No teacher named {options['teacher']!r}.")
+        if options['type'] == 'xlsx' and not options['output']:
+            raise CommandError("--output is required for XLSX exports.")
+        try:
+            filters = parse_filters({key: options[key] for key in ('quiz', 'subject', 'from', 'to')})
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        header, rows = export_rows(teacher_results(teacher, **filters), answers=options['answers'])
+        counted = {'rows': 0}
+
+        def counting(rows):
+            for row in rows:
+                counted['rows'] += 1
+                yield row
+
+        started = time.perf_counter()
+        if options['type'] == 'xlsx':
+            try:
+                write_xlsx(header, counting(rows), options['output'])
+            except ValueError as e:
+                raise CommandError(str(e))
+        else:
+            out = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+            try:
+                for block in iter_csv(header, counting(rows)):
+                    out.write(block)
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+
+        if options['stats']:
+            # ru_maxrss is KiB on Linux, bytes on macOS
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            peak_mb = peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+            self.stderr.write(
+                f"{counted['rows']} row(s) in {time.perf_counter() - started:.2f}s, peak RSS {peak_mb:.1f} MB"
+            )
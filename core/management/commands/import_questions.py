@@ -0,0 +1,138 @@
+import csv
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.ingestion import (
+    DEDUP_MODES, AllDuplicatesError, IngestionError, create_quiz_with_questions, ingest_questions,
+)
+from core.models import Quiz, Subject, User
+
+LETTERS = 'ABCDEFGHIJ'
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    # Accept either a bare list or {"questions": [...]}
+    if isinstance(data, dict):
+        data = data.get('questions')
+    return data
+
+
+def read_csv(path):
+    """
+    Reads a CSV with a 'text' column, option columns (option_a, option_b, ...
+    in column order), a 'correct' column holding a letter (A-D) or 0-based
+    index, and optional 'rationale', 'topic' and 'difficulty' columns.
+    """
+    items = []
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        reader = csv.DictReader(f)
+        option_columns = [name for name in reader.fieldnames or [] if name.lower().startswith('option')]
+        for row in reader:
+            correct = (row.get('correct') or '').strip()
+            if correct.upper() in LETTERS and not correct.isdigit():
+                correct_index = LETTERS.index(correct.upper())
+            else:
+                correct_index = correct
+            items.append({
+                'text': row.get('text'),
+                'options': [row[name] for name in option_columns if (row.get(name) or '').strip()],
+                'correct_index': correct_index,
+                'rationale': row.get('rationale'),
+                'topic': row.get('topic'),
+                'difficulty': (row.get('difficulty') or '').strip().lower() or None,
+            })
+    return items
+
+
+class Command(BaseCommand):
+    help = "Import a question bank from a JSON or CSV file into a new or existing quiz."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="JSON (list of questions) or CSV file")
+        parser.add_argument('--quiz', type=int, help="Add to this existing quiz id")
+        parser.add_argument('--title', help="Title for a new quiz")
+        parser.add_argument('--subject', help="Subject name for a new quiz (created if missing)")
+        parser.add_argument('--creator', help="Username of the teacher who owns a new quiz")
+        parser.add_argument('--time-limit', type=int, default=60, help="Time limit in minutes for a new quiz")
+        parser.add_argument('--difficulty', default='medium', help="Default difficulty for items without one")
+        parser.add_argument('--topic', help="Default topic for items without one")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--duplicates', choices=DEDUP_MODES,
+            help="What to do with near-duplicates of the subject's existing questions (default: QUESTION_DEDUP_MODE)",
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f"File not found: {path}")
+
+        if path.suffix.lower() == '.csv':
+            items = read_csv(path)
+        elif path.suffix.lower() == '.json':
+            items = read_json(path)
+        else:
+            raise CommandError("Only .json and .csv files are supported.")
+
+        started = time.perf_counter()
+        try:
+            if options['quiz']:
+                try:
+                    quiz = Quiz.objects.get(id=options['quiz'])
+                except Quiz.DoesNotExist:
+                    raise CommandError(f"Quiz {options['quiz']} does not exist.")
+                count = ingest_questions(
+                    quiz, items, options['difficulty'], options['topic'], options['batch_size'],
+                    options['duplicates'],
+                )
+            else:
+                quiz = create_quiz_with_questions(
+                    self._new_quiz_fields(options, path),
+                    items,
+                    options['difficulty'],
+                    options['topic'],
+                    options['batch_size'],
+                    options['duplicates'],
+                )
+                count = quiz.questions.count()
+        except AllDuplicatesError as e:
+            raise CommandError(
+                f"Nothing imported: all {e.count} question(s) are near-duplicates of existing questions "
+                f"(--duplicates flag or keep imports them anyway)."
+            )
+        except IngestionError as e:
+            for error in e.errors:
+                self.stderr.write(error)
+            raise CommandError(f"Nothing imported: {len(e.errors)} invalid question(s).")
+        elapsed = time.perf_counter() - started
+
+        rate = count / elapsed if elapsed else count
+        skipped = len(items) - count
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {count} questions into "{quiz.title}" (id {quiz.id}) in {elapsed:.2f}s ({rate:.0f}/s).'
+            + (f' Skipped {skipped} near-duplicate(s).' if skipped else '')
+        ))
+
+    def _new_quiz_fields(self, options, path):
+        if not options['creator']:
+            raise CommandError("--creator is required when creating a new quiz.")
+        try:
+            creator = User.objects.get(username=options['creator'], is_teacher=True)
+        except User.DoesNotExist:
+            raise CommandError(f"No teacher with username '{options['creator']}'.")
+
+        fields = {
+            'title': options['title'] or path.stem,
+            'creator': creator,
+            'time_limit_minutes': options['time_limit'],
+        }
+        if options['subject']:
+            subject, _ = Subject.objects.get_or_create(name=options['subject'])
+            fields['subject'] = subject
+            fields['subject_text'] = subject.name
+        return fields
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search documents for every quiz and question."
+
+    def handle(self, *args, **options):
+        quizzes, questions = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {quizzes} quiz(zes) and {questions} question(s)."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.stats import find_drift, rebuild_all
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialised quiz/teacher dashboard statistics, or check them for drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help="Only report differences from the source tables; exit with an error if any")
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drift = find_drift()
+            for kind, pk, diffs in drift[:50]:
+                details = ', '.join(f"{field}: stored {have} != {want}" for field, (have, want) in diffs.items())
+                self.stdout.write(f"{kind} {pk}: {details}")
+            if drift:
+                raise CommandError(f"{len(drift)} stats row(s) have drifted; run rebuild_stats to fix.")
+            self.stdout.write(self.style.SUCCESS("Stats are in sync."))
+            return
+
+        quizzes, teachers = rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {quizzes} quiz(zes) and {teachers} teacher(s)."))
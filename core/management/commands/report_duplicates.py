@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.dedup import find_clusters
+from core.models import Question, Subject
+
+
+class Command(BaseCommand):
+    help = "Report clusters of near-duplicate questions within each subject, optionally flagging them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subject', type=int, action='append',
+                            help="Only this subject id (repeatable; default: every subject and unfiled quizzes)")
+        parser.add_argument('--threshold', type=float,
+                            help="Estimated similarity needed to count as a duplicate (default: DEDUP_THRESHOLD)")
+        parser.add_argument('--show', type=int, default=10, help="Clusters to print per subject")
+        parser.add_argument('--flag', action='store_true',
+                            help="Set duplicate_of on every clustered question to the oldest question in its cluster")
+
+    def handle(self, *args, **options):
+        threshold = options['threshold']
+        if threshold is not None and not 0 < threshold <= 1:
+            raise CommandError("--threshold must be in (0, 1].")
+
+        if options['subject']:
+            subjects = list(Subject.objects.filter(id__in=options['subject']).values_list('id', 'name'))
+            missing = set(options['subject']) - {subject_id for subject_id, _ in subjects}
+            if missing:
+                raise CommandError(f"No subject with id {', '.join(map(str, sorted(missing)))}.")
+        else:
+            subjects = list(Subject.objects.order_by('name').values_list('id', 'name')) + [(None, '(no subject)')]
+
+        total_clusters = total_duplicates = flagged = 0
+        for subject_id, name in subjects:
+            started = time.perf_counter()
+            clusters = find_clusters(subject_id, threshold)
+            elapsed = time.perf_counter() - started
+            if not clusters:
+                continue
+            duplicates = sum(len(cluster) - 1 for cluster in clusters)
+            total_clusters += len(clusters)
+            total_duplicates += duplicates
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{name}: {len(clusters)} cluster(s), {duplicates} redundant question(s) ({elapsed:.2f}s)"
+            ))
+
+            shown = [question_id for cluster in clusters[:options['show']] for question_id in cluster]
+            texts = dict(Question.objects.filter(id__in=shown).values_list('id', 'text'))
+            for cluster in clusters[:options['show']]:
+                self.stdout.write(f"  {len(cluster)} questions: {', '.join(map(str, cluster[:20]))}")
+                for question_id in cluster[:3]:
+                    self.stdout.write(f"    #{question_id}: {texts.get(question_id, '')[:100]}")
+
+            if options['flag']:
+                for original, *repeats in clusters:
+                    flagged += Question.objects.filter(id__in=repeats).exclude(
+                        duplicate_of_id=original
+                    ).update(duplicate_of_id=original)
+
+        summary = f"{total_clusters} cluster(s), {total_duplicates} redundant question(s)."
+        if options['flag']:
+            summary += f" Flagged {flagged} question(s)."
+        self.stdout.write(self.style.SUCCESS(summary))
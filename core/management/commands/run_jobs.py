@@ -0,0 +1,53 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.jobs import claim_next_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Run the background job worker (AI generation and other slow tasks)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Process the queue until empty, then exit")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Seconds to wait when the queue is empty")
+        parser.add_argument('--max-jobs', type=int, default=0, help="Exit after this many jobs (0 = no limit)")
+        parser.add_argument('--kind', action='append', dest='kinds', help="Only run jobs of this kind (repeatable)")
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help="Requeue jobs left running for this many seconds by a dead worker")
+
+    def handle(self, *args, **options):
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        processed = 0
+        requeued = requeue_stale_jobs(options['stale_after'])
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s).")
+
+        while not self._stopping:
+            close_old_connections()
+            job = claim_next_job(options['kinds'])
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            started = time.perf_counter()
+            run_job(job)
+            job.refresh_from_db()
+            self.stdout.write(f"{job} in {time.perf_counter() - started:.1f}s")
+
+            processed += 1
+            if options['max_jobs'] and processed >= options['max_jobs']:
+                break
+
+        self.stdout.write(f"Worker exiting after {processed} job(s).")
+
+    def _stop(self, signum, frame):
+        # Finish the current job, then exit
+        self._stopping = True
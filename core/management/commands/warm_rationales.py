@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from core.jobs import enqueue
+from core.rationales import questions_needing_rationale, warm_rationales
+
+
+class Command(BaseCommand):
+    help = ("Pre-generate AI rationales for questions that lack one, so result review "
+            "is served from the database. Safe to re-run: only missing rationales are requested.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, action='append', dest='quiz_ids', help="Quiz id (repeatable)")
+        parser.add_argument('--since', help="Only quizzes created at or after this ISO datetime")
+        parser.add_argument('--until', help="Only quizzes created before this ISO datetime")
+        parser.add_argument('--concurrency', type=int, default=settings.RATIONALE_WARMUP_CONCURRENCY)
+        parser.add_argument('--rate', type=float, default=settings.RATIONALE_WARMUP_RATE,
+                            help="Maximum AI calls per second (0 = unlimited)")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many AI calls would be made")
+        parser.add_argument('--background', action='store_true', help="Queue a job for the run_jobs worker instead")
+
+    def handle(self, *args, **options):
+        since = self._parse(options['since'], '--since')
+        until = self._parse(options['until'], '--until')
+        questions = questions_needing_rationale(options['quiz_ids'], since, until)
+
+        if options['dry_run']:
+            count = questions.count()
+            quizzes = questions.values('quiz_id').distinct().count()
+            self.stdout.write(f"Would make {count} AI call(s) for {quizzes} quiz(zes).")
+            return
+
+        if options['background']:
+            job = enqueue('warm_rationales', {
+                'quiz_ids': options['quiz_ids'],
+                'since': options['since'],
+                'until': options['until'],
+                'concurrency': options['concurrency'],
+                'rate': options['rate'],
+            })
+            self.stdout.write(self.style.SUCCESS(f"Queued {job}."))
+            return
+
+        def report(done, total):
+            self.stdout.write(f"  {done}/{total}")
+
+        stats = warm_rationales(questions, options['concurrency'], options['rate'], progress=report)
+        self.stdout.write(self.style.SUCCESS(
+            f"Saved {stats['saved']} of {stats['total']} rationale(s); {stats['failed']} failed (re-run to retry)."
+        ))
+
+    def _parse(self, value, flag):
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise CommandError(f"{flag} must be an ISO datetime, e.g. 2026-01-31T09:00:00Z")
+        return parsed
@@ -0,0 +1,218 @@
+"""
+Per-request performance metrics.
+
+PerformanceMiddleware opens a RequestStats for every request in a context
+variable. The collectors below add to it from wherever the work happens,
+including sync_to_async threads, which copy the context:
+
+- database: an execute wrapper installed on every new connection
+  (connection_created) times each query;
+- caches: core.answer_cache and core.ai_cache report hits and misses;
+- AI: core.ai_client reports each Gemini call's latency.
+
+At the end of the request the totals are written as one JSON log line on
+the 'core.perf' logger and folded into in-process histograms and counters,
+which the staff-only metrics view renders in Prometheus text format. Each
+worker process keeps its own numbers; Prometheus sums them per instance.
+"""
+import contextvars
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger('core.perf')
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+AI_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        for label_values, value in values:
+            yield f'{self.name}{_label_text(self.labels, label_values)} {value}'
+
+
+class Gauge(Counter):
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    def collect(self):
+        for line in super().collect():
+            yield line.replace(' counter', ' gauge') if line.startswith('# TYPE') else line
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, as Prometheus expects."""
+
+    def __init__(self, name, help_text, buckets, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [count per bucket..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def collect(self):
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        names = self.labels + ('le',)
+        for label_values, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values[:-1]):
+                cumulative += count
+                yield f'{self.name}_bucket{_label_text(names, label_values + (bound,))} {cumulative}'
+            labels = _label_text(self.labels, label_values)
+            yield f'{self.name}_sum{labels} {values[-1]:.6f}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+REQUEST_SECONDS = Histogram(
+    'prepcbt_request_duration_seconds', 'Request latency by view.', TIME_BUCKETS, ('view', 'method', 'status'),
+)
+REQUEST_QUERIES = Histogram('prepcbt_request_db_queries', 'Database queries per request.', QUERY_BUCKETS, ('view',))
+REQUEST_DB_SECONDS = Histogram('prepcbt_request_db_seconds', 'Database time per request.', TIME_BUCKETS, ('view',))
+AI_CALL_SECONDS = Histogram('prepcbt_ai_call_duration_seconds', 'Outbound Gemini call latency.', AI_BUCKETS, ('view',))
+CACHE_EVENTS = Counter('prepcbt_cache_events_total', 'App cache lookups by outcome.', ('cache', 'outcome'))
+IN_FLIGHT = Gauge('prepcbt_requests_in_flight', 'Requests being served by this process.')
+PROFILES = Counter('prepcbt_profiles_saved_total', 'Slow requests whose profile was saved.', ('view',))
+STARTUP_SECONDS = Gauge('prepcbt_startup_seconds', 'Application import and warm-up time (core.startup).', ('step',))
+REGISTRY = [
+    REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_DB_SECONDS, AI_CALL_SECONDS, CACHE_EVENTS, IN_FLIGHT, PROFILES,
+    STARTUP_SECONDS,
+]
+
+
+def render_prometheus():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    return '\n'.join(lines) + '\n'
+
+
+# --- Per-request collection ---
+
+@dataclass
+class RequestStats:
+    started: float = field(default_factory=time.perf_counter)
+    queries: int = 0
+    db_time: float = 0.0
+    cache: dict = field(default_factory=dict)  # 'cache.outcome' -> count
+    ai_calls: list = field(default_factory=list)  # latencies, seconds
+
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+def begin_request():
+    IN_FLIGHT.inc()
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def end_request(request, response, stats, token):
+    """Records the finished request; returns its latency in seconds."""
+    _current.reset(token)
+    IN_FLIGHT.dec()
+    elapsed = time.perf_counter() - stats.started
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match else '<unresolved>'
+    status = response.status_code if response is not None else 500
+
+    REQUEST_SECONDS.observe(elapsed, view, request.method, f'{status // 100}xx')
+    REQUEST_QUERIES.observe(stats.queries, view)
+    REQUEST_DB_SECONDS.observe(stats.db_time, view)
+    for latency in stats.ai_calls:
+        AI_CALL_SECONDS.observe(latency, view)
+
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': status,
+            'ms': round(elapsed * 1000, 1),
+            'queries': stats.queries,
+            'db_ms': round(stats.db_time * 1000, 1),
+            'cache': stats.cache,
+            'ai_calls': len(stats.ai_calls),
+            'ai_ms': round(sum(stats.ai_calls) * 1000, 1),
+        }, separators=(',', ':')))
+    return elapsed
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+def record_cache(cache_name, outcome, amount=1):
+    CACHE_EVENTS.inc(cache_name, outcome, amount=amount)
+    stats = _current.get()
+    if stats is not None:
+        key = f'{cache_name}.{outcome}'
+        stats.cache[key] = stats.cache.get(key, 0) + amount
+
+
+def record_ai_call(latency):
+    stats = _current.get()
+    if stats is not None:
+        stats.ai_calls.append(latency)
+    else:
+        # Background jobs and commands: still worth a histogram sample
+        AI_CALL_SECONDS.observe(latency, '<background>')
@@ -0,0 +1,131 @@
+"""
+Project middleware.
+
+Every middleware in the stack must be async-capable for async views to run
+on the event loop under ASGI: one sync-only layer makes Django run the rest
+of the request, async views included, inside a thread.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics, profiling
+
+
+class PerformanceMiddleware:
+    """
+    Records each request's latency, queries, cache events and AI calls
+    (core.metrics), and profiles sampled slow requests to the views in
+    PERF_PROFILE_VIEWS (core.profiling). First in MIDDLEWARE so the
+    latency covers the whole stack.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            # A coroutine, so Django does not hop to a thread for it on every request
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats, token = metrics.begin_request()
+        response = None
+        try:
+            response = self.get_response(request)
+        finally:
+            self._stop_profiler(request)
+            elapsed = metrics.end_request(request, response, stats, token)
+        self._save_profile(request, elapsed)
+        return response
+
+    async def __acall__(self, request):
+        stats, token = metrics.begin_request()
+        response = None
+        try:
+            response = await self.get_response(request)
+        finally:
+            if getattr(request, '_profiler', None) is not None:
+                # Thread-sensitive, so it runs on the request's sync thread, where it was started
+                await sync_to_async(self._stop_profiler)(request)
+            elapsed = metrics.end_request(request, response, stats, token)
+        if getattr(request, '_profiler', None) is not None:
+            await sync_to_async(self._save_profile, thread_sensitive=False)(request, elapsed)
+        return response
+
+    # The profiler is only started here, never by calling the view: later middleware
+    # (CSRF included) must still get its process_view. Django runs process_view and a sync
+    # view on the same thread, so the profile covers just this request. Async views are
+    # left alone.
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not iscoroutinefunction(view_func) and profiling.wants_profile(request.resolver_match.view_name):
+            self._start_profiler(request)
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        if not iscoroutinefunction(view_func) and profiling.wants_profile(request.resolver_match.view_name):
+            # Thread-sensitive: the request's thread, which Django also runs the sync view on
+            await sync_to_async(self._start_profiler)(request)
+
+    @staticmethod
+    def _start_profiler(request):
+        request._profiler = profiling.new_profiler()
+        request._profiler.start()
+
+    @staticmethod
+    def _stop_profiler(request):
+        profiler = getattr(request, '_profiler', None)
+        if profiler is not None:
+            profiler.stop()
+
+    @staticmethod
+    def _save_profile(request, elapsed):
+        profiler = getattr(request, '_profiler', None)
+        if profiler is None:
+            return
+        view_name = request.resolver_match.view_name
+        if profiling.save_if_slow(profiler, view_name, elapsed):
+            metrics.PROFILES.inc(view_name)
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise (sync-only as of 6.x) made async-capable. Static files are
+    served exactly as WhiteNoise serves them, from a thread when running
+    async; everything else goes straight to the next handler.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            response = await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+            if response.streaming:
+                # An async iterator, so the ASGI handler does not have to consume the file in one go
+                response.streaming_content = _read_in_thread(response.streaming_content)
+            return response
+        return await self.get_response(request)
+
+
+async def _read_in_thread(chunks):
+    read = sync_to_async(next, thread_sensitive=False)
+    while (chunk := await read(chunks, None)) is not None:
+        yield chunk
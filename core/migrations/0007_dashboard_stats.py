@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def backfill_stats(apps, schema_editor):
+    # Self-contained (historical models only) so later changes to core.stats cannot break it
+    Quiz = apps.get_model('core', 'Quiz')
+    Question = apps.get_model('core', 'Question')
+    Result = apps.get_model('core', 'Result')
+    QuizStats = apps.get_model('core', 'QuizStats')
+    TeacherStats = apps.get_model('core', 'TeacherStats')
+
+    question_counts = dict(
+        Question.objects.values('quiz_id').annotate(n=Count('id')).values_list('quiz_id', 'n')
+    )
+    scores = {
+        row['quiz_id']: row
+        for row in Result.objects.values('quiz_id').annotate(
+            attempt_count=Count('id'), score_sum=Sum('score'), score_min=Min('score'), score_max=Max('score'),
+        )
+    }
+
+    quiz_stats, teacher_stats = [], {}
+    for quiz_id, creator_id in Quiz.objects.values_list('id', 'creator_id'):
+        row = scores.get(quiz_id, {})
+        stats = QuizStats(
+            quiz_id=quiz_id,
+            question_count=question_counts.get(quiz_id, 0),
+            attempt_count=row.get('attempt_count', 0),
+            score_sum=row.get('score_sum') or 0,
+            score_min=row.get('score_min'),
+            score_max=row.get('score_max'),
+        )
+        quiz_stats.append(stats)
+
+        teacher = teacher_stats.setdefault(creator_id, TeacherStats(teacher_id=creator_id))
+        teacher.quiz_count += 1
+        teacher.question_count += stats.question_count
+        teacher.attempt_count += stats.attempt_count
+
+    QuizStats.objects.bulk_create(quiz_stats, batch_size=1000)
+    TeacherStats.objects.bulk_create(teacher_stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_dashboard_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizStats',
+            fields=[
+                ('quiz', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.quiz')),
+                ('question_count', models.PositiveIntegerField(default=0)),
+                ('attempt_count', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0)),
+                ('score_min', models.FloatField(blank=True, null=True)),
+                ('score_max', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TeacherStats',
+            fields=[
+                ('teacher', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='teacher_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('quiz_count', models.PositiveIntegerField(default=0)),
+                ('question_count', models.PositiveIntegerField(default=0)),
+                ('attempt_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
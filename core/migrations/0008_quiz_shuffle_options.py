@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_dashboard_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='shuffle_options',
+            field=models.BooleanField(default=False, help_text='Show each student the options in a different order'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_quiz_shuffle_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examattempt',
+            name='seed',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='examattempt',
+            name='selection',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='questions_per_attempt',
+            field=models.PositiveIntegerField(blank=True, help_text='Give each student this many questions drawn from the pool, balanced by difficulty and topic (blank: all)', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['quiz', 'difficulty', 'topic'], name='question_quiz_strata'),
+        ),
+    ]
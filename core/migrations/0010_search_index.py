@@ -0,0 +1,113 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Frozen copies of the index DDL and document format core.search relies on, so later changes to
+# that module cannot change what this migration does
+FTS_TABLE = 'core_searchdocument_fts'
+BATCH_SIZE = 500
+
+INSTALL = {
+    'sqlite': [
+        f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+            title, body, content='core_searchdocument', content_rowid='id',
+            tokenize='porter unicode61 remove_diacritics 2', prefix='2 3'
+        )""",
+        f"""CREATE TRIGGER core_searchdocument_ai AFTER INSERT ON core_searchdocument BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (new.id, new.title, new.body);
+        END""",
+        f"""CREATE TRIGGER core_searchdocument_ad AFTER DELETE ON core_searchdocument BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+        END""",
+        f"""CREATE TRIGGER core_searchdocument_au AFTER UPDATE ON core_searchdocument BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+            INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (new.id, new.title, new.body);
+        END""",
+    ],
+    'postgresql': [
+        """ALTER TABLE core_searchdocument ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(body, '')), 'B')
+        ) STORED""",
+        "CREATE INDEX core_searchdocument_vector_gin ON core_searchdocument USING gin (search_vector)",
+    ],
+}
+UNINSTALL = {
+    'sqlite': [
+        "DROP TRIGGER IF EXISTS core_searchdocument_au",
+        "DROP TRIGGER IF EXISTS core_searchdocument_ad",
+        "DROP TRIGGER IF EXISTS core_searchdocument_ai",
+        f"DROP TABLE IF EXISTS {FTS_TABLE}",
+    ],
+    'postgresql': [
+        "DROP INDEX IF EXISTS core_searchdocument_vector_gin",
+        "ALTER TABLE core_searchdocument DROP COLUMN IF EXISTS search_vector",
+    ],
+}
+
+
+def install_index(apps, schema_editor):
+    for statement in INSTALL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def uninstall_index(apps, schema_editor):
+    for statement in UNINSTALL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def _join(*parts):
+    return '\n'.join(part for part in parts if part)
+
+
+def backfill_documents(apps, schema_editor):
+    Quiz = apps.get_model('core', 'Quiz')
+    Question = apps.get_model('core', 'Question')
+    SearchDocument = apps.get_model('core', 'SearchDocument')
+
+    SearchDocument.objects.bulk_create(
+        [
+            SearchDocument(kind='quiz', object_id=quiz_id, quiz_id=quiz_id, title=title, body=_join(subject_name, subject_text))
+            for quiz_id, title, subject_text, subject_name in
+            Quiz.objects.values_list('id', 'title', 'subject_text', 'subject__name')
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    rows = Question.objects.order_by('id').values_list('id', 'quiz_id', 'text', 'topic', 'rationale')
+    batch = []
+    for question_id, quiz_id, text, topic, rationale in rows.iterator(chunk_size=BATCH_SIZE):
+        batch.append(SearchDocument(
+            kind='question', object_id=question_id, quiz_id=quiz_id, title=text, body=_join(topic, rationale),
+        ))
+        if len(batch) >= BATCH_SIZE:
+            SearchDocument.objects.bulk_create(batch)
+            batch = []
+    SearchDocument.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_question_sampling'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('quiz', 'Quiz'), ('question', 'Question')], max_length=10)),
+                ('object_id', models.PositiveIntegerField()),
+                ('title', models.TextField()),
+                ('body', models.TextField(blank=True)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.quiz')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_document')],
+            },
+        ),
+        migrations.RunPython(install_index, uninstall_index),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_question_duplicate_of'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='attemptanswer',
+            constraint=models.UniqueConstraint(fields=('result', 'question'), name='unique_result_question'),
+        ),
+        migrations.RemoveIndex(
+            model_name='attemptanswer',
+            name='attemptanswer_result_question',
+        ),
+    ]
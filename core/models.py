@@ -1,10 +1,22 @@
+import struct
+from datetime import timedelta
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
 class User(AbstractUser):
     is_student = models.BooleanField(default=False)
     is_teacher = models.BooleanField(default=False)
 
+    def get_session_auth_hash(self):
+        # Users from CachedModelBackend come without the password hash but with its HMAC;
+        # once the password is loaded or changed it is the source of truth again
+        cached = self.__dict__.get('cached_session_auth_hash')
+        if cached is not None and 'password' not in self.__dict__:
+            return cached
+        return super().get_session_auth_hash()
+
 class Subject(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
@@ -19,7 +31,18 @@ class Quiz(models.Model):
     subject_text = models.CharField(max_length=100, blank=True, help_text="Legacy subject field") # Renamed from 'subject'
     creator = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'is_teacher': True})
     time_limit_minutes = models.PositiveIntegerField()
+    shuffle_options = models.BooleanField(default=False, help_text="Show each student the options in a different order")
+    questions_per_attempt = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Give each student this many questions drawn from the pool, balanced by difficulty and topic (blank: all)",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination on the student dashboard (newest first)
+            models.Index(fields=['created_at', 'id'], name='quiz_created_id'),
+        ]
     
     def __str__(self):
         return self.title
@@ -36,6 +59,14 @@ class Question(models.Model):
     topic = models.CharField(max_length=100, blank=True, null=True)
     # Remove option_a, option_b, etc. from here
     rationale = models.TextField(blank=True, null=True) 
+    # Set when ingestion finds this question repeats an earlier one (core.dedup)
+    duplicate_of = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    class Meta:
+        indexes = [
+            # Covers the strata index build for per-attempt sampling (core.sampling)
+            models.Index(fields=['quiz', 'difficulty', 'topic'], name='question_quiz_strata'),
+        ]
     
 class Option(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='options')
@@ -50,6 +81,187 @@ class Result(models.Model):
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='results')
     score = models.FloatField()
     completed_on = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'quiz'], name='result_student_quiz'),
+        ]
     
     def __str__(self):
-        return f"{self.student.username} - {self.quiz.title} - {self.score}%"
\ No newline at end of file
+        return f"{self.student.username} - {self.quiz.title} - {self.score}%"
+
+class ExamAttempt(models.Model):
+    """
+    Server-side exam session. The deadline is fixed when the attempt starts,
+    answers are autosaved as AttemptAnswer rows and submission seals them
+    into a Result.
+    """
+    student = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'is_student': True}, related_name='exam_attempts')
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='attempts')
+    started_at = models.DateTimeField(default=timezone.now)
+    deadline = models.DateTimeField()
+    submitted_at = models.DateTimeField(null=True, blank=True)
+    result = models.OneToOneField(Result, on_delete=models.SET_NULL, null=True, blank=True, related_name='attempt')
+    # Sampled quizzes only: the seed the paper was drawn with and the drawn
+    # question ids packed as little-endian int64s (see core.sampling)
+    seed = models.BigIntegerField(null=True, blank=True)
+    selection = models.BinaryField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'quiz'], name='unique_exam_attempt'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} - {self.quiz_id} (until {self.deadline:%H:%M:%S})"
+
+    @property
+    def is_submitted(self):
+        return self.submitted_at is not None
+
+    @property
+    def selected_question_ids(self):
+        """The attempt's question ids in paper order, or None when it serves the whole quiz."""
+        if self.selection is None:
+            return None
+        data = bytes(self.selection)
+        return struct.unpack(f'<{len(data) // 8}q', data)
+
+    def seconds_remaining(self, now=None):
+        now = now or timezone.now()
+        return max(0, int((self.deadline - now).total_seconds()))
+
+    def accepts_answers(self, grace_seconds=0, now=None):
+        """True while the attempt is open, allowing grace_seconds past the deadline for network lag."""
+        now = now or timezone.now()
+        return not self.is_submitted and now <= self.deadline + timedelta(seconds=grace_seconds)
+
+
+class AttemptAnswer(models.Model):
+    """
+    One selected option per question. Rows are autosaved against an
+    ExamAttempt while the exam runs and linked to the Result on submission.
+    """
+    attempt = models.ForeignKey(ExamAttempt, on_delete=models.CASCADE, null=True, blank=True, related_name='answers')
+    result = models.ForeignKey(Result, on_delete=models.CASCADE, null=True, blank=True, related_name='answers')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='attempt_answers')
+    option = models.ForeignKey(Option, on_delete=models.CASCADE, related_name='attempt_answers')
+    is_correct = models.BooleanField(default=False)
+    answered_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['question', 'option'], name='attemptanswer_question_option'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['attempt', 'question'], name='unique_attempt_question'),
+            # One answer per question in a result; its unique index also serves (result, question) lookups
+            models.UniqueConstraint(fields=['result', 'question'], name='unique_result_question'),
+        ]
+
+    def __str__(self):
+        return f"Result {self.result_id} - Q{self.question_id}: {self.option_id}"
+
+
+class BackgroundJob(models.Model):
+    """
+    A unit of slow work (e.g. AI quiz generation) queued in the database and
+    picked up by the run_jobs worker command instead of a web worker.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    progress = models.PositiveSmallIntegerField(default=0)
+    message = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='backgroundjob_status_created'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_SUCCEEDED, self.STATUS_FAILED)
+
+
+class QuizStats(models.Model):
+    """
+    Denormalised per-quiz counters kept up to date by core.stats as questions
+    and results are written. Rebuild with `manage.py rebuild_stats`.
+    """
+    quiz = models.OneToOneField(Quiz, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    question_count = models.PositiveIntegerField(default=0)
+    attempt_count = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0)
+    score_min = models.FloatField(null=True, blank=True)
+    score_max = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stats for quiz {self.quiz_id}"
+
+    @property
+    def score_mean(self):
+        return self.score_sum / self.attempt_count if self.attempt_count else None
+
+
+class TeacherStats(models.Model):
+    """Per-teacher rollup of QuizStats shown on the teacher dashboard."""
+    teacher = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='teacher_stats')
+    quiz_count = models.PositiveIntegerField(default=0)
+    question_count = models.PositiveIntegerField(default=0)
+    attempt_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stats for teacher {self.teacher_id}"
+
+
+class SearchDocument(models.Model):
+    """
+    Searchable text of one quiz or question, kept in sync by core.search.
+    The full-text index over it is backend specific: an FTS5 table fed by
+    triggers on SQLite, a generated tsvector column with a GIN index on
+    PostgreSQL (see migration 0010).
+    """
+    KIND_QUIZ = 'quiz'
+    KIND_QUESTION = 'question'
+    KIND_CHOICES = [
+        (KIND_QUIZ, 'Quiz'),
+        (KIND_QUESTION, 'Question'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='+')
+    title = models.TextField()
+    body = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_document'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}"
@@ -0,0 +1,110 @@
+"""
+Pre-rendered exam papers for take_quiz.
+
+The question/option markup is rendered once per quiz version and cached
+through answer_cache.versioned (local LRU, then the shared cache), so the
+start-of-exam spike costs a cache read per student instead of a prefetch
+and a full template loop. Each question is stored as fixed HTML pieces
+around two holes, its number and its options, which lets a paper be
+assembled per student by joining strings: in any question order or subset
+(core.sampling), with options shuffled by a per-student seed. Everything else student-specific
+(CSRF token, timer, saved answers) stays in take_quiz.html.
+"""
+import random
+from dataclasses import dataclass
+
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .answer_cache import get_question_payload, get_question_subset, versioned, versioned_many
+
+QUESTION_TEMPLATE = 'core/student/partials/exam_question.html'
+OPTION_TEMPLATE = 'core/student/partials/exam_option.html'
+
+# Rendered into the templates in place of the per-student parts, then split on
+NUMBER_SLOT = '__PAPER_NUMBER__'
+OPTIONS_SLOT = '__PAPER_OPTIONS__'
+
+
+@dataclass
+class QuestionFragment:
+    before_number: str
+    before_options: str
+    after_options: str
+    options: tuple  # ((option_id, html), ...)
+
+
+@dataclass
+class ExamPaper:
+    question_ids: tuple
+    fragments: dict  # question_id -> QuestionFragment
+
+
+def render_fragment(question):
+    html = render_to_string(QUESTION_TEMPLATE, {
+        'question': question, 'number': NUMBER_SLOT, 'options': OPTIONS_SLOT,
+    })
+    # The number precedes the question text and the options follow it, so
+    # splitting from each end is safe whatever the question text contains
+    before_number, rest = html.split(NUMBER_SLOT, 1)
+    before_options, after_options = rest.rsplit(OPTIONS_SLOT, 1)
+    options = tuple(
+        (option['id'], render_to_string(OPTION_TEMPLATE, {'question': question, 'option': option}))
+        for option in question['options']
+    )
+    return QuestionFragment(before_number, before_options, after_options, options)
+
+
+def build_paper(quiz_id):
+    questions = get_question_payload(quiz_id)
+    return ExamPaper(
+        question_ids=tuple(question['id'] for question in questions),
+        fragments={question['id']: render_fragment(question) for question in questions},
+    )
+
+
+def get_paper(quiz_id):
+    return versioned(quiz_id, 'paper', build_paper)
+
+
+def get_partial_paper(quiz_id, question_ids):
+    """
+    A paper holding only question_ids (a sampled attempt). Fragments are
+    cached per question, so a large pool is never rendered or loaded whole.
+    """
+    def load(quiz_id, missing):
+        return {question['id']: render_fragment(question) for question in get_question_subset(quiz_id, missing)}
+
+    return ExamPaper(question_ids=tuple(question_ids), fragments=versioned_many(quiz_id, 'fragment', question_ids, load))
+
+
+def assemble_paper(paper, question_ids=None, shuffle_seed=None):
+    """
+    Joins the cached fragments into the paper's HTML. question_ids picks and
+    orders the questions (default: all, in quiz order); shuffle_seed, if
+    given, shuffles each question's options deterministically for that seed.
+    """
+    parts = []
+    ids = paper.question_ids if question_ids is None else question_ids
+    ids = [question_id for question_id in ids if question_id in paper.fragments]
+    for number, question_id in enumerate(ids, 1):
+        fragment = paper.fragments[question_id]
+        options = list(fragment.options)
+        if shuffle_seed is not None:
+            # Seeded per question so a question's order is stable across reloads
+            random.Random(f'{shuffle_seed}:{question_id}').shuffle(options)
+        parts.append(fragment.before_number)
+        parts.append(str(number))
+        parts.append(fragment.before_options)
+        parts.extend(html for _, html in options)
+        parts.append(fragment.after_options)
+    return mark_safe(''.join(parts))
+
+
+def exam_paper_html(quiz, attempt):
+    """The paper a student sees for an attempt."""
+    seed = (attempt.seed or attempt.pk) if quiz.shuffle_options else None
+    question_ids = attempt.selected_question_ids
+    if question_ids is None:
+        return assemble_paper(get_paper(quiz.id), shuffle_seed=seed)
+    return assemble_paper(get_partial_paper(quiz.id, question_ids), shuffle_seed=seed)
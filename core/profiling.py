@@ -0,0 +1,118 @@
+"""
+Opt-in profiling of slow requests.
+
+For the views named in PERF_PROFILE_VIEWS, a PERF_PROFILE_SAMPLE_RATE
+fraction of requests run under a profiler; when one takes longer than
+PERF_PROFILE_THRESHOLD_MS its profile is written to PERF_PROFILE_DIR:
+
+- 'cprofile' (default): <name>.prof (open with snakeviz for an icicle
+  graph, or pstats) plus <name>.txt, the top functions by cumulative time.
+- 'sample': a stack sampler that reads the view thread's frame every
+  PERF_PROFILE_INTERVAL_MS and writes <name>.folded, collapsed stacks for
+  flamegraph.pl or speedscope. Far cheaper than cProfile, so it suits a
+  higher sample rate.
+
+Only sync views are profiled. PerformanceMiddleware starts the profiler in
+process_view, on the thread the view runs on, and stops it once the response
+is back, so the profile covers the view and the middleware after
+PerformanceMiddleware for just that request.
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+logger = logging.getLogger('core.perf')
+
+
+def profiled_views():
+    views = getattr(settings, 'PERF_PROFILE_VIEWS', ())
+    if isinstance(views, str):
+        views = [name.strip() for name in views.split(',')]
+    return {name for name in views if name}
+
+
+def wants_profile(view_name):
+    return view_name in profiled_views() and random.random() < getattr(settings, 'PERF_PROFILE_SAMPLE_RATE', 0.1)
+
+
+class CProfiler:
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def save(self, base_path):
+        self.profile.dump_stats(base_path + '.prof')
+        report = io.StringIO()
+        pstats.Stats(self.profile, stream=report).sort_stats('cumulative').print_stats(40)
+        with open(base_path + '.txt', 'w') as f:
+            f.write(report.getvalue())
+        return base_path + '.prof'
+
+
+class StackSampler:
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = None
+        self._thread = None
+
+    def _sample(self, thread_id, stop):
+        while not stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        """Starts sampling the calling thread."""
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, args=(threading.get_ident(), self._stop), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def save(self, base_path):
+        with open(base_path + '.folded', 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+        return base_path + '.folded'
+
+
+def new_profiler():
+    if getattr(settings, 'PERF_PROFILE_MODE', 'cprofile') == 'sample':
+        return StackSampler(getattr(settings, 'PERF_PROFILE_INTERVAL_MS', 5) / 1000)
+    return CProfiler()
+
+
+def save_if_slow(profiler, view_name, elapsed):
+    """Writes the profile if the request was over the threshold. Returns the path or None."""
+    if elapsed * 1000 < getattr(settings, 'PERF_PROFILE_THRESHOLD_MS', 500):
+        return None
+    directory = getattr(settings, 'PERF_PROFILE_DIR', 'profiles')
+    os.makedirs(directory, exist_ok=True)
+    name = f"{view_name.replace(':', '-')}-{time.strftime('%Y%m%d-%H%M%S')}-{int(elapsed * 1000)}ms-{os.getpid()}"
+    path = profiler.save(os.path.join(directory, name))
+    logger.warning("Profiled slow request to %s (%.0fms): %s", view_name, elapsed * 1000, path)
+    return path
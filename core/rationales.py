@@ -0,0 +1,117 @@
+"""
+Pre-computing question rationales.
+
+get_explanation_ai serves Question.rationale from the database when it is
+usable and otherwise calls Gemini while the student waits. warm_rationales()
+fills the gaps ahead of time in concurrent, rate-limited batches so result
+review never has to wait on the AI. Each batch is saved as it completes, so
+an interrupted run simply resumes with whatever is still missing.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Length
+
+from .ai_utils import get_ai_explanation
+from .answer_cache import bump_quiz_version
+from .models import Option, Question
+from .search import index_questions
+
+MIN_RATIONALE_LENGTH = 10
+
+
+def has_usable_rationale(text):
+    return bool(text) and len(text) > MIN_RATIONALE_LENGTH
+
+
+def is_usable_explanation(text):
+    """AI output worth storing as a rationale (not an apology or empty reply)."""
+    return has_usable_rationale(text) and "Could not" not in text
+
+
+def questions_needing_rationale(quiz_ids=None, since=None, until=None):
+    """Questions without a usable rationale, optionally limited to quizzes or a quiz creation window."""
+    questions = Question.objects.annotate(rationale_length=Length('rationale')).filter(
+        Q(rationale__isnull=True) | Q(rationale_length__lte=MIN_RATIONALE_LENGTH)
+    )
+    if quiz_ids:
+        questions = questions.filter(quiz_id__in=quiz_ids)
+    if since:
+        questions = questions.filter(quiz__created_at__gte=since)
+    if until:
+        questions = questions.filter(quiz__created_at__lt=until)
+    return questions.order_by('id')
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across threads (rate <= 0 disables it)."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        time.sleep(max(0, slot - now))
+
+
+def warm_rationales(questions, concurrency=4, rate=2.0, batch_size=20, progress=None):
+    """
+    Generates and stores rationales for the given Question queryset.
+
+    Returns a dict with 'total', 'saved' and 'failed' counts. progress, if
+    given, is called as progress(done, total) after each batch.
+    """
+    question_ids = list(questions.values_list('id', flat=True))
+    total = len(question_ids)
+    stats = {'total': total, 'saved': 0, 'failed': 0}
+    limiter = RateLimiter(rate)
+
+    def explain(question, correct_text):
+        limiter.wait()
+        return get_ai_explanation(question.text, correct_text)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        for start in range(0, total, batch_size):
+            batch_ids = question_ids[start:start + batch_size]
+            batch = list(Question.objects.filter(id__in=batch_ids).only('id', 'quiz_id', 'text', 'topic', 'rationale'))
+            correct_text = dict(
+                Option.objects.filter(question_id__in=batch_ids, is_correct=True)
+                .values_list('question_id', 'text')
+            )
+
+            futures = [
+                (question, pool.submit(explain, question, correct_text.get(question.id, "Unknown")))
+                for question in batch
+            ]
+            updated = []
+            for question, future in futures:
+                explanation, error = future.result()
+                if error or not is_usable_explanation(explanation):
+                    stats['failed'] += 1
+                    continue
+                question.rationale = explanation
+                updated.append(question)
+
+            if updated:
+                with transaction.atomic():
+                    Question.objects.bulk_update(updated, ['rationale'])
+                    index_questions(updated)
+                    # bulk_update skips signals; refresh cached review payloads
+                    for quiz_id in {question.quiz_id for question in updated}:
+                        transaction.on_commit(lambda quiz_id=quiz_id: bump_quiz_version(quiz_id))
+                stats['saved'] += len(updated)
+
+            if progress:
+                progress(min(start + batch_size, total), total)
+
+    return stats
@@ -0,0 +1,97 @@
+"""
+Per-student question papers drawn from a large pool.
+
+A quiz with questions_per_attempt set gives each attempt a stratified
+random sample of its questions: every (difficulty, topic) stratum
+contributes in proportion to its share of the pool (largest-remainder
+rounding), so each paper has the pool's balance.
+
+The strata index is one values_list query over the quiz's questions,
+grouped into sorted id arrays and cached per quiz version. Drawing from it
+is O(sample size) random picks, with no ORDER BY RANDOM() over the pool.
+The draw is fully determined by the attempt's seed and the index. The
+result is packed into ExamAttempt.selection (8 bytes per question), so
+grading and review load only the selected questions.
+"""
+import random
+import struct
+from array import array
+from dataclasses import dataclass
+
+from .answer_cache import versioned
+from .models import Question
+
+_system_random = random.SystemRandom()
+
+
+@dataclass
+class Strata:
+    keys: tuple   # ((difficulty, topic), ...) in sorted order
+    ids: tuple    # one array('q') of question ids per key, ascending
+
+    @property
+    def total(self):
+        return sum(len(ids) for ids in self.ids)
+
+
+def build_strata(quiz_id):
+    groups = {}
+    rows = Question.objects.filter(quiz_id=quiz_id).order_by('id').values_list('id', 'difficulty', 'topic')
+    for question_id, difficulty, topic in rows.iterator(chunk_size=5000):
+        groups.setdefault((difficulty or '', (topic or '').strip().lower()), array('q')).append(question_id)
+    keys = tuple(sorted(groups))
+    return Strata(keys=keys, ids=tuple(groups[key] for key in keys))
+
+
+def get_strata(quiz_id):
+    return versioned(quiz_id, 'strata', build_strata)
+
+
+def allocate(sizes, count, rng):
+    """
+    Splits count across strata in proportion to sizes (largest remainder;
+    ties broken by rng). Never allocates more than a stratum holds.
+    """
+    total = sum(sizes)
+    if count >= total:
+        return list(sizes)
+    quotas = [count * size / total for size in sizes]
+    allocation = [int(quota) for quota in quotas]
+    remainder = count - sum(allocation)
+    by_fraction = sorted(range(len(sizes)), key=lambda i: (allocation[i] - quotas[i], rng.random()))
+    for i in by_fraction[:remainder]:
+        allocation[i] += 1
+    return allocation
+
+
+def draw_questions(strata, count, seed):
+    """Returns count question ids sampled from strata, in paper order, for seed."""
+    rng = random.Random(seed)
+    selected = []
+    for ids, take in zip(strata.ids, allocate([len(ids) for ids in strata.ids], count, rng)):
+        selected.extend(ids[index] for index in rng.sample(range(len(ids)), take))
+    # Interleave the strata rather than serving them in blocks
+    rng.shuffle(selected)
+    return selected
+
+
+def new_seed():
+    return _system_random.getrandbits(62)
+
+
+def pack_question_ids(question_ids):
+    return struct.pack(f'<{len(question_ids)}q', *question_ids)
+
+
+def sample_for_quiz(quiz, seed):
+    """
+    Packed selection for a new attempt on quiz, or None when the quiz serves
+    every question (no questions_per_attempt, or the pool is not larger).
+    """
+    count = quiz.questions_per_attempt
+    if not count:
+        return None
+    strata = get_strata(quiz.id)
+    if count >= strata.total:
+        return None
+    return pack_question_ids(draw_questions(strata, count, seed))
@@ -0,0 +1,184 @@
+"""
+Full-text search over quizzes and questions.
+
+Every quiz and question has a SearchDocument row (title plus a body of
+subject, topic and rationale text), written here whenever the source rows
+change: from the signal handlers for single saves and explicitly after bulk
+writes (ingestion, rationale warm-up). The database keeps its own index over
+those rows in step:
+
+- SQLite: an external-content FTS5 table (porter stemming, 2/3-character
+  prefix indexes) maintained by triggers, ranked with bm25().
+- PostgreSQL: a stored, generated, weighted tsvector column with a GIN
+  index, ranked with ts_rank_cd().
+
+Other backends fall back to icontains. Queries match every term as a
+prefix, so "photo synth" finds "photosynthesis". Pages are fetched with
+LIMIT/OFFSET and one extra row, so no COUNT(*) is needed.
+"""
+import re
+from dataclasses import dataclass
+
+from django.db import connections, router, transaction
+from django.db.models import Q
+
+from .models import Question, Quiz, SearchDocument
+
+MAX_TERMS = 8
+TITLE_WEIGHT, BODY_WEIGHT = 10.0, 1.0
+BATCH_SIZE = 500
+
+# Created, with the triggers or generated column that maintain it, by migration 0010_search_index
+FTS_TABLE = 'core_searchdocument_fts'
+
+
+# --- Keeping documents in sync ---
+
+def _join(*parts):
+    return '\n'.join(part for part in parts if part)
+
+
+def quiz_document(quiz, subject_name=None):
+    return {'title': quiz.title, 'body': _join(subject_name, quiz.subject_text)}
+
+
+def question_document(question):
+    return {'title': question.text, 'body': _join(question.topic, question.rationale)}
+
+
+def _upsert(kind, rows):
+    """rows: [(object_id, quiz_id, {'title', 'body'})]"""
+    SearchDocument.objects.bulk_create(
+        [SearchDocument(kind=kind, object_id=object_id, quiz_id=quiz_id, **fields) for object_id, quiz_id, fields in rows],
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['kind', 'object_id'],
+        update_fields=['quiz', 'title', 'body'],
+    )
+
+
+def index_quiz(quiz):
+    subject_name = quiz.subject.name if quiz.subject_id else None
+    _upsert(SearchDocument.KIND_QUIZ, [(quiz.id, quiz.id, quiz_document(quiz, subject_name))])
+
+
+def index_questions(questions):
+    """Upserts documents for Question instances (text, topic and rationale must be loaded)."""
+    _upsert(SearchDocument.KIND_QUESTION, [
+        (question.id, question.quiz_id, question_document(question)) for question in questions
+    ])
+
+
+def unindex_question(question_id):
+    SearchDocument.objects.filter(kind=SearchDocument.KIND_QUESTION, object_id=question_id).delete()
+
+
+def rebuild_index():
+    """Rewrites every document from the source tables. Returns (quizzes, questions) indexed."""
+    with transaction.atomic():
+        SearchDocument.objects.all().delete()
+        quizzes = list(Quiz.objects.values_list('id', 'title', 'subject_text', 'subject__name'))
+        _upsert(SearchDocument.KIND_QUIZ, [
+            (quiz_id, quiz_id, {'title': title, 'body': _join(subject_name, subject_text)})
+            for quiz_id, title, subject_text, subject_name in quizzes
+        ])
+
+        count = 0
+        rows = Question.objects.order_by('id').values_list('id', 'quiz_id', 'text', 'topic', 'rationale')
+        batch = []
+        for question_id, quiz_id, text, topic, rationale in rows.iterator(chunk_size=BATCH_SIZE):
+            batch.append((question_id, quiz_id, {'title': text, 'body': _join(topic, rationale)}))
+            if len(batch) >= BATCH_SIZE:
+                _upsert(SearchDocument.KIND_QUESTION, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            _upsert(SearchDocument.KIND_QUESTION, batch)
+            count += len(batch)
+    return len(quizzes), count
+
+
+# --- Querying ---
+
+@dataclass
+class SearchPage:
+    object_ids: list
+    page: int
+    has_next: bool
+
+    @property
+    def has_previous(self):
+        return self.page > 1
+
+
+def search_terms(query):
+    return re.findall(r'\w+', (query or '').lower())[:MAX_TERMS]
+
+
+def _filters(kind, creator_id, exclude_quiz_id):
+    clauses, params = ['d.kind = %s'], [kind]
+    if creator_id is not None:
+        clauses.append('d.quiz_id IN (SELECT id FROM core_quiz WHERE creator_id = %s)')
+        params.append(creator_id)
+    if exclude_quiz_id is not None:
+        clauses.append('d.quiz_id <> %s')
+        params.append(exclude_quiz_id)
+    return clauses, params
+
+
+def _search_ids(connection, terms, kind, creator_id, exclude_quiz_id, limit, offset):
+    clauses, params = _filters(kind, creator_id, exclude_quiz_id)
+    where = ' AND '.join(clauses)
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        sql = (
+            f"SELECT d.object_id FROM {FTS_TABLE} f JOIN core_searchdocument d ON d.id = f.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s AND {where} "
+            f"ORDER BY bm25({FTS_TABLE}, {TITLE_WEIGHT}, {BODY_WEIGHT}), d.id LIMIT %s OFFSET %s"
+        )
+        params = [match, *params, limit, offset]
+    elif connection.vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        sql = (
+            "SELECT d.object_id FROM core_searchdocument d "
+            f"WHERE d.search_vector @@ to_tsquery('english', %s) AND {where} "
+            "ORDER BY ts_rank_cd(d.search_vector, to_tsquery('english', %s)) DESC, d.id LIMIT %s OFFSET %s"
+        )
+        params = [tsquery, *params, tsquery, limit, offset]
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search(query, kind, creator_id=None, exclude_quiz_id=None, page=1, page_size=20):
+    """
+    Ranked object ids of the given kind ('quiz' or 'question') matching
+    query, optionally limited to one teacher's quizzes or excluding a quiz.
+    """
+    terms = search_terms(query)
+    page = max(1, page)
+    if not terms:
+        return SearchPage([], page, False)
+
+    offset = (page - 1) * page_size
+    connection = connections[router.db_for_read(SearchDocument)]
+    ids = _search_ids(connection, terms, kind, creator_id, exclude_quiz_id, page_size + 1, offset)
+    if ids is None:
+        documents = SearchDocument.objects.filter(kind=kind)
+        if creator_id is not None:
+            documents = documents.filter(quiz__creator_id=creator_id)
+        if exclude_quiz_id is not None:
+            documents = documents.exclude(quiz_id=exclude_quiz_id)
+        for term in terms:
+            documents = documents.filter(Q(title__icontains=term) | Q(body__icontains=term))
+        ids = list(documents.order_by('-id').values_list('object_id', flat=True)[offset:offset + page_size + 1])
+    return SearchPage(ids[:page_size], page, len(ids) > page_size)
+
+
+def in_order(queryset, ids):
+    """Fetches queryset rows with the given ids, returned in that order."""
+    objects = queryset.in_bulk(ids)
+    return [objects[pk] for pk in ids if pk in objects]
+
@@ -1,5 +1,8 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import User, Subject, Quiz, Question, Result
+from .models import User, Subject, Quiz, Question, Option, Result, AttemptAnswer
+from .exams import student_answer_key
+from .grading import build_attempt_answers, grade_answers
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -11,19 +14,139 @@ class SubjectSerializer(serializers.ModelSerializer):
         model = Subject
         fields = ['id', 'name', 'description']
 
-class QuestionSerializer(serializers.ModelSerializer):
+def requested_set(request, param):
+    """Comma-separated query parameter as a set (empty when absent)."""
+    if request is None:
+        return set()
+    value = request.query_params.get(param, '')
+    return {part.strip() for part in value.split(',') if part.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Lets the caller pass fields=[...] to keep only those fields, e.g. from
+    ?fields=id,title. Unknown names are ignored.
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class OptionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Option
+        fields = ['id', 'text', 'is_correct']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Correct answers are only shown to the quiz's own teacher
+        if not self.context.get('show_answers'):
+            data.pop('is_correct')
+        return data
+
+
+class QuestionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    options = serializers.SerializerMethodField()
+
     class Meta:
         model = Question
-        fields = ['id', 'quiz', 'text', 'difficulty', 'topic', 'rationale']
+        fields = ['id', 'quiz', 'text', 'difficulty', 'topic', 'rationale', 'options']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if 'options' not in requested_set(self.context.get('request'), 'expand'):
+            self.fields.pop('options', None)
+
+    def get_options(self, obj):
+        # Relies on the caller prefetching options
+        show_answers = self.context.get('show_answers')
+        if show_answers is None:
+            request = self.context.get('request')
+            show_answers = bool(request and obj.quiz.creator_id == request.user.id)
+        context = dict(self.context, show_answers=show_answers)
+        return OptionSerializer(obj.options.all(), many=True, context=context).data
+
+
+class QuizListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Flat quiz rows for list views; questions only with ?expand=questions."""
+    subject_name = serializers.CharField(source='subject.name', read_only=True, default=None)
+    question_count = serializers.IntegerField(read_only=True)
+    questions = serializers.SerializerMethodField()
 
-class QuizSerializer(serializers.ModelSerializer):
-    subject_detail = SubjectSerializer(source='subject', read_only=True)
-    questions = QuestionSerializer(many=True, read_only=True)
     class Meta:
         model = Quiz
-        fields = ['id', 'title', 'subject', 'subject_text', 'subject_detail', 'creator', 'time_limit_minutes', 'created_at', 'questions']
+        fields = ['id', 'title', 'subject', 'subject_name', 'subject_text', 'creator',
+                  'time_limit_minutes', 'shuffle_options', 'questions_per_attempt', 'created_at',
+                  'question_count', 'questions']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.includes_questions():
+            self.fields.pop('questions', None)
+
+    def includes_questions(self):
+        expand = requested_set(self.context.get('request'), 'expand')
+        return bool(expand & {'questions', 'options'})
+
+    def get_questions(self, obj):
+        request = self.context.get('request')
+        context = dict(self.context, show_answers=bool(request and obj.creator_id == request.user.id))
+        return QuestionSerializer(obj.questions.all(), many=True, context=context).data
+
+
+class QuizDetailSerializer(QuizListSerializer):
+    """A single quiz, always with its questions."""
+    subject_detail = SubjectSerializer(source='subject', read_only=True)
+
+    class Meta(QuizListSerializer.Meta):
+        fields = QuizListSerializer.Meta.fields + ['subject_detail']
+
+    def includes_questions(self):
+        return True
+
 
 class ResultSerializer(serializers.ModelSerializer):
+    # {question_id: option_id}; graded server-side by the same engine as take_quiz
+    answers = serializers.DictField(child=serializers.IntegerField(), write_only=True)
+
     class Meta:
         model = Result
-        fields = ['id', 'student', 'quiz', 'score', 'completed_on']
+        fields = ['id', 'student', 'quiz', 'score', 'completed_on', 'answers']
+        read_only_fields = ['student', 'score']
+
+    def _grade(self, validated_data, quiz, student_id):
+        answers = validated_data.pop('answers', None)
+        if answers is None:
+            return validated_data, None
+        # Sampled quizzes are graded on the paper the student was served, not the whole pool
+        answer_key = student_answer_key(student_id, quiz)
+        if answer_key is None:
+            raise serializers.ValidationError({'answers': "Start this quiz before submitting answers."})
+        grade = grade_answers(answer_key, answers)
+        validated_data['score'] = grade.percentage
+        return validated_data, grade
+
+    def _save_answers(self, result, grade, replace=False):
+        if grade is None:
+            return
+        if replace:
+            result.answers.all().delete()
+        AttemptAnswer.objects.bulk_create(build_attempt_answers(result, grade))
+
+    @transaction.atomic
+    def create(self, validated_data):
+        validated_data, grade = self._grade(validated_data, validated_data['quiz'], validated_data['student'].id)
+        result = super().create(validated_data)
+        self._save_answers(result, grade)
+        return result
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        quiz = validated_data.get('quiz', instance.quiz)
+        validated_data, grade = self._grade(validated_data, quiz, instance.student_id)
+        result = super().update(instance, validated_data)
+        self._save_answers(result, grade, replace=True)
+        return result
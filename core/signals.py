@@ -0,0 +1,136 @@
+from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import search, stats
+from .answer_cache import bump_quiz_version
+from .auth_backends import invalidate_user
+from .models import Option, Question, Quiz, Result, Subject, User
+
+
+def _bump_on_commit(quiz_id):
+    # Bump after commit so no reader can cache pre-commit rows under the new version
+    if quiz_id is not None:
+        transaction.on_commit(lambda: bump_quiz_version(quiz_id))
+
+
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def quiz_changed(sender, instance, **kwargs):
+    _bump_on_commit(instance.id)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Quiz):
+        # Cascade from a quiz delete; the quiz handler bumps the version
+        return
+    _bump_on_commit(instance.quiz_id)
+
+
+@receiver(post_save, sender=Option)
+@receiver(post_delete, sender=Option)
+def option_changed(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, (Quiz, Question)):
+        # Cascade from a question/quiz delete, already handled there
+        return
+    if Option.question.is_cached(instance):
+        quiz_id = instance.question.quiz_id
+    else:
+        quiz_id = (
+            Question.objects.filter(id=instance.question_id)
+            .values_list('quiz_id', flat=True)
+            .first()
+        )
+    _bump_on_commit(quiz_id)
+
+
+@receiver(post_save, sender=Subject)
+@receiver(pre_delete, sender=Subject)
+def subject_changed(sender, instance, **kwargs):
+    # Quiz payloads embed the subject name; pre_delete because the FK is nulled by a bulk UPDATE
+    for quiz_id in Quiz.objects.filter(subject=instance).values_list('id', flat=True):
+        _bump_on_commit(quiz_id)
+
+
+# --- Materialised dashboard stats (core.stats) ---
+
+@receiver(post_save, sender=Quiz)
+def quiz_stats_created(sender, instance, created, **kwargs):
+    if created:
+        stats.quiz_created(instance)
+
+
+@receiver(pre_delete, sender=Quiz)
+def quiz_stats_deleted(sender, instance, **kwargs):
+    stats.quiz_deleted(instance)
+
+
+@receiver(post_save, sender=Question)
+def question_stats_created(sender, instance, created, **kwargs):
+    if created:
+        stats.questions_added(instance.quiz_id, 1)
+
+
+@receiver(post_delete, sender=Question)
+def question_stats_deleted(sender, instance, origin=None, **kwargs):
+    if not isinstance(origin, Quiz):
+        stats.questions_added(instance.quiz_id, -1)
+
+
+@receiver(post_save, sender=Result)
+def result_stats_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.result_added(instance)
+    else:
+        # Score may have changed; min/max cannot be adjusted incrementally
+        stats.recompute_quiz(instance.quiz_id)
+
+
+@receiver(post_delete, sender=Result)
+def result_stats_deleted(sender, instance, origin=None, **kwargs):
+    if not isinstance(origin, Quiz):
+        stats.recompute_quiz(instance.quiz_id)
+
+
+# --- Full-text search documents (core.search) ---
+
+@receiver(post_save, sender=Quiz)
+def quiz_search_saved(sender, instance, **kwargs):
+    search.index_quiz(instance)
+
+
+@receiver(post_save, sender=Subject)
+def subject_search_saved(sender, instance, **kwargs):
+    for quiz in Quiz.objects.filter(subject=instance).select_related('subject'):
+        search.index_quiz(quiz)
+
+
+@receiver(post_save, sender=Question)
+def question_search_saved(sender, instance, **kwargs):
+    search.index_questions([instance])
+
+
+@receiver(post_delete, sender=Question)
+def question_search_deleted(sender, instance, origin=None, **kwargs):
+    if not isinstance(origin, Quiz):
+        # A quiz delete removes its documents through the quiz foreign key
+        search.unindex_question(instance.id)
+
+
+# --- Cached request.user (core.auth_backends) ---
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Now, and again after commit in case a request re-cached the old row in between
+    invalidate_user(instance.pk)
+    transaction.on_commit(lambda: invalidate_user(instance.pk))
+
+
+@receiver(user_logged_out)
+def user_logged_out_uncache(sender, request, user, **kwargs):
+    if user is not None:
+        invalidate_user(user.pk)
@@ -0,0 +1,164 @@
+"""
+Worker start-up warm-up.
+
+Django imports the URLconf (and with it every view module, DRF and the
+filters) on the first request, compiles each template the first time it is
+rendered, and starts with empty answer-key caches, so the first requests a
+fresh worker serves are the slowest it ever serves. prep_cbt.wsgi and
+prep_cbt.asgi call warm_up() right after building the application instead:
+
+- urls: populate the URL resolver, importing every view;
+- templates: compile the project's templates into the cached loader;
+- quizzes: load the question payload plus the answer key and exam paper (or
+  the strata, for sampled quizzes) of the STARTUP_WARMUP_QUIZZES hottest
+  quizzes.
+
+Gunicorn runs with --preload (build.sh), so this happens once in the master
+and the forked workers inherit the warm process. Database connections are
+closed afterwards so no worker inherits a socket. Steps are best effort: a
+failure is logged and start-up carries on.
+
+The timings go to the 'core.startup' logger and to last_report; the
+check_startup command uses them to measure time to first request.
+"""
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+from django.urls import get_resolver
+from django.utils import timezone
+
+from . import metrics
+
+logger = logging.getLogger('core.startup')
+
+last_report = None
+
+
+def warm_urls():
+    resolver = get_resolver()
+    # reverse_dict builds the whole resolver tree, importing every URLconf and view
+    return len(resolver.reverse_dict)
+
+
+def project_template_names(engine):
+    """Template names under the project's own template dirs (not installed packages)."""
+    base = os.path.realpath(settings.BASE_DIR)
+    for directory in engine.template_dirs:
+        directory = os.path.realpath(directory)
+        if not directory.startswith(base + os.sep) or 'site-packages' in directory:
+            continue
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                if filename.endswith(('.html', '.txt')):
+                    yield os.path.relpath(os.path.join(root, filename), directory).replace(os.sep, '/')
+
+
+def warm_templates():
+    compiled = 0
+    for engine in engines.all():
+        if not isinstance(engine, DjangoTemplates):
+            continue
+        for name in sorted(set(project_template_names(engine))):
+            engine.get_template(name)
+            compiled += 1
+    return compiled
+
+
+def hot_quiz_ids(limit):
+    """Quizzes with the most attempts in the last day, topped up with the newest quizzes."""
+    from .models import ExamAttempt, Quiz
+    since = timezone.now() - timedelta(days=1)
+    quiz_ids = list(
+        ExamAttempt.objects.filter(started_at__gte=since)
+        .values('quiz_id').annotate(attempts=Count('id')).order_by('-attempts')
+        .values_list('quiz_id', flat=True)[:limit]
+    )
+    if len(quiz_ids) < limit:
+        quiz_ids += Quiz.objects.exclude(id__in=quiz_ids).order_by('-created_at', '-id') \
+            .values_list('id', flat=True)[:limit - len(quiz_ids)]
+    return quiz_ids
+
+
+def warm_quizzes(limit):
+    from .answer_cache import get_answer_key, get_question_payload
+    from .models import Quiz
+    from .paper import get_paper
+    from .sampling import get_strata
+
+    quizzes = Quiz.objects.in_bulk(hot_quiz_ids(limit))
+    for quiz in quizzes.values():
+        get_question_payload(quiz.id)
+        if quiz.questions_per_attempt:
+            # Each attempt gets its own subset, graded and rendered per question; loading the whole pool would be wasted
+            get_strata(quiz.id)
+        else:
+            get_answer_key(quiz.id)
+            get_paper(quiz.id)
+    return len(quizzes)
+
+
+def warm_up(server, import_seconds=None):
+    """
+    Warms this process (see the module docstring). server names the entry
+    point ('wsgi' or 'asgi'); import_seconds is how long building the
+    application took. Returns the report, also kept in last_report.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        in_event_loop = False
+    else:
+        in_event_loop = True
+    if not in_event_loop:
+        return _warm_up(server, import_seconds)
+    # Uvicorn imports the application inside its event loop, where the ORM refuses to run;
+    # nothing is being served yet, so block on a helper thread instead
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(_warm_up, server, import_seconds).result()
+
+
+def _warm_up(server, import_seconds):
+    global last_report
+    report = {'server': server, 'pid': os.getpid(), 'import_s': import_seconds, 'steps': {}, 'counts': {}}
+    if import_seconds is not None:
+        metrics.STARTUP_SECONDS.set(import_seconds, 'import')
+    if not getattr(settings, 'STARTUP_WARMUP', True):
+        last_report = report
+        return report
+
+    steps = [
+        ('urls', warm_urls),
+        ('templates', warm_templates),
+        ('quizzes', lambda: warm_quizzes(getattr(settings, 'STARTUP_WARMUP_QUIZZES', 10))),
+    ]
+    started = time.perf_counter()
+    for name, step in steps:
+        step_started = time.perf_counter()
+        try:
+            report['counts'][name] = step()
+        except Exception:  # best effort: a cold cache is better than a worker that will not start
+            logger.exception("Start-up warm-up step %r failed", name)
+            report['counts'][name] = None
+        report['steps'][name] = time.perf_counter() - step_started
+        metrics.STARTUP_SECONDS.set(report['steps'][name], name)
+    connections.close_all()
+    report['warmup_s'] = time.perf_counter() - started
+
+    logger.info(
+        "%s application ready in process %s: import %s, warm-up %.0fms (%s)",
+        server, report['pid'],
+        f'{import_seconds * 1000:.0f}ms' if import_seconds is not None else 'n/a',
+        report['warmup_s'] * 1000,
+        ', '.join(f"{name} {seconds * 1000:.0f}ms/{report['counts'][name]}" for name, seconds in report['steps'].items()),
+    )
+    last_report = report
+    return report
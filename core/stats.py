@@ -0,0 +1,183 @@
+"""
+Materialised dashboard statistics.
+
+QuizStats/TeacherStats rows are adjusted in place with F() expressions as
+questions and results are written (see core.signals and core.ingestion),
+inside the same transaction as the write itself. Rare changes that cannot be
+applied incrementally (a result edited or deleted) recompute that one quiz.
+rebuild_all() recomputes everything from scratch and find_drift() compares
+the stored counters with the truth; both back the rebuild_stats command.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from .models import Question, Quiz, QuizStats, Result, TeacherStats
+
+QUIZ_FIELDS = ('question_count', 'attempt_count', 'score_sum', 'score_min', 'score_max')
+TEACHER_FIELDS = ('quiz_count', 'question_count', 'attempt_count')
+
+
+def _teacher_of(quiz_id):
+    return Subquery(Quiz.objects.filter(id=quiz_id).values('creator_id')[:1])
+
+
+def _add(field, amount):
+    # Positive counters: never let a decrement push them below zero
+    return Greatest(F(field) + amount, Value(0))
+
+
+def quiz_created(quiz):
+    QuizStats.objects.get_or_create(quiz=quiz)
+    TeacherStats.objects.get_or_create(teacher_id=quiz.creator_id)
+    TeacherStats.objects.filter(teacher_id=quiz.creator_id).update(quiz_count=_add('quiz_count', 1))
+
+
+def quiz_deleted(quiz):
+    """Removes a quiz's contribution from its teacher (call before the quiz row goes)."""
+    stats = QuizStats.objects.filter(quiz_id=quiz.id).first()
+    TeacherStats.objects.filter(teacher_id=quiz.creator_id).update(
+        quiz_count=_add('quiz_count', -1),
+        question_count=_add('question_count', -(stats.question_count if stats else 0)),
+        attempt_count=_add('attempt_count', -(stats.attempt_count if stats else 0)),
+    )
+
+
+def questions_added(quiz_id, count=1):
+    updated = QuizStats.objects.filter(quiz_id=quiz_id).update(question_count=_add('question_count', count))
+    if not updated:
+        # Quiz predates the stats table; build its row from scratch instead
+        recompute_quiz(quiz_id)
+        return
+    TeacherStats.objects.filter(teacher_id=_teacher_of(quiz_id)).update(
+        question_count=_add('question_count', count)
+    )
+
+
+def result_added(result):
+    score = Value(result.score)
+    updated = QuizStats.objects.filter(quiz_id=result.quiz_id).update(
+        attempt_count=F('attempt_count') + 1,
+        score_sum=F('score_sum') + score,
+        score_min=Least(Coalesce('score_min', score), score),
+        score_max=Greatest(Coalesce('score_max', score), score),
+    )
+    if not updated:
+        recompute_quiz(result.quiz_id)
+        return
+    TeacherStats.objects.filter(teacher_id=_teacher_of(result.quiz_id)).update(
+        attempt_count=_add('attempt_count', 1)
+    )
+
+
+def recompute_quiz(quiz_id):
+    """Rebuilds one quiz's stats from its rows and re-derives its teacher's rollup."""
+    quiz = Quiz.objects.filter(id=quiz_id).only('id', 'creator_id').first()
+    if quiz is None:
+        return
+    scores = Result.objects.filter(quiz_id=quiz_id).aggregate(
+        attempt_count=Count('id'), score_sum=Sum('score'), score_min=Min('score'), score_max=Max('score'),
+    )
+    QuizStats.objects.update_or_create(quiz_id=quiz_id, defaults={
+        'question_count': quiz.questions.count(),
+        'attempt_count': scores['attempt_count'],
+        'score_sum': scores['score_sum'] or 0,
+        'score_min': scores['score_min'],
+        'score_max': scores['score_max'],
+    })
+    recompute_teacher(quiz.creator_id)
+
+
+def recompute_teacher(teacher_id):
+    totals = QuizStats.objects.filter(quiz__creator_id=teacher_id).aggregate(
+        quiz_count=Count('quiz_id'),
+        question_count=Coalesce(Sum('question_count'), 0),
+        attempt_count=Coalesce(Sum('attempt_count'), 0),
+    )
+    TeacherStats.objects.update_or_create(teacher_id=teacher_id, defaults=totals)
+
+
+def compute_all():
+    """
+    Computes every quiz's and teacher's stats from the source tables with
+    three grouped queries. Returns (quiz_stats, teacher_stats) as dicts of
+    id -> {field: value}.
+    """
+    question_counts = dict(
+        Question.objects.values('quiz_id').annotate(n=Count('id')).values_list('quiz_id', 'n')
+    )
+    scores = {
+        row['quiz_id']: row
+        for row in Result.objects.values('quiz_id').annotate(
+            attempt_count=Count('id'), score_sum=Sum('score'), score_min=Min('score'), score_max=Max('score'),
+        )
+    }
+
+    quiz_stats, teacher_stats = {}, {}
+    for quiz_id, creator_id in Quiz.objects.values_list('id', 'creator_id'):
+        row = scores.get(quiz_id, {})
+        stats = {
+            'question_count': question_counts.get(quiz_id, 0),
+            'attempt_count': row.get('attempt_count', 0),
+            'score_sum': row.get('score_sum') or 0,
+            'score_min': row.get('score_min'),
+            'score_max': row.get('score_max'),
+        }
+        quiz_stats[quiz_id] = stats
+
+        teacher = teacher_stats.setdefault(creator_id, dict.fromkeys(TEACHER_FIELDS, 0))
+        teacher['quiz_count'] += 1
+        teacher['question_count'] += stats['question_count']
+        teacher['attempt_count'] += stats['attempt_count']
+    return quiz_stats, teacher_stats
+
+
+def rebuild_all():
+    """Replaces every stats row with freshly computed values. Returns (quizzes, teachers) written."""
+    quiz_stats, teacher_stats = compute_all()
+
+    with transaction.atomic():
+        QuizStats.objects.all().delete()
+        TeacherStats.objects.all().delete()
+        QuizStats.objects.bulk_create(
+            [QuizStats(quiz_id=quiz_id, **values) for quiz_id, values in quiz_stats.items()],
+            batch_size=1000,
+        )
+        TeacherStats.objects.bulk_create(
+            [TeacherStats(teacher_id=teacher_id, **values) for teacher_id, values in teacher_stats.items()],
+            batch_size=1000,
+        )
+    return len(quiz_stats), len(teacher_stats)
+
+
+def _differs(stored, expected, fields):
+    diffs = {}
+    for field in fields:
+        have, want = getattr(stored, field, None) if stored else None, expected[field]
+        if isinstance(want, float) and have is not None:
+            if abs(have - want) > 1e-6:
+                diffs[field] = (have, want)
+        elif have != want:
+            diffs[field] = (have, want)
+    return diffs
+
+
+def find_drift():
+    """
+    Compares stored stats with freshly computed ones.
+    Returns a list of (kind, id, {field: (stored, expected)}) for every mismatch.
+    """
+    quiz_stats, teacher_stats = compute_all()
+    stored_quizzes = QuizStats.objects.in_bulk(list(quiz_stats))
+    stored_teachers = TeacherStats.objects.in_bulk(list(teacher_stats))
+
+    drift = []
+    for quiz_id, expected in quiz_stats.items():
+        diffs = _differs(stored_quizzes.get(quiz_id), expected, QUIZ_FIELDS)
+        if diffs:
+            drift.append(('quiz', quiz_id, diffs))
+    for teacher_id, expected in teacher_stats.items():
+        diffs = _differs(stored_teachers.get(teacher_id), expected, TEACHER_FIELDS)
+        if diffs:
+            drift.append(('teacher', teacher_id, diffs))
+    return drift
@@ -0,0 +1,78 @@
+"""Background job handlers. Imported from CoreConfig.ready() so they are always registered."""
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+
+from .ai_utils import generate_quiz_content
+from .ingestion import AllDuplicatesError, IngestionError, create_quiz_with_questions
+from .jobs import JobError, register, update_progress
+from .models import Subject
+from .rationales import questions_needing_rationale, warm_rationales
+
+
+@register('generate_quiz')
+def generate_quiz(job):
+    params = job.payload
+    subject = Subject.objects.get(id=params['subject_id'])
+    topic = params['topic']
+    difficulty = params.get('difficulty', 'medium')
+    num_questions = min(params.get('num_questions', 5), settings.AI_GENERATION_MAX_QUESTIONS)
+
+    update_progress(job, 5, 'Asking Gemini for questions...')
+
+    def report(done, total):
+        # Generation is the slow part: map it onto 5-80%
+        update_progress(job, 5 + int(75 * done / max(total, 1)), f'Generated {done} of {total} questions...')
+
+    ai_data, error = generate_quiz_content(subject.name, topic, num_questions, difficulty, progress=report)
+    if error:
+        raise JobError(f'Failed to generate quiz: {error}')
+
+    update_progress(job, 80, f'Saving {len(ai_data)} questions...')
+    try:
+        quiz = create_quiz_with_questions(
+            {
+                'title': f"AI Quiz: {topic} ({difficulty})",
+                'subject': subject,
+                'subject_text': subject.name,
+                'creator_id': job.created_by_id,
+                'time_limit_minutes': num_questions * 2, # 2 mins per question default
+            },
+            ai_data,
+            default_difficulty=difficulty,
+            default_topic=topic,
+        )
+    except AllDuplicatesError as e:
+        raise JobError(
+            f'Nothing new to add: all {e.count} generated questions are near-duplicates of '
+            f'existing {subject.name} questions. Try a narrower or different topic.'
+        )
+    except IngestionError as e:
+        raise JobError(f'Failed to generate quiz: {e}')
+
+    question_count = quiz.questions.count()
+    return {
+        'quiz_id': quiz.id,
+        'quiz_title': quiz.title,
+        'question_count': question_count,
+        'duplicates_skipped': len(ai_data) - question_count,
+    }
+
+
+@register('warm_rationales')
+def warm_rationales_job(job):
+    params = job.payload
+    questions = questions_needing_rationale(
+        quiz_ids=params.get('quiz_ids'),
+        since=parse_datetime(params['since']) if params.get('since') else None,
+        until=parse_datetime(params['until']) if params.get('until') else None,
+    )
+
+    def report(done, total):
+        update_progress(job, int(100 * done / max(total, 1)), f'Explained {done} of {total} questions...')
+
+    return warm_rationales(
+        questions,
+        concurrency=params.get('concurrency', settings.RATIONALE_WARMUP_CONCURRENCY),
+        rate=params.get('rate', settings.RATIONALE_WARMUP_RATE),
+        progress=report,
+    )
@@ -0,0 +1,1381 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.http import QueryDict
+from django.template import engines
+from django.test import Client, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+try:
+    import openpyxl
+except ImportError:  # optional; only XLSX exports need it
+    openpyxl = None
+
+from . import ai_cache, ai_client, answer_cache, auth_backends, dedup, jobs, startup
+from .analytics import build_report
+from .ai_client import AsyncGeminiClient, GeminiClient
+from .ai_utils import generate_quiz_content, get_ai_explanation
+from .answer_cache import get_answer_key
+from .checks import check_shared_cache
+from .exams import AttemptClosed, attempt_answer_key, save_answer, start_attempt, submit_attempt
+from .exports import ANSWER_HEADER, RESULT_HEADER, parse_filters, teacher_results
+from .ingestion import AllDuplicatesError, IngestionError, create_quiz_with_questions, ingest_questions
+from .loadtest import LoadConfig, compare_reports, run_load
+from .models import (
+    AttemptAnswer, BackgroundJob, ExamAttempt, Option, Question, Quiz, QuizStats, Result, Subject, TeacherStats, User,
+)
+from .pagination import keyset_page
+from .paper import exam_paper_html, get_paper
+from .stats import QUIZ_FIELDS, TEACHER_FIELDS, find_drift, rebuild_all
+
+
+class QuizApiQueryCountTests(TestCase):
+    """The quiz API must cost a fixed number of queries however much data there is."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', password='x', is_teacher=True)
+        cls.subject = Subject.objects.create(name='Maths')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+
+    def add_quizzes(self, count, questions=3, options=4):
+        for _ in range(count):
+            quiz = Quiz.objects.create(title='Quiz', subject=self.subject, creator=self.teacher, time_limit_minutes=10)
+            for q in range(questions):
+                question = Question.objects.create(quiz=quiz, text=f'Question {q}')
+                Option.objects.bulk_create(
+                    Option(question=question, text=f'Option {o}', is_correct=o == 0) for o in range(options)
+                )
+
+    def query_count(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_list_queries_do_not_grow_with_quizzes(self):
+        urls = ['/api/quizzes/', '/api/quizzes/?expand=questions', '/api/quizzes/?expand=questions,options']
+        self.add_quizzes(2)
+        small = [self.query_count(url) for url in urls]
+        self.add_quizzes(15, questions=6)
+        self.assertEqual([self.query_count(url) for url in urls], small)
+
+    def test_detail_queries_do_not_grow_with_questions(self):
+        self.add_quizzes(1, questions=2)
+        self.add_quizzes(1, questions=25)
+        small, large = Quiz.objects.order_by('id')
+        self.assertEqual(
+            self.query_count(f'/api/quizzes/{large.id}/?expand=options'),
+            self.query_count(f'/api/quizzes/{small.id}/?expand=options'),
+        )
+
+    def test_list_is_lean_paginated_and_sparse(self):
+        self.add_quizzes(3)
+        data = self.client.get('/api/quizzes/?page_size=2').json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNotNone(data['next'])
+        self.assertNotIn('questions', data['results'][0])
+        self.assertEqual(data['results'][0]['question_count'], 3)
+
+        data = self.client.get('/api/quizzes/?fields=id,title').json()
+        self.assertEqual(set(data['results'][0]), {'id', 'title'})
+
+        data = self.client.get('/api/quizzes/?expand=options').json()
+        options = data['results'][0]['questions'][0]['options']
+        self.assertEqual(len(options), 4)
+        self.assertIn('is_correct', options[0])
+
+    def test_correct_options_hidden_from_other_users(self):
+        self.add_quizzes(1)
+        student = User.objects.create_user('student', password='x', is_student=True)
+        self.client.force_authenticate(student)
+        quiz = Quiz.objects.get()
+        options = self.client.get(f'/api/quizzes/{quiz.id}/?expand=options').json()['questions'][0]['options']
+        self.assertNotIn('is_correct', options[0])
+        question = quiz.questions.first()
+        options = self.client.get(f'/api/questions/{question.id}/?expand=options').json()['options']
+        self.assertNotIn('is_correct', options[0])
+
+
+class LoadSimulationTests(TestCase):
+    """A miniature benchmark_exam run: every phase completes without errors."""
+
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def test_exam_spike_phases(self):
+        config = LoadConfig(teachers=1, subjects=1, quizzes=2, questions=4, students=3,
+                            concurrency=1, autosaves=2, explanations=3, ai_latency=0)
+        report = run_load(config)
+
+        phases = {phase['phase']: phase for phase in report['phases']}
+        self.assertEqual(list(phases), ['dashboards', 'start', 'autosave', 'submit', 'results', 'explain'])
+        self.assertEqual([phase['errors'] for phase in phases.values()], [0] * 6)
+        self.assertEqual(phases['submit']['requests'], 3)
+        self.assertEqual(phases['results']['requests'], 3)
+        self.assertEqual(Result.objects.count(), 3)
+        self.assertEqual(AttemptAnswer.objects.count(), 12)
+        self.assertIsNotNone(phases['start']['p99_ms'])
+
+        rows = compare_reports(report, report)
+        self.assertTrue(rows)
+        self.assertTrue(all(change in (0, None) for *_, change in rows))
+
+
+class PerformanceMetricsTests(TestCase):
+    """Requests are measured (queries included) and the scrape endpoint is protected."""
+
+    def test_request_queries_are_recorded(self):
+        user = User.objects.create_user('student', password='x', is_student=True)
+        self.client.force_login(user)
+        with self.assertLogs('core.perf', 'INFO') as logs:
+            response = self.client.get('/student/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(line['view'], 'student_dashboard')
+        self.assertGreater(line['queries'], 0)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('prepcbt_request_duration_seconds_bucket{', response.content.decode())
+
+    def test_profiled_requests_still_run_later_middleware(self):
+        teacher = User.objects.create_user('teacher', password='x', is_teacher=True)
+        student = User.objects.create_user('student', password='x', is_student=True)
+        quiz = Quiz.objects.create(title='Quiz', creator=teacher, time_limit_minutes=10)
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(student)
+        url = f'/student/quiz/{quiz.id}/take/'
+        for mode in ('cprofile', 'sample'):
+            with self.subTest(mode=mode), override_settings(
+                PERF_PROFILE_VIEWS='take_quiz', PERF_PROFILE_SAMPLE_RATE=1, PERF_PROFILE_MODE=mode,
+                PERF_PROFILE_THRESHOLD_MS=60_000,
+            ):
+                # No CSRF token: CsrfViewMiddleware must still reject it
+                self.assertEqual(client.post(url, {}).status_code, 403)
+                self.assertEqual(client.get(url).status_code, 200)
+
+
+class CachedAuthTests(TestCase):
+    """Warm authenticated requests read neither the session table nor the user table."""
+
+    def auth_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, [q['sql'] for q in queries if 'django_session' in q['sql'] or 'core_user' in q['sql']]
+
+    def test_session_and_user_come_from_cache(self):
+        user = User.objects.create_user('student', password='pw-12345', is_student=True)
+        self.client.post('/login/', {'username': 'student', 'password': 'pw-12345'})
+        self.auth_queries('/student/dashboard/')
+        response, queries = self.auth_queries('/student/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+        # Saving the user drops the cached copy, so role changes apply on the next request
+        user.is_student = False
+        user.save()
+        response, queries = self.auth_queries('/student/dashboard/')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(len(queries), 1)
+
+    def test_cached_user_carries_no_password_hash(self):
+        cache.clear()
+        user = User.objects.create_user('student', password='pw-12345', is_student=True)
+        self.client.post('/login/', {'username': 'student', 'password': 'pw-12345'})
+        self.assertEqual(self.client.get('/student/dashboard/').status_code, 200)
+
+        entry = cache.get(auth_backends._key(user.id))
+        self.assertNotIn(user.password.encode(), pickle.dumps(entry))
+        cached = auth_backends.CachedModelBackend().get_user(user.id)
+        self.assertEqual(cached.get_deferred_fields(), {'password'})
+        self.assertTrue(cached.check_password('pw-12345'))
+
+        # Sessions are still verified against the password: changing it logs the old session out
+        user.set_password('pw-67890')
+        user.save()
+        self.assertRedirects(
+            self.client.get('/student/dashboard/'), '/login/?next=/student/dashboard/', fetch_redirect_response=False,
+        )
+
+
+class StartupWarmupTests(TestCase):
+    def test_warm_up_steps(self):
+        teacher = User.objects.create_user('teacher', password='x', is_teacher=True)
+        quiz = Quiz.objects.create(title='Quiz', creator=teacher, time_limit_minutes=10)
+        question = Question.objects.create(quiz=quiz, text='Question')
+        Option.objects.create(question=question, text='Yes', is_correct=True)
+
+        self.assertGreater(startup.warm_urls(), 0)
+        self.assertIn('core/student/take_quiz.html', set(startup.project_template_names(engines['django'])))
+        self.assertGreater(startup.warm_templates(), 0)
+        self.assertEqual(startup.warm_quizzes(limit=5), 1)
+        # The answer key and exam paper are now served without touching the database
+        with self.assertNumQueries(0):
+            get_answer_key(quiz.id)
+            get_paper(quiz.id)
+
+
+class GradingQueryCountTests(TestCase):
+    """A submission costs the same queries however many questions the quiz has."""
+
+    def setUp(self):
+        cache.clear()
+        answer_cache.reset_local_cache()
+        self.teacher = User.objects.create_user('teacher', password='x', is_teacher=True)
+        self.students = iter(
+            User.objects.create_user(f'student{n}', password='x', is_student=True) for n in range(10)
+        )
+
+    def add_quiz(self, questions):
+        quiz = Quiz.objects.create(title='Quiz', creator=self.teacher, time_limit_minutes=10)
+        correct = {}
+        for q in range(questions):
+            question = Question.objects.create(quiz=quiz, text=f'Question {q}')
+            correct[question.id] = Option.objects.create(question=question, text='Right', is_correct=True).id
+            Option.objects.create(question=question, text='Wrong', is_correct=False)
+        return quiz, correct
+
+    def submit_queries(self, questions):
+        quiz, correct = self.add_quiz(questions)
+        self.client.force_login(next(self.students))
+        self.client.get(f'/student/quiz/{quiz.id}/take/')
+        form = {f'question_{question_id}': option_id for question_id, option_id in correct.items()}
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(f'/student/quiz/{quiz.id}/take/', form)
+        self.assertEqual(Result.objects.get(quiz=quiz).score, 100)
+        return len(queries)
+
+    def api_queries(self, questions):
+        quiz, correct = self.add_quiz(questions)
+        client = APIClient()
+        client.force_authenticate(next(self.students))
+        answers = {str(question_id): option_id for question_id, option_id in correct.items()}
+        with CaptureQueriesContext(connection) as created:
+            result_id = client.post('/api/results/', {'quiz': quiz.id, 'answers': answers}, format='json').json()['id']
+        # Re-grading replaces the answer rows: now only the first question is answered
+        first = next(iter(correct))
+        with CaptureQueriesContext(connection) as updated:
+            response = client.put(
+                f'/api/results/{result_id}/', {'quiz': quiz.id, 'answers': {str(first): correct[first]}}, format='json',
+            )
+        self.assertAlmostEqual(response.json()['score'], 100 / questions)
+        self.assertEqual(AttemptAnswer.objects.filter(result_id=result_id).count(), 1)
+        return len(created), len(updated)
+
+    def test_take_quiz_submit_queries_do_not_grow_with_questions(self):
+        self.assertEqual(self.submit_queries(30), self.submit_queries(3))
+
+    def test_api_queries_do_not_grow_with_questions(self):
+        self.assertEqual(self.api_queries(30), self.api_queries(3))
+
+    def test_option_from_another_question_scores_nothing(self):
+        quiz, correct = self.add_quiz(2)
+        first, second = correct
+        client = APIClient()
+        client.force_authenticate(next(self.students))
+        # Both answers name a correct option, but each belongs to the other question
+        answers = {str(first): correct[second], str(second): correct[first]}
+        response = client.post('/api/results/', {'quiz': quiz.id, 'answers': answers}, format='json')
+        self.assertEqual(response.json()['score'], 0)
+        self.assertFalse(AttemptAnswer.objects.filter(result_id=response.json()['id']).exists())
+
+
+class AttemptAnswerTests(TestCase):
+    """Per-question answer rows stored with each Result."""
+
+    def setUp(self):
+        cache.clear()
+        answer_cache.reset_local_cache()
+        teacher = User.objects.create_user('teacher', password='x', is_teacher=True)
+        self.student = User.objects.create_user('student', password='x', is_student=True)
+        self.quiz = Quiz.objects.create(title='Quiz', creator=teacher, time_limit_minutes=10)
+        self.question = Question.objects.create(quiz=self.quiz, text='Question')
+        self.right = Option.objects.create(question=self.question, text='Right', is_correct=True)
+        self.wrong = Option.objects.create(question=self.question, text='Wrong', is_correct=False)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def submit(self, option, result_id=None):
+        data = {'quiz': self.quiz.id, 'answers': {str(self.question.id): option.id}}
+        if result_id is None:
+            return self.client.post('/api/results/', data, format='json').json()['id']
+        return self.client.put(f'/api/results/{result_id}/', data, format='json').json()['id']
+
+    def test_one_answer_per_question_in_a_result(self):
+        result_id = self.submit(self.right)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            AttemptAnswer.objects.create(result_id=result_id, question=self.question, option=self.wrong)
+
+    def test_resubmission_replaces_answers_and_regrades(self):
+        result_id = self.submit(self.right)
+        self.assertEqual(list(AttemptAnswer.objects.values_list('option_id', 'is_correct')), [(self.right.id, True)])
+        self.assertEqual(self.submit(self.wrong, result_id), result_id)
+        self.assertEqual(list(AttemptAnswer.objects.values_list('option_id', 'is_correct')), [(self.wrong.id, False)])
+        self.assertEqual(Result.objects.get().score, 0)
+
+    def test_answers_are_deleted_with_their_result(self):
+        result = Result.objects.get(id=self.submit(self.right))
+        other = Result.objects.get(id=self.submit_as_other_student())
+        result.delete()
+        self.assertEqual(list(AttemptAnswer.objects.values_list('result_id', flat=True)), [other.id])
+
+    def submit_as_other_student(self):
+        self.client.force_authenticate(User.objects.create_user('other', password='x', is_student=True))
+        return self.submit(self.wrong)
+
+
+class AnswerCacheInvalidationTests(TestCase):
+    """Cached answer keys are rebuilt once a question or option change commits."""
+
+    def setUp(self):
+        cache.clear()
+        answer_cache.reset_local_cache()
+        teacher = User.objects.create_user('teacher', password='x', is_teacher=True)
+        self.quiz = Quiz.objects.create(title='Quiz', creator=teacher, time_limit_minutes=10)
+        self.question = Question.objects.create(quiz=self.quiz, text='Question')
+        self.right = Option.objects.create(question=self.question, text='Right', is_correct=True)
+        self.wrong = Option.objects.create(question=self.question, text='Wrong', is_correct=False)
+
+    def test_option_edits_invalidate_the_key(self):
+        self.assertEqual(get_answer_key(self.quiz.id).correct[self.question.id], {self.right.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.wrong.is_correct = True
+            self.wrong.save()
+        self.assertEqual(get_answer_key(self.quiz.id).correct[self.question.id], {self.right.id, self.wrong.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.right.delete()
+        self.assertNotIn(self.right.id, get_answer_key(self.quiz.id).option_question)
+
+    def test_question_edits_invalidate_the_key(self):
+        self.assertEqual(get_answer_key(self.quiz.id).total_questions, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            added = Question.objects.create(quiz=self.quiz, text='Another question')
+        self.assertEqual(get_answer_key(self.quiz.id).question_ids, (self.question.id, added.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.delete()
+        self.assertEqual(get_answer_key(self.quiz.id).question_ids, (added.id,))
+
+
+class ConditionalQuizTests(TestCase):
+    """Quiz content GETs carry an ETag and answer a matching If-None-Match with 304."""
+
+    def setUp(self):
+        cache.clear()
+        answer_cache.reset_local_cache()
+        teacher = User.objects.create_user('teacher', password='x', is_teacher=True)
+        self.quiz = Quiz.objects.create(title='Quiz', creator=teacher, time_limit_minutes=10)
+        self.question = Question.objects.create(quiz=self.quiz, text='Question')
+        Option.objects.create(question=self.question, text='Right', is_correct=True)
+        self.client = APIClient()
+        self.client.force_authenticate(teacher)
+        self.url = f'/api/quizzes/{self.quiz.id}/?expand=options'
+
+    def test_unchanged_quiz_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_edit_changes_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.text = 'Edited question'
+            self.question.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['questions'][0]['text'], 'Edited question')
+
+
+class QuestionBankTests(TestCase):
+    """Teachers can only search and reuse questions from their own quizzes."""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher', password='x', is_teacher=True)
+        self.other = User.objects.create_user('other', password='x', is_teacher=True)
+        self.quiz = Quiz.objects.create(title='New quiz', creator=self.teacher, time_limit_minutes=10)
+        self.own = self.add_question(Quiz.objects.create(title='Old quiz', creator=self.teacher, time_limit_minutes=10))
+        self.foreign = self.add_question(Quiz.objects.create(title='Live exam', creator=self.other, time_limit_minutes=10))
+        self.client.force_login(self.teacher)
+
+    def add_question(self, quiz):
+        question = Question.objects.create(quiz=quiz, text='What does photosynthesis produce?')
+        Option.objects.create(question=question, text='Oxygen', is_correct=True)
+        Option.objects.create(question=question, text='Nitrogen', is_correct=False)
+        return question
+
+    def test_search_lists_only_own_questions(self):
+        data = self.client.get(f'/teacher/quiz/{self.quiz.id}/question-bank/', {'q': 'photosynthesis'}).json()
+        self.assertEqual([result['id'] for result in data['results']], [self.own.id])
+
+    def test_reuse_rejects_other_teachers_questions(self):
+        url = f'/teacher/quiz/{self.quiz.id}/reuse-questions/'
+        response = self.client.post(url, {'question_id': [self.own.id, self.foreign.id]})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.quiz.questions.count(), 0)
+
+        response = self.client.post(url, {'question_id': [self.own.id]})
+        self.assertEqual(response.json(), {'added': 1})
+        self.assertEqual(self.quiz.questions.get().options.filter(is_correct=True).get().text, 'Oxygen')
+
+    def test_other_teachers_quiz_is_not_found(self):
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(f'/teacher/quiz/{self.quiz.id}/question-bank/', {'q': 'x'}).status_code, 404)
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+    def test_process_local_cache_fails_with_several_processes(self):
+        with override_settings(CACHES=self.LOCMEM, WEB_CONCURRENCY=2, BACKGROUND_JOBS_EAGER=True):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['core.E001'])
+        # The run_jobs worker is a second process too
+        with override_settings(CACHES=self.LOCMEM, WEB_CONCURRENCY=1, BACKGROUND_JOBS_EAGER=False):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['core.E001'])
+        with override_settings(CACHES=self.LOCMEM, WEB_CONCURRENCY=1, BACKGROUND_JOBS_EAGER=True):
+            self.assertEqual(check_shared_cache(None), [])
+
+    def test_shared_cache_passes(self):
+        caches = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/x'}}
+        with override_settings(CACHES=caches, WEB_CONCURRENCY=4, BACKGROUND_JOBS_EAGER=False):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class GeminiClientTests(SimpleTestCase):
+    """Retries, backoff and the circuit breaker, against a stubbed HTTP session."""
+
+    @staticmethod
+    def response(status, text='', retry_after=None):
+        body = {'candidates': [{'content': {'parts': [{'text': text}]}}]}
+        headers = {'Retry-After': retry_after} if retry_after is not None else {}
+        return mock.Mock(status_code=status, headers=headers, text=json.dumps(body), json=lambda: body)
+
+    def test_throttled_call_is_retried(self):
+        client = GeminiClient('key', max_retries=2)
+        replies = [self.response(429, retry_after='0'), self.response(200, 'Answer')]
+        with mock.patch.object(client.session, 'request', side_effect=replies) as request:
+            self.assertEqual(client.generate_text('prompt'), ('Answer', None))
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(client.metrics()['retries'], 1)
+        self.assertEqual(client.breaker.state, 'closed')
+
+    def test_client_errors_are_not_retried(self):
+        client = GeminiClient('key', max_retries=2)
+        with mock.patch.object(client.session, 'request', return_value=self.response(400)) as request, \
+                self.assertLogs('core.ai_client', 'ERROR'):
+            text, error = client.generate_text('prompt')
+        self.assertIsNone(text)
+        self.assertIn('400', error)
+        self.assertEqual(request.call_count, 1)
+
+    def test_breaker_opens_after_repeated_failures(self):
+        client = GeminiClient('key', max_retries=0, failure_threshold=2, reset_timeout=60)
+        with mock.patch.object(client.session, 'request', return_value=self.response(503)) as request, \
+                self.assertLogs('core.ai_client', 'WARNING') as logs:
+            for _ in range(2):
+                self.assertIsNone(client.generate_text('prompt')[0])
+            text, error = client.generate_text('prompt')
+        self.assertIn('circuit open', error)
+        self.assertIn('circuit opened', '\n'.join(logs.output))
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(client.metrics()['short_circuited'], 1)
+
+    def test_half_open_trial_closes_the_breaker(self):
+        client = GeminiClient('key', max_retries=0, failure_threshold=1, reset_timeout=0)
+        replies = [self.response(503), self.response(200, 'Answer')]
+        with mock.patch.object(client.session, 'request', side_effect=replies):
+            with self.assertLogs('core.ai_client', 'ERROR'):
+                client.generate_text('prompt')
+            self.assertEqual(client.breaker.state, 'open')
+            self.assertEqual(client.generate_text('prompt'), ('Answer', None))
+        self.assertEqual(client.breaker.state, 'closed')
+
+
+class AsyncGeminiClientTests(TestCase):
+    def test_one_client_across_short_lived_loops(self):
+        # Under WSGI each async view runs on its own event loop; the client must outlive them
+        seen = []
+
+        async def generate_text(client, prompt):
+            seen.append((id(client), id(asyncio.get_running_loop())))
+            return 'text', None
+
+        with mock.patch.object(AsyncGeminiClient, 'generate_text', generate_text):
+            for _ in range(2):
+                self.assertEqual(async_to_sync(ai_client.agenerate_text)('prompt'), ('text', None))
+        self.assertEqual(len(seen), 2)
+        self.assertEqual(seen[0], seen[1])
+
+
+class AIResponseCacheTests(SimpleTestCase):
+    """Explanations are cached by prompt, and concurrent identical prompts cost one call."""
+
+    def setUp(self):
+        cache.clear()
+        ai_cache.reset_local_cache()
+        self.calls = []
+
+    def stub(self, replies):
+        def generate_text(client, prompt):
+            self.calls.append(prompt)
+            time.sleep(0.05)
+            return replies.pop(0) if len(replies) > 1 else replies[0]
+        return mock.patch.object(GeminiClient, 'generate_text', generate_text)
+
+    def test_repeated_prompt_is_served_from_cache(self):
+        with self.stub([('Because.', None)]), override_settings(GOOGLE_API_KEY='key'):
+            self.assertEqual(get_ai_explanation('Question', 'Answer'), ('Because.', None))
+            self.assertEqual(get_ai_explanation('Question', 'Answer'), ('Because.', None))
+            get_ai_explanation('Another question', 'Answer')
+        self.assertEqual(len(self.calls), 2)
+
+    def test_errors_are_not_cached(self):
+        with self.stub([(None, 'Gemini API Error: Status 503'), ('Because.', None)]), \
+                override_settings(GOOGLE_API_KEY='key'):
+            self.assertEqual(get_ai_explanation('Question', 'Answer'), (None, 'Gemini API Error: Status 503'))
+            self.assertEqual(get_ai_explanation('Question', 'Answer'), ('Because.', None))
+        self.assertEqual(len(self.calls), 2)
+
+    def test_concurrent_callers_share_one_call(self):
+        results = []
+        with self.stub([('Because.', None)]), override_settings(GOOGLE_API_KEY='key'):
+            threads = [
+                threading.Thread(target=lambda: results.append(get_ai_explanation('Question', 'Answer')))
+                for _ in range(5)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(results, [('Because.', None)] * 5)
+        self.assertEqual(len(self.calls), 1)
+
+
+class WarmRationalesTests(TestCase):
+    """warm_rationales only asks the AI for missing rationales and leaves failures for the next run."""
+
+    def setUp(self):
+        cache.clear()
+        ai_cache.reset_local_cache()
+        teacher = User.objects.create_user('teacher', password='x', is_teacher=True)
+        quiz = Quiz.objects.create(title='Quiz', creator=teacher, time_limit_minutes=10)
+        self.questions = {}
+        for text, rationale in (('Explained', 'Mitochondria produce ATP for the cell.'), ('Stub', 'TBD'),
+                                ('Missing', None)):
+            question = Question.objects.create(quiz=quiz, text=f'{text} question', rationale=rationale)
+            Option.objects.create(question=question, text=f'{text} answer', is_correct=True)
+            self.questions[text] = question
+        self.calls = []
+
+    def stub(self, error=None):
+        def generate_text(client, prompt):
+            self.calls.append(prompt)
+            if error:
+                return None, error
+            question = next(text for text in self.questions if f'{text} question' in prompt)
+            return f'Because that is how {question.lower()} works.', None
+        return mock.patch.object(GeminiClient, 'generate_text', generate_text)
+
+    def warm(self, *args):
+        out = io.StringIO()
+        with override_settings(GOOGLE_API_KEY='key'):
+            call_command('warm_rationales', '--rate', '0', *args, stdout=out)
+        return out.getvalue()
+
+    def rationales(self):
+        return dict(Question.objects.values_list('text', 'rationale'))
+
+    def test_dry_run_counts_calls_without_making_them(self):
+        with self.stub():
+            output = self.warm('--dry-run')
+        self.assertIn('Would make 2 AI call(s) for 1 quiz(zes).', output)
+        self.assertEqual(self.calls, [])
+        self.assertEqual(self.rationales()['Missing question'], None)
+
+    def test_only_missing_rationales_are_requested_and_reruns_resume(self):
+        with self.stub():
+            self.assertIn('Saved 2 of 2 rationale(s); 0 failed', self.warm())
+        self.assertEqual(len(self.calls), 2)
+        self.assertFalse(any('Explained question' in prompt for prompt in self.calls))
+        self.assertEqual(self.rationales(), {
+            'Explained question': 'Mitochondria produce ATP for the cell.',
+            'Stub question': 'Because that is how stub works.',
+            'Missing question': 'Because that is how missing works.',
+        })
+
+        with self.stub():
+            self.assertIn('Saved 0 of 0 rationale(s)', self.warm())
+        self.assertEqual(len(self.calls), 2)
+
+    def test_failed_calls_are_left_for_the_next_run(self):
+        with self.stub(error='Gemini API Error: Status 503'):
+            self.assertIn('Saved 0 of 2 rationale(s); 2 failed (re-run to retry)', self.warm())
+        self.assertEqual(self.rationales()['Stub question'], 'TBD')
+        self.assertEqual(self.rationales()['Missing question'], None)
+
+        with self.stub():
+            self.assertIn('Saved 2 of 2 rationale(s); 0 failed', self.warm())
+        self.assertEqual(self.rationales()['Missing question'], 'Because that is how missing works.')
+
+
+class QuizGenerationTests(TestCase):
+    def test_repeated_generation_is_not_served_from_cache(self):
+        calls = []
+
+        def generate_text(client, prompt):
+            calls.append(prompt)
+            return json.dumps([
+                {'text': f'Generated question {len(calls)}', 'options': ['A', 'B', 'C', 'D'], 'correct_index': 0},
+            ]), None
+
+        with mock.patch.object(GeminiClient, 'generate_text', generate_text), \
+                override_settings(AI_GENERATION_CHUNK_SIZE=1, GOOGLE_API_KEY='key'):
+            first, error = generate_quiz_content('Biology', 'Cells', num_questions=1)
+            second, error = generate_quiz_content('Biology', 'Cells', num_questions=1)
+        self.assertIsNone(error)
+        self.assertEqual(len(calls), 2)
+        self.assertNotEqual(first[0]['text'], second[0]['text'])
+
+    def test_failed_and_malformed_chunks_are_requested_again(self):
+        calls = []
+        lock = threading.Lock()
+
+        def generate_text(client, prompt):
+            with lock:
+                calls.append(prompt)
+                number = len(calls)
+            if number == 1:
+                return None, 'Gemini API Error: Status 503'
+            item = {'text': f'Generated question {number}', 'options': ['A', 'B', 'C', 'D'], 'correct_index': 0}
+            if number == 2:
+                del item['correct_index']
+            return json.dumps([item]), None
+
+        with mock.patch.object(GeminiClient, 'generate_text', generate_text), \
+                override_settings(AI_GENERATION_CHUNK_SIZE=1, AI_GENERATION_RETRIES=2, GOOGLE_API_KEY='key'), \
+                self.assertLogs('core.ai_utils', 'WARNING'):
+            data, error = generate_quiz_content('Biology', 'Cells', num_questions=3)
+        self.assertIsNone(error)
+        self.assertEqual(len(data), 3)
+        self.assertEqual(len(calls), 5)
+
+    def test_error_when_every_chunk_fails(self):
+        def generate_text(client, prompt):
+            return None, 'Gemini API Error: Status 503'
+
+        with mock.patch.object(GeminiClient, 'generate_text', generate_text), \
+                override_settings(AI_GENERATION_CHUNK_SIZE=2, AI_GENERATION_RETRIES=1, GOOGLE_API_KEY='key'):
+            data, error = generate_quiz_content('Biology', 'Cells', num_questions=4)
+        self.assertIsNone(data)
+        self.assertIn('503', error)
+
+
+class GenerationJobTests(TestCase):
+    """AI generation requests are validated, queued and run by the run_jobs worker."""
+
+    def setUp(self):
+        dedup.clear_indexes()
+        self.teacher = User.objects.create_user('teacher', password='x', is_teacher=True)
+        self.client.force_login(self.teacher)
+        self.calls = []
+
+    def request_quiz(self, num_questions):
+        return self.client.post(
+            '/teacher/quiz/generate-ai/',
+            {'topic': 'Cells', 'subject': 'Biology', 'num_questions': num_questions},
+            HTTP_ACCEPT='application/json',
+        )
+
+    def stub(self, error=None):
+        def generate_text(client, prompt):
+            self.calls.append(prompt)
+            if error:
+                return None, error
+            text = f'Which organelle is described in generated question number {len(self.calls)}?'
+            return json.dumps([{'text': text, 'options': ['A', 'B', 'C', 'D'], 'correct_index': 0}]), None
+        return mock.patch.object(GeminiClient, 'generate_text', generate_text)
+
+    def run_worker(self):
+        with override_settings(AI_GENERATION_CHUNK_SIZE=1, GOOGLE_API_KEY='key'):
+            call_command('run_jobs', '--once', stdout=io.StringIO())
+
+    def test_question_count_is_validated_and_capped(self):
+        self.assertEqual(self.request_quiz('lots').status_code, 400)
+        self.assertEqual(self.request_quiz(0).status_code, 400)
+        self.assertFalse(BackgroundJob.objects.exists())
+
+        with override_settings(AI_GENERATION_MAX_QUESTIONS=20):
+            self.assertEqual(self.request_quiz(10000).status_code, 202)
+        self.assertEqual(BackgroundJob.objects.get().payload['num_questions'], 20)
+
+    def test_job_runs_to_success(self):
+        job_id = self.request_quiz(3).json()['id']
+        status_url = f'/teacher/jobs/{job_id}/status/'
+        self.assertEqual(self.client.get(status_url).json()['status'], 'pending')
+
+        with self.stub():
+            self.run_worker()
+        data = self.client.get(status_url).json()
+        self.assertEqual(data['status'], 'succeeded')
+        self.assertEqual(data['progress'], 100)
+        self.assertEqual(data['result']['question_count'], 3)
+        self.assertEqual(Quiz.objects.get(id=data['result']['quiz_id']).creator, self.teacher)
+        self.assertEqual(len(self.calls), 3)
+
+    def test_job_failure_is_reported(self):
+        job_id = self.request_quiz(2).json()['id']
+        with self.stub(error='Gemini API Error: Status 503'), self.assertLogs('core.jobs', 'WARNING'):
+            self.run_worker()
+        data = self.client.get(f'/teacher/jobs/{job_id}/status/').json()
+        self.assertEqual(data['status'], 'failed')
+        self.assertTrue(data['finished'])
+        self.assertIn('503', data['error'])
+        self.assertFalse(Quiz.objects.exists())
+
+    def test_other_teachers_cannot_see_the_job(self):
+        job_id = self.request_quiz(2).json()['id']
+        self.client.force_login(User.objects.create_user('other', password='x', is_teacher=True))
+        self.assertEqual(self.client.get(f'/teacher/jobs/{job_id}/status/').status_code, 404)
+
+    def test_claim_is_exclusive_and_stale_jobs_are_retried(self):
+        job = jobs.enqueue('generate_quiz', {}, user=self.teacher)
+        self.assertTrue(jobs.claim_job(job.id))
+        self.assertFalse(jobs.claim_job(job.id))
+        self.assertIsNone(jobs.claim_next_job())
+
+        # A worker died mid-job: the job goes back to the queue until it runs out of attempts
+        long_ago = timezone.now() - timedelta(hours=1)
+        BackgroundJob.objects.filter(id=job.id).update(started_at=long_ago)
+        self.assertEqual(jobs.requeue_stale_jobs(600, max_attempts=2), 1)
+        self.assertEqual(jobs.claim_next_job().id, job.id)
+        BackgroundJob.objects.filter(id=job.id).update(started_at=long_ago)
+        self.assertEqual(jobs.requeue_stale_jobs(600, max_attempts=2), 0)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (BackgroundJob.STATUS_FAILED, 2))
+
+
+class DedupIndexTests(SimpleTestCase):
+    def test_crowded_bucket_does_not_hide_the_real_match(self):
+        rng = np.random.default_rng(7)
+        sig = rng.integers(0, 2 ** 32, dedup.NUM_PERM, dtype=np.uint32)
+        # Far more unrelated entries than MAX_CANDIDATES share the first band with sig
+        colliders = rng.integers(0, 2 ** 32, (3 * dedup.MAX_CANDIDATES, dedup.NUM_PERM), dtype=np.uint32)
+        colliders[:, :dedup.ROWS] = sig[:dedup.ROWS]
+        near = sig.copy()
+        near[dedup.ROWS::2 * dedup.ROWS] += 1  # one value off in every other band: 8 bands still match
+
+        index = dedup.DedupIndex()
+        index.add_many(list(range(len(colliders))), colliders)
+        index.add('match', near)
+        self.assertEqual(index.matches(sig, 0.8), [('match', 56 / 64)])
+
+
+class DuplicateIngestionTests(TestCase):
+    TEXT = 'Which organelle is known as the powerhouse of the cell in eukaryotic organisms?'
+
+    def setUp(self):
+        dedup.clear_indexes()
+        self.teacher = User.objects.create_user('teacher', password='x', is_teacher=True)
+        self.subject = Subject.objects.create(name='Biology')
+        self.original = self.new_quiz().questions.create(text=self.TEXT, rationale='Mitochondria make ATP.')
+
+    def new_quiz(self):
+        return Quiz.objects.create(title='Quiz', subject=self.subject, creator=self.teacher, time_limit_minutes=10)
+
+    def item(self, text):
+        return {'text': text, 'options': ['Mitochondrion', 'Nucleus'], 'correct_index': 0}
+
+    def test_skip_drops_only_the_duplicates(self):
+        quiz = self.new_quiz()
+        added = ingest_questions(quiz, [self.item(self.TEXT + '!'), self.item('What does the nucleus hold?')],
+                                 duplicates='skip')
+        self.assertEqual(added, 1)
+        self.assertEqual(list(quiz.questions.values_list('text', flat=True)), ['What does the nucleus hold?'])
+
+    def test_all_duplicates_is_its_own_outcome(self):
+        fields = {'title': 'Repeat', 'subject': self.subject, 'creator': self.teacher, 'time_limit_minutes': 10}
+        with self.assertRaises(AllDuplicatesError) as raised:
+            create_quiz_with_questions(fields, [self.item(self.TEXT)], duplicates='skip')
+        self.assertNotIsInstance(raised.exception, IngestionError)
+        self.assertEqual(raised.exception.count, 1)
+        self.assertFalse(Quiz.objects.filter(title='Repeat').exists())
+
+    def test_flag_links_duplicates_and_borrows_rationale(self):
+        quiz = self.new_quiz()
+        repeat = 'Name the largest planet in the solar system by total mass and volume.'
+        added = ingest_questions(quiz, [self.item(self.TEXT), self.item(repeat), self.item(repeat)], duplicates='flag')
+        self.assertEqual(added, 3)
+        flagged, first, second = quiz.questions.order_by('id')
+        self.assertEqual(flagged.duplicate_of, self.original)
+        self.assertEqual(flagged.rationale, 'Mitochondria make ATP.')
+        self.assertIsNone(first.duplicate_of)
+        self.assertEqual(second.duplicate_of, first)
+
+
+class ItemAnalysisTests(TestCase):
+    """build_report against statistics worked out by hand for a four-candidate quiz."""
+
+    def setUp(self):
+        cache.clear()
+        answer_cache.reset_local_cache()
+        teacher = User.objects.create_user('teacher', password='x', is_teacher=True)
+        self.quiz = Quiz.objects.create(title='Quiz', creator=teacher, time_limit_minutes=10)
+        self.right, self.wrong = [], []
+        for q in range(3):
+            question = Question.objects.create(quiz=self.quiz, text=f'Question {q}')
+            self.right.append(Option.objects.create(question=question, text='Right', is_correct=True))
+            self.wrong.append(Option.objects.create(question=question, text='Wrong', is_correct=False))
+        # Candidates answer the first 3, 2, 1 and 0 questions correctly; the last skips question 3
+        client = APIClient()
+        for student, correct in enumerate((3, 2, 1, 0)):
+            client.force_authenticate(User.objects.create_user(f'student{student}', password='x', is_student=True))
+            answers = {
+                str(self.right[q].question_id): (self.right[q] if q < correct else self.wrong[q]).id
+                for q in range(3 if correct else 2)
+            }
+            response = client.post('/api/results/', {'quiz': self.quiz.id, 'answers': answers}, format='json')
+            self.assertEqual(response.status_code, 201)
+
+    def test_report_matches_hand_computed_statistics(self):
+        report = build_report(self.quiz.id)
+        self.assertEqual(report['attempts'], 4)
+        self.assertEqual(report['mean_score'], 50)
+        # Totals 3, 2, 1, 0: variance 1.25; sum of p(1 - p) 0.625; KR-20 = 3/2 * (1 - 0.625 / 1.25)
+        self.assertEqual(report['kr20'], 0.75)
+        self.assertEqual([bucket['count'] for bucket in report['histogram'] if bucket['count']], [1, 1, 1, 1])
+
+        first, second, third = report['questions']
+        self.assertEqual([first['p_value'], second['p_value'], third['p_value']], [0.75, 0.5, 0.25])
+        # Item-rest correlations: 0.75 / sqrt(0.75 * 2.75), 1 / sqrt(2) and 0.75 / sqrt(0.75 * 2.75)
+        self.assertEqual(
+            [first['discrimination'], second['discrimination'], third['discrimination']], [0.522, 0.707, 0.522]
+        )
+        self.assertEqual([first['omitted'], second['omitted'], third['omitted']], [0, 0, 1])
+
+        right, wrong = third['options']
+        self.assertEqual((right['count'], right['share'], right['mean_total']), (1, 0.25, 3))
+        self.assertEqual((wrong['count'], wrong['share'], wrong['mean_total']), (2, 0.5, 1.5))
+
+
+class ExportTests(TestCase):
+    """Streaming CSV/XLSX result exports are scoped to the teacher and safe to open in a spreadsheet."""
+
+    def setUp(self):
+        cache.clear()
+        answer_cache.reset_local_cache()
+        self.teacher = User.objects.create_user('teacher', password='x', is_teacher=True)
+        self.other_teacher = User.objects.create_user('other', password='x', is_teacher=True)
+        self.quiz = Quiz.objects.create(title='=HYPERLINK("http://evil")', creator=self.teacher, time_limit_minutes=10)
+        self.other_quiz = Quiz.objects.create(title='Other quiz', creator=self.other_teacher, time_limit_minutes=10)
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('@student', password='x', is_student=True))
+        for quiz, text in ((self.quiz, '-1+2'), (self.other_quiz, 'Plain')):
+            question = Question.objects.create(quiz=quiz, text=text)
+            option = Option.objects.create(question=question, text='+cmd', is_correct=True)
+            client.post('/api/results/', {'quiz': quiz.id, 'answers': {str(question.id): option.id}}, format='json')
+        self.result = Result.objects.get(quiz=self.quiz)
+        self.client.force_login(self.teacher)
+
+    def download(self, **params):
+        response = self.client.get('/teacher/results/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv_streams_the_teachers_results_with_formulas_escaped(self):
+        rows = list(csv.reader(io.StringIO(self.download().decode())))
+        self.assertEqual(rows[0], RESULT_HEADER)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][:5], [str(self.result.id), str(self.quiz.id), '\'=HYPERLINK("http://evil")', '', "'@student"])
+        self.assertEqual(rows[1][5], '100.0')
+
+        rows = list(csv.reader(io.StringIO(self.download(answers='1').decode())))
+        self.assertEqual(rows[0], ANSWER_HEADER)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][4:7], ["'-1+2", "'+cmd", 'True'])
+
+    @skipUnless(openpyxl, "openpyxl is not installed")
+    def test_xlsx_cells_are_text_not_formulas(self):
+        sheet = openpyxl.load_workbook(io.BytesIO(self.download(type='xlsx', answers='1'))).active
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(list(rows[0]), ANSWER_HEADER)
+        self.assertEqual(rows[1][4:7], ("'-1+2", "'+cmd", True))
+        self.assertTrue(all(cell.data_type != 'f' for row in sheet.iter_rows() for cell in row))
+
+    def test_parse_filters(self):
+        today = timezone.localdate()
+        filters = parse_filters(QueryDict(f'quiz={self.quiz.id}&subject=&from={today}&to={today}'))
+        self.assertEqual(filters['quiz_id'], self.quiz.id)
+        self.assertNotIn('subject_id', filters)
+        self.assertEqual(filters['until'] - filters['since'], timedelta(days=1))
+        self.assertEqual(list(teacher_results(self.teacher, **filters)), [self.result])
+        for query in ('quiz=abc', 'from=2024-13-01', 'to=yesterday'):
+            with self.assertRaises(ValueError):
+                parse_filters(QueryDict(query))
+        response = self.client.get('/teacher/results/export/', {'from': 'soon'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json())
+
+    def test_teachers_cannot_export_each_others_results(self):
+        self.assertEqual(list(teacher_results(self.teacher)), [self.result])
+        self.assertEqual(list(teacher_results(self.teacher, quiz_id=self.other_quiz.id)), [])
+        rows = list(csv.reader(io.StringIO(self.download(quiz=str(self.other_quiz.id)).decode())))
+        self.assertEqual(rows, [RESULT_HEADER])
+
+        self.client.force_login(User.objects.get(username='@student'))
+        self.assertNotEqual(self.client.get('/teacher/results/export/').status_code, 200)
+
+    def test_export_command_reports_stats(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'answers.csv')
+            stderr = io.StringIO()
+            call_command('export_results', 'teacher', '--answers', '--output', path, '--stats', stderr=stderr)
+            with open(path, newline='') as f:
+                rows = list(csv.reader(f))
+        self.assertEqual(len(rows), 2)
+        self.assertRegex(stderr.getvalue(), r'^1 row\(s\) in [\d.]+s, peak RSS [\d.]+ MB')
+
+
+class DashboardStatsTests(TestCase):
+    """Incrementally maintained QuizStats/TeacherStats always agree with a full rebuild."""
+
+    def setUp(self):
+        cache.clear()
+        answer_cache.reset_local_cache()
+        dedup.clear_indexes()
+        self.teacher = User.objects.create_user('teacher', password='x', is_teacher=True)
+        self.other_teacher = User.objects.create_user('other', password='x', is_teacher=True)
+        self.quiz = create_quiz_with_questions(
+            {'title': 'Bulk', 'creator': self.teacher, 'time_limit_minutes': 10},
+            [{'text': f'Bulk question {n} about a different topic', 'options': ['A', 'B'], 'correct_index': 0}
+             for n in range(2)],
+        )
+        self.other_quiz = Quiz.objects.create(title='Other', creator=self.other_teacher, time_limit_minutes=10)
+        Question.objects.create(quiz=self.other_quiz, text='Single')
+        self.client = APIClient()
+
+    def stored(self):
+        return (
+            {row.quiz_id: {field: getattr(row, field) for field in QUIZ_FIELDS} for row in QuizStats.objects.all()},
+            {row.teacher_id: {field: getattr(row, field) for field in TEACHER_FIELDS}
+             for row in TeacherStats.objects.all()},
+        )
+
+    def assertInSync(self):
+        self.assertEqual(find_drift(), [])
+        stored = self.stored()
+        rebuild_all()
+        self.assertEqual(self.stored(), stored)
+
+    def submit(self, student, right, result_id=None):
+        questions = list(self.quiz.questions.order_by('id'))
+        answers = {
+            str(question.id): question.options.get(is_correct=n < right).id for n, question in enumerate(questions)
+        }
+        self.client.force_authenticate(student)
+        data = {'quiz': self.quiz.id, 'answers': answers}
+        if result_id is None:
+            return self.client.post('/api/results/', data, format='json').json()['id']
+        return self.client.put(f'/api/results/{result_id}/', data, format='json').json()['id']
+
+    def test_counters_follow_creates_regrades_and_deletes(self):
+        self.assertInSync()
+        first = User.objects.create_user('first', password='x', is_student=True)
+        second = User.objects.create_user('second', password='x', is_student=True)
+        result_id = self.submit(first, right=1)
+        self.submit(second, right=2)
+        self.assertInSync()
+        quiz_stats = QuizStats.objects.get(quiz=self.quiz)
+        self.assertEqual(
+            (quiz_stats.attempt_count, quiz_stats.score_sum, quiz_stats.score_min, quiz_stats.score_max),
+            (2, 150, 50, 100),
+        )
+
+        # Re-grading lowers the minimum, which cannot be applied incrementally
+        self.submit(first, right=0, result_id=result_id)
+        self.assertEqual(QuizStats.objects.get(quiz=self.quiz).score_min, 0)
+        self.assertInSync()
+
+        Result.objects.get(id=result_id).delete()
+        self.assertInSync()
+        second.delete()
+        self.quiz.questions.first().delete()
+        self.assertInSync()
+        self.assertEqual(
+            list(TeacherStats.objects.order_by('teacher_id').values_list('quiz_count', 'question_count', 'attempt_count')),
+            [(1, 1, 0), (1, 1, 0)],
+        )
+
+        self.other_quiz.delete()
+        Quiz.objects.create(title='Another', creator=self.other_teacher, time_limit_minutes=10)
+        self.assertInSync()
+
+    def test_drift_is_reported_and_repaired(self):
+        QuizStats.objects.filter(quiz=self.quiz).update(question_count=7)
+        self.assertEqual(find_drift(), [
+            ('quiz', self.quiz.id, {'question_count': (7, 2)}),
+        ])
+        with self.assertRaises(CommandError):
+            call_command('rebuild_stats', '--check', stdout=io.StringIO())
+        call_command('rebuild_stats', stdout=io.StringIO())
+        self.assertEqual(find_drift(), [])
+
+
+class StudentDashboardTests(TestCase):
+    """The student dashboard costs a fixed number of queries and its keyset pages never skip or repeat."""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher', password='x', is_teacher=True)
+        self.student = User.objects.create_user('student', password='x', is_student=True)
+        self.client.force_login(self.student)
+
+    def add_quizzes(self, count):
+        for n in range(count):
+            subject = Subject.objects.create(name=f'Subject {Subject.objects.count()}')
+            quiz = Quiz.objects.create(title='Quiz', subject=subject, creator=self.teacher, time_limit_minutes=10)
+            if n % 2:
+                Result.objects.create(student=self.student, quiz=quiz, score=50)
+
+    def dashboard_queries(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/student/dashboard/', params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_quizzes(self):
+        self.add_quizzes(3)
+        self.dashboard_queries()  # caches the session user
+        few = self.dashboard_queries()
+        self.add_quizzes(27)
+        with self.assertNumQueries(few):
+            self.client.get('/student/dashboard/')
+        subject = Subject.objects.first()
+        with self.assertNumQueries(few):
+            self.client.get('/student/dashboard/', {'subject': subject.id})
+
+    def test_keyset_walk_visits_every_quiz_once_despite_ties(self):
+        self.add_quizzes(7)
+        # Five quizzes share one timestamp, so pages must break ties on the primary key
+        tied = timezone.now() - timedelta(days=1)
+        Quiz.objects.filter(id__in=list(Quiz.objects.order_by('id').values_list('id', flat=True)[1:6])).update(
+            created_at=tied
+        )
+        expected = list(Quiz.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+        seen, cursor, pages = [], None, 0
+        while True:
+            page = keyset_page(Quiz.objects.all(), cursor, page_size=2)
+            seen.extend(quiz.id for quiz in page.items)
+            pages += 1
+            if pages == 2:
+                # A quiz published mid-walk sorts first and does not shift the later pages
+                Quiz.objects.create(title='New', creator=self.teacher, time_limit_minutes=10)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, 4)
+
+    def test_malformed_cursor_starts_from_the_first_page(self):
+        self.add_quizzes(3)
+        first = keyset_page(Quiz.objects.all(), page_size=2)
+        self.assertEqual(keyset_page(Quiz.objects.all(), 'not-a-cursor', page_size=2).items, first.items)
+        self.assertEqual(self.client.get('/student/dashboard/', {'cursor': '!!'}).status_code, 200)
+
+
+class ImportQuestionsCommandTests(TestCase):
+    """import_questions reads JSON and CSV banks, writes in batches and imports all or nothing."""
+
+    def setUp(self):
+        cache.clear()
+        answer_cache.reset_local_cache()
+        dedup.clear_indexes()
+        self.teacher = User.objects.create_user('teacher', password='x', is_teacher=True)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def items(self, count):
+        return [
+            {'text': f'Imported question number {n} on topic {n * 7919}', 'options': ['Yes', 'No'],
+             'correct_index': n % 2}
+            for n in range(count)
+        ]
+
+    def test_json_file_creates_a_quiz(self):
+        path = self.write('cells.json', json.dumps({'questions': self.items(3)}))
+        out = io.StringIO()
+        call_command('import_questions', path, '--creator', 'teacher', '--subject', 'Biology', stdout=out)
+        self.assertIn('Imported 3 questions into "cells"', out.getvalue())
+
+        quiz = Quiz.objects.get(title='cells')
+        self.assertEqual((quiz.subject.name, quiz.creator, quiz.time_limit_minutes), ('Biology', self.teacher, 60))
+        correct = Option.objects.filter(question__quiz=quiz, is_correct=True).order_by('id')
+        self.assertEqual(list(correct.values_list('text', flat=True)), ['Yes', 'No', 'Yes'])
+        self.assertEqual(QuizStats.objects.get(quiz=quiz).question_count, 3)
+
+    def test_csv_file_adds_to_an_existing_quiz(self):
+        quiz = Quiz.objects.create(title='Existing', creator=self.teacher, time_limit_minutes=10)
+        path = self.write('bank.csv', (
+            'text,option_a,option_b,option_c,correct,difficulty,topic\n'
+            'Which gas do plants absorb for photosynthesis?,Oxygen,Carbon dioxide,,B,Hard,Plants\n'
+            'What is the boiling point of water at sea level?,100 C,90 C,80 C,0,,\n'
+        ))
+        call_command('import_questions', path, '--quiz', str(quiz.id), '--topic', 'General', stdout=io.StringIO())
+
+        first, second = quiz.questions.order_by('id')
+        self.assertEqual((first.difficulty, first.topic), ('hard', 'Plants'))
+        self.assertEqual((second.difficulty, second.topic), ('medium', 'General'))
+        self.assertEqual(
+            list(first.options.order_by('id').values_list('text', 'is_correct')),
+            [('Oxygen', False), ('Carbon dioxide', True)],
+        )
+        self.assertEqual(second.options.get(is_correct=True).text, '100 C')
+
+    def test_batch_size_sets_the_number_of_inserts(self):
+        quiz = Quiz.objects.create(title='Batched', creator=self.teacher, time_limit_minutes=10)
+        path = self.write('batched.json', json.dumps(self.items(5)))
+        with CaptureQueriesContext(connection) as queries:
+            call_command('import_questions', path, '--quiz', str(quiz.id), '--batch-size', '2', stdout=io.StringIO())
+        inserts = [query['sql'] for query in queries if query['sql'].startswith('INSERT INTO')]
+        self.assertEqual(sum('"core_question"' in sql.split('(')[0] for sql in inserts), 3)
+        self.assertEqual(sum('"core_option"' in sql.split('(')[0] for sql in inserts), 5)
+        self.assertEqual(quiz.questions.count(), 5)
+
+    def test_a_bad_row_imports_nothing(self):
+        path = self.write('broken.csv', (
+            'text,option_a,option_b,correct\n'
+            'A perfectly good question about the water cycle?,Yes,No,A\n'
+            'A question whose answer letter is out of range?,Yes,No,E\n'
+        ))
+        stderr = io.StringIO()
+        with self.assertRaisesMessage(CommandError, '1 invalid question(s)'):
+            call_command('import_questions', path, '--creator', 'teacher', stdout=io.StringIO(), stderr=stderr)
+        self.assertIn('item 1: correct_index 4 out of range', stderr.getvalue())
+        self.assertFalse(Quiz.objects.exists())
+        self.assertFalse(Question.objects.exists())
+
+    def test_a_failed_write_rolls_back_the_whole_import(self):
+        quiz = Quiz.objects.create(title='Existing', creator=self.teacher, time_limit_minutes=10)
+        Question.objects.create(quiz=quiz, text='Already here')
+        path = self.write('bank.json', json.dumps(self.items(4)))
+        with mock.patch.object(Option.objects, 'bulk_create', side_effect=IntegrityError('disk full')):
+            with self.assertRaises(IntegrityError):
+                call_command('import_questions', path, '--quiz', str(quiz.id), stdout=io.StringIO())
+        self.assertEqual(list(quiz.questions.values_list('text', flat=True)), ['Already here'])
+        self.assertEqual(QuizStats.objects.get(quiz=quiz).question_count, 1)
+        self.assertEqual(find_drift(), [])
+
+
+class ExamPaperTests(TestCase):
+    """Cached exam papers: a stable option order per attempt, a different one per student, fresh after edits."""
+
+    def setUp(self):
+        cache.clear()
+        answer_cache.reset_local_cache()
+        teacher = User.objects.create_user('teacher', password='x', is_teacher=True)
+        self.quiz = Quiz.objects.create(title='Quiz', creator=teacher, time_limit_minutes=10, shuffle_options=True)
+        for q in range(3):
+            question = Question.objects.create(quiz=self.quiz, text=f'Question {q}')
+            for o in range(6):
+                Option.objects.create(question=question, text=f'Option {q}.{o}', is_correct=o == 0)
+        self.option_ids = list(Option.objects.filter(question__quiz=self.quiz).values_list('id', flat=True))
+
+    def take(self, username):
+        student = User.objects.get_or_create(username=username, defaults={'is_student': True})[0]
+        self.client.force_login(student)
+        response = self.client.get(f'/student/quiz/{self.quiz.id}/take/')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def option_order(self, html):
+        return [int(value) for value in re.findall(r'name="question_\d+" value="(\d+)"', html)]
+
+    def test_an_attempt_keeps_its_option_order_across_renders(self):
+        first = self.option_order(self.take('student'))
+        self.assertCountEqual(first, self.option_ids)
+        self.assertEqual(self.option_order(self.take('student')), first)
+
+        # Re-rendered from scratch, the seed stored on the attempt gives the same order
+        cache.clear()
+        answer_cache.reset_local_cache()
+        attempt = ExamAttempt.objects.get(student__username='student')
+        self.assertEqual(self.option_order(exam_paper_html(self.quiz, attempt)), first)
+
+    def test_students_get_different_option_orders(self):
+        orders = [self.option_order(self.take(f'student{n}')) for n in range(3)]
+        for order in orders:
+            self.assertCountEqual(order, self.option_ids)
+        # Three questions of six options: the chance of two identical papers is 1 in 720 ** 3
+        self.assertEqual(len({tuple(order) for order in orders}), 3)
+
+        self.quiz.shuffle_options = False
+        self.quiz.save()
+        attempt = ExamAttempt.objects.get(student__username='student0')
+        self.assertEqual(self.option_order(exam_paper_html(self.quiz, attempt)), self.option_ids)
+
+    def test_editing_a_question_rerenders_its_fragment(self):
+        before = self.take('student')
+        self.assertIn('Question 1', before)
+        question = self.quiz.questions.get(text='Question 1')
+        with self.captureOnCommitCallbacks(execute=True):
+            question.text = 'Question 1, revised'
+            question.save()
+            option = question.options.get(text='Option 1.3')
+            option.text = 'Option 1.3, revised'
+            option.save()
+
+        after = self.take('student')
+        self.assertIn('Question 1, revised', after)
+        self.assertIn('Option 1.3, revised', after)
+        self.assertEqual(self.option_order(after), self.option_order(before))
+        self.assertEqual(get_paper(self.quiz.id).fragments[question.id].before_options.count('revised'), 1)
+
+
+class SampledGradingTests(TestCase):
+    """Sampled quizzes are graded and analysed on each student's own paper."""
+
+    def setUp(self):
+        # Quiz versions only bump on commit, which never happens inside a TestCase
+        cache.clear()
+        answer_cache.reset_local_cache()
+        teacher = User.objects.create_user('teacher', password='x', is_teacher=True)
+        self.student = User.objects.create_user('student', password='x', is_student=True)
+        self.quiz = Quiz.objects.create(title='Pool', creator=teacher, time_limit_minutes=10, questions_per_attempt=2)
+        self.correct = {}
+        for q in range(6):
+            question = Question.objects.create(quiz=self.quiz, text=f'Question {q}')
+            self.correct[question.id] = Option.objects.create(question=question, text='Right', is_correct=True).id
+            Option.objects.create(question=question, text='Wrong', is_correct=False)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_attempt_key_covers_only_the_served_questions(self):
+        attempt = start_attempt(self.student, self.quiz)
+        with CaptureQueriesContext(connection) as queries:
+            answer_key = attempt_answer_key(attempt)
+        self.assertEqual(answer_key.question_ids, attempt.selected_question_ids)
+        self.assertEqual(set(answer_key.option_question.values()), set(attempt.selected_question_ids))
+        self.assertEqual(
+            {option_id for question_id in answer_key.question_ids for option_id in answer_key.correct[question_id]},
+            {self.correct[question_id] for question_id in attempt.selected_question_ids},
+        )
+        # Only the paper's questions are loaded, and then served from the cache
+        key_queries = [query['sql'] for query in queries if 'core_question' in query['sql']]
+        self.assertEqual(len(key_queries), 1)
+        self.assertIn(' IN (', key_queries[0])
+        with self.assertNumQueries(0):
+            self.assertEqual(attempt_answer_key(attempt), answer_key)
+        self.assertEqual(get_answer_key(self.quiz.id).total_questions, 6)
+
+    def test_api_result_is_graded_on_the_served_paper(self):
+        response = self.client.post('/api/results/', {'quiz': self.quiz.id, 'answers': {}}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        served = start_attempt(self.student, self.quiz).selected_question_ids
+        answers = {str(question_id): self.correct[question_id] for question_id in served}
+        response = self.client.post('/api/results/', {'quiz': self.quiz.id, 'answers': answers}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['score'], 100)
+
+    def test_analysis_counts_only_served_questions(self):
+        attempt = start_attempt(self.student, self.quiz)
+        served = attempt.selected_question_ids
+        result = submit_attempt(attempt, {served[0]: self.correct[served[0]]})
+        self.assertEqual(result.score, 50)
+
+        report = build_report(self.quiz.id)
+        self.assertEqual(report['mean_score'], 50)
+        self.assertIsNone(report['kr20'])
+        questions = {question['id']: question for question in report['questions']}
+        self.assertEqual(questions[served[0]]['p_value'], 1)
+        self.assertEqual(questions[served[1]]['p_value'], 0)
+        self.assertEqual(questions[served[1]]['omitted'], 1)
+        unserved = next(question for question_id, question in questions.items() if question_id not in served)
+        self.assertIsNone(unserved['p_value'])
+        self.assertEqual(unserved['omitted'], 0)
+
+
+class ExamFlowTests(TestCase):
+    """Answers are autosaved while the exam runs and sealed on submission."""
+
+    def setUp(self):
+        cache.clear()
+        answer_cache.reset_local_cache()
+        teacher = User.objects.create_user('teacher', password='x', is_teacher=True)
+        self.student = User.objects.create_user('student', password='x', is_student=True)
+        self.quiz = Quiz.objects.create(title='Exam', creator=teacher, time_limit_minutes=10)
+        self.questions = []
+        for q in range(2):
+            question = Question.objects.create(quiz=self.quiz, text=f'Question {q}')
+            right = Option.objects.create(question=question, text='Right', is_correct=True)
+            Option.objects.create(question=question, text='Wrong', is_correct=False)
+            self.questions.append((question.id, right.id))
+        self.client.force_login(self.student)
+
+    def autosave(self, question_id, option_id):
+        return self.client.post(
+            f'/student/quiz/{self.quiz.id}/autosave/',
+            json.dumps({'question_id': question_id, 'option_id': option_id}),
+            content_type='application/json',
+        )
+
+    def test_autosave_then_submit(self):
+        (first, first_right), (second, second_right) = self.questions
+        self.assertEqual(self.client.get(f'/student/quiz/{self.quiz.id}/take/').status_code, 200)
+        self.assertEqual(self.autosave(first, first_right).json()['saved'], True)
+        self.assertEqual(self.autosave(second, first_right).status_code, 400)
+
+        # The final POST fills in what autosave missed
+        response = self.client.post(f'/student/quiz/{self.quiz.id}/take/', {f'question_{second}': second_right})
+        result = Result.objects.get(student=self.student, quiz=self.quiz)
+        self.assertRedirects(response, f'/student/result/{result.id}/')
+        self.assertEqual(result.score, 100)
+        self.assertEqual(
+            sorted(result.answers.values_list('question_id', 'is_correct')),
+            [(first, True), (second, True)],
+        )
+
+        self.assertEqual(self.autosave(first, first_right).status_code, 409)
+        self.assertEqual(submit_attempt(ExamAttempt.objects.get()), result)
+
+    def test_save_after_submit_on_a_stale_attempt_is_rejected(self):
+        question_id, option_id = self.questions[0]
+        attempt = start_attempt(self.student, self.quiz)
+        stale = ExamAttempt.objects.get(pk=attempt.pk)
+        submit_attempt(attempt)
+        with self.assertRaises(AttemptClosed):
+            save_answer(stale, question_id, option_id)
+        self.assertFalse(AttemptAnswer.objects.exists())
@@ -24,10 +24,16 @@ urlpatterns = [
     path('teacher/dashboard/', views.teacher_dashboard, name='teacher_dashboard'),
     path('teacher/quiz/create/', views.create_quiz, name='create_quiz'),
     path('teacher/quiz/generate-ai/', views.generate_quiz_ai, name='generate_quiz_ai'),
+    path('teacher/jobs/<int:job_id>/', views.generation_job, name='generation_job'),
+    path('teacher/jobs/<int:job_id>/status/', views.generation_job_status, name='generation_job_status'),
     
     # ALABI'S NOTE: Added the new URL for our formset page.
     path('teacher/quiz/<int:quiz_id>/add-question/', views.add_question_to_quiz, name='add_question'),
     path('teacher/search-quizzes/', views.search_quizzes, name='search_quizzes'),
+    path('teacher/quiz/<int:quiz_id>/question-bank/', views.question_bank, name='question_bank'),
+    path('teacher/quiz/<int:quiz_id>/reuse-questions/', views.reuse_questions, name='reuse_questions'),
+    path('teacher/quiz/<int:quiz_id>/analysis/', views.quiz_analysis, name='quiz_analysis'),
+    path('teacher/results/export/', views.export_results, name='export_results'),
     
     # ALABI'S NOTE: Corrected this URL to pass the result_id, which the view now requires.
     path('student/result/<int:result_id>/', views.quiz_result, name='quiz_result'),
@@ -36,4 +42,8 @@ urlpatterns = [
     # --- Student URLs (Added Missing Routes) ---
     path('student/dashboard/', views.student_dashboard, name='student_dashboard'),
     path('student/quiz/<int:quiz_id>/take/', views.take_quiz, name='take_quiz'),
+    path('student/quiz/<int:quiz_id>/autosave/', views.autosave_answer, name='autosave_answer'),
+
+    # --- Operations ---
+    path('metrics/', views.metrics, name='metrics'),
 ]
\ No newline at end of file
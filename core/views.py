@@ -1,12 +1,22 @@
 # Alabi's Note: I have cleaned up and organized all your imports here.
-from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
+from django.urls import reverse
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_POST
 from django.contrib import messages
-from django.db.models import Count, Sum
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import Coalesce
 from django.core.paginator import Paginator
+from django.utils.crypto import constant_time_compare
+from . import metrics as perf_metrics
 from .decorators import student_required, teacher_required
-from .models import Quiz, Question, Result, Option, User
+from .models import Quiz, Question, Result, ExamAttempt, BackgroundJob, TeacherStats, SearchDocument
 from .forms import (
     StudentRegistrationForm, 
     TeacherRegistrationForm, 
@@ -16,9 +26,22 @@ from .forms import (
     QuestionForm, 
     OptionFormSet
 )
-from .ai_utils import generate_quiz_content, get_ai_explanation
+from .ai_utils import aget_ai_explanation
+from .analytics import get_report
+from .answer_cache import get_question_payload, get_question_subset
+from .exams import AttemptClosed, InvalidAnswer, save_answer, saved_answers, start_attempt, submit_attempt
+from .exports import export_response, parse_filters, teacher_results
+from .grading import answers_from_post
+from .ingestion import copy_questions
+from .jobs import enqueue
+from .pagination import keyset_page
+from .paper import exam_paper_html
+from .rationales import has_usable_rationale, is_usable_explanation
+from .search import in_order, search
 from .models import Subject
 
+STUDENT_DASHBOARD_PAGE_SIZE = 20
+
 
 # --- General and Registration Views ---
 
@@ -58,17 +81,18 @@ def dashboard(request):
 
 # --- Teacher-Specific Views ---
 
+def with_question_counts(quizzes):
+    return quizzes.annotate(question_count=Coalesce('stats__question_count', 0))
+
+
 @login_required
 @teacher_required
 def teacher_dashboard(request):
-    quizzes_list = Quiz.objects.filter(creator=request.user)
-    quizzes_with_counts = quizzes_list.annotate(question_count=Count('questions'))
-
-    stats = quizzes_with_counts.aggregate(
-        total_quizzes=Count('id'),
-        total_questions=Sum('question_count'),
-        total_results=Count('results') 
+    # Counters are materialised in QuizStats/TeacherStats (see core.stats)
+    quizzes_with_counts = with_question_counts(
+        Quiz.objects.filter(creator=request.user).order_by('-created_at', '-id')
     )
+    stats = TeacherStats.objects.filter(teacher=request.user).first()
 
     paginator = Paginator(quizzes_with_counts, 10)
     page_number = request.GET.get('page')
@@ -76,9 +100,9 @@ def teacher_dashboard(request):
 
     context = {
         'quizzes': quizzes_page,
-        'total_quizzes': stats.get('total_quizzes', 0),
-        'total_questions': stats.get('total_questions', 0),
-        'total_results': stats.get('total_results', 0),
+        'total_quizzes': stats.quiz_count if stats else 0,
+        'total_questions': stats.question_count if stats else 0,
+        'total_results': stats.attempt_count if stats else 0,
     }
     return render(request, 'core/teacher/dashboard.html', context)
 
@@ -100,58 +124,78 @@ def create_quiz(request):
     return render(request, 'core/teacher/create_quiz.html', {'form': form})
 
 
+def requested_question_count(value):
+    """The posted question count, capped at AI_GENERATION_MAX_QUESTIONS; None unless a positive integer."""
+    try:
+        count = int(value)
+    except (TypeError, ValueError):
+        return None
+    if count < 1:
+        return None
+    return min(count, settings.AI_GENERATION_MAX_QUESTIONS)
+
 # Alabi's Note: Here is the NEW view, placed logically with other quiz management views.
+# Async: under ASGI it holds no worker thread; the ORM and job queue calls are awaited.
 @login_required
 @teacher_required
-def generate_quiz_ai(request):
+async def generate_quiz_ai(request):
     if request.method == 'POST':
-        topic = request.POST.get('topic')
-        subject_name = request.POST.get('subject') # Text input or select
+        topic = (request.POST.get('topic') or '').strip()
+        subject_name = (request.POST.get('subject') or '').strip() # Text input or select
         difficulty = request.POST.get('difficulty', 'medium')
-        num_questions = int(request.POST.get('num_questions', 5))
+        # Every chunk of questions is a Gemini call, so the count is bounded before anything is queued
+        num_questions = requested_question_count(request.POST.get('num_questions', 5))
+        if num_questions is None or not topic or not subject_name:
+            error = 'Enter a topic, a subject and a number of questions.'
+            if request.headers.get('Accept') == 'application/json':
+                return JsonResponse({'error': error}, status=400)
+            messages.error(request, error)
+            return redirect('generate_quiz_ai')
         
         # Ensure subject exists or create it
-        subject, created = Subject.objects.get_or_create(name=subject_name)
+        subject, created = await Subject.objects.aget_or_create(name=subject_name)
         
-        # Call AI
-        ai_data, error = generate_quiz_content(subject.name, topic, num_questions, difficulty)
+        # Generation runs on the background worker so this request returns immediately
+        job = await sync_to_async(enqueue)('generate_quiz', {
+            'subject_id': subject.id,
+            'topic': topic,
+            'difficulty': difficulty,
+            'num_questions': num_questions,
+        }, user=await request.auser())
         
-        if ai_data:
-            # Create Quiz
-            quiz = Quiz.objects.create(
-                title=f"AI Quiz: {topic} ({difficulty})",
-                subject=subject,
-                subject_text=subject.name,
-                creator=request.user,
-                time_limit_minutes=num_questions * 2 # 2 mins per question default
-            )
-            
-            # Create Questions and Options
-            for q_data in ai_data:
-                question = Question.objects.create(
-                    quiz=quiz,
-                    text=q_data['text'],
-                    difficulty=difficulty,
-                    topic=topic,
-                    rationale=q_data.get('rationale', '')
-                )
-                
-                options = q_data['options'] # List of 4 strings
-                correct_idx = q_data['correct_index']
-                
-                for i, opt_text in enumerate(options):
-                    Option.objects.create(
-                        question=question,
-                        text=opt_text,
-                        is_correct=(i == correct_idx)
-                    )
-            
-            messages.success(request, f'Successfully generated quiz "{quiz.title}" with {len(ai_data)} questions!')
-            return redirect('teacher_dashboard')
-        else:
-            messages.error(request, f'Failed to generate quiz: {error}')
+        if request.headers.get('Accept') == 'application/json':
+            return JsonResponse(job_status_payload(job), status=202)
+        return redirect('generation_job', job_id=job.id)
     
-    return render(request, 'core/teacher/generate_quiz_ai.html')
+    # Template rendering reads request.user, so it runs in a thread
+    return await sync_to_async(render)(request, 'core/teacher/generate_quiz_ai.html')
+
+def job_status_payload(job):
+    data = {
+        'id': job.id,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'error': job.error,
+        'finished': job.is_finished,
+    }
+    if job.status == BackgroundJob.STATUS_SUCCEEDED and job.result:
+        data['result'] = job.result
+        data['redirect_url'] = reverse('teacher_dashboard')
+    return data
+
+@login_required
+@teacher_required
+def generation_job(request, job_id):
+    job = get_object_or_404(BackgroundJob, id=job_id, created_by=request.user)
+    return render(request, 'core/teacher/generation_job.html', {'job': job})
+
+@login_required
+@teacher_required
+def generation_job_status(request, job_id):
+    """Polled by the progress page until the job finishes."""
+    job = get_object_or_404(BackgroundJob, id=job_id, created_by=request.user)
+    return JsonResponse(job_status_payload(job))
 
 @login_required
 @teacher_required
@@ -185,15 +229,43 @@ def add_question_to_quiz(request, quiz_id):
     return render(request, 'core/add_question.html', context)
 
 
+@login_required
+@teacher_required
+def quiz_analysis(request, quiz_id):
+    quiz = get_object_or_404(Quiz, id=quiz_id, creator=request.user)
+    return render(request, 'core/teacher/quiz_analysis.html', {
+        'quiz': quiz,
+        'report': get_report(quiz.id),
+    })
+
+
+@login_required
+@teacher_required
+def export_results(request):
+    """Streams the teacher's results (or per-question answers with ?answers=1) as CSV or XLSX."""
+    try:
+        filters = parse_filters(request.GET)
+        results = teacher_results(request.user, **filters)
+        return export_response(
+            results,
+            file_format=request.GET.get('type', 'csv'),
+            answers=request.GET.get('answers') in ('1', 'true'),
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
 @login_required
 @teacher_required
 def search_quizzes(request):
     search_text = request.GET.get('q', '').strip()
 
-    quizzes_list = Quiz.objects.filter(
-        creator=request.user,
-        title__icontains=search_text
-    ).annotate(question_count=Count('questions'))
+    if search_text:
+        # Ranked full-text matches on title and subject (core.search)
+        page = search(search_text, SearchDocument.KIND_QUIZ, creator_id=request.user.id, page_size=50)
+        quizzes_list = in_order(with_question_counts(Quiz.objects.all()), page.object_ids)
+    else:
+        quizzes_list = with_question_counts(Quiz.objects.filter(creator=request.user)).order_by('-created_at', '-id')
 
     # We don't need the full stats here, just the quizzes
     context = {
@@ -202,69 +274,173 @@ def search_quizzes(request):
     return render(request, 'core/teacher/partials/quiz_list_partial.html', context)
 
 
+@login_required
+@teacher_required
+def question_bank(request, quiz_id):
+    """
+    Searches the teacher's own questions (outside this quiz) that can be reused
+    in it. Other teachers' questions are never listed: the results include the
+    correct options, and those quizzes may be live exams.
+    """
+    quiz = get_object_or_404(Quiz, id=quiz_id, creator=request.user)
+    try:
+        page_number = int(request.GET.get('page', 1))
+    except ValueError:
+        page_number = 1
+    page = search(
+        request.GET.get('q', ''), SearchDocument.KIND_QUESTION,
+        creator_id=request.user.id, exclude_quiz_id=quiz.id, page=page_number,
+    )
+    questions = in_order(Question.objects.select_related('quiz').prefetch_related('options'), page.object_ids)
+    return JsonResponse({
+        'results': [
+            {
+                'id': question.id,
+                'text': question.text,
+                'topic': question.topic,
+                'difficulty': question.difficulty,
+                'quiz': question.quiz.title,
+                'options': [
+                    {'text': option.text, 'is_correct': option.is_correct}
+                    for option in question.options.all()
+                ],
+            }
+            for question in questions
+        ],
+        'page': page.page,
+        'has_next': page.has_next,
+    })
+
+
+@login_required
+@teacher_required
+@require_POST
+def reuse_questions(request, quiz_id):
+    """Copies the posted question_id(s) from the teacher's question bank into the quiz."""
+    quiz = get_object_or_404(Quiz, id=quiz_id, creator=request.user)
+    try:
+        question_ids = {int(value) for value in request.POST.getlist('question_id')}
+    except ValueError:
+        return JsonResponse({'error': 'Invalid question id.'}, status=400)
+    if not question_ids:
+        return JsonResponse({'error': 'No questions selected.'}, status=400)
+    owned = Question.objects.filter(id__in=question_ids, quiz__creator=request.user).count()
+    if owned != len(question_ids):
+        # Someone else's question, or no such question: the same answer for both
+        return JsonResponse({'error': 'Question not found.'}, status=404)
+    with transaction.atomic():
+        added = copy_questions(quiz, question_ids)
+    return JsonResponse({'added': added})
+
+
 # --- Student-Specific Views ---
 
 @login_required
 @student_required
 def student_dashboard(request):
-    quizzes = Quiz.objects.all() # Consider filtering for only 'active' quizzes
-    # Get results for quizzes the student has already taken
-    taken_quiz_ids = Result.objects.filter(student=request.user).values_list('quiz_id', flat=True)
+    quizzes = Quiz.objects.select_related('subject').annotate(
+        # Taken-status is computed in SQL (uses the result_student_quiz index)
+        taken=Exists(Result.objects.filter(student=request.user, quiz=OuterRef('pk')))
+    ) # Consider filtering for only 'active' quizzes
+    
+    subject_id = request.GET.get('subject')
+    if subject_id and subject_id.isdigit():
+        quizzes = quizzes.filter(subject_id=subject_id)
+    else:
+        subject_id = None
+    
+    page = keyset_page(quizzes, request.GET.get('cursor'), page_size=STUDENT_DASHBOARD_PAGE_SIZE)
+    results = Result.objects.filter(student=request.user).select_related('quiz').order_by('-completed_on')[:5]
     return render(request, 'core/student/dashboard.html', {
-        'quizzes': quizzes,
-        'taken_quiz_ids': taken_quiz_ids
+        'quizzes': page.items,
+        'page': page,
+        'is_first_page': not request.GET.get('cursor'),
+        'subjects': Subject.objects.order_by('name'),
+        'selected_subject': int(subject_id) if subject_id else None,
+        'results': results,
     })
 
 @login_required
 @student_required
 def take_quiz(request, quiz_id):
     quiz = get_object_or_404(Quiz, id=quiz_id)
-    questions = quiz.questions.prefetch_related('options') # More efficient
     
-    if Result.objects.filter(student=request.user, quiz=quiz).exists():
+    result = Result.objects.filter(student=request.user, quiz=quiz).first()
+    if result:
         messages.warning(request, 'You have already completed this quiz.')
-        # Assuming you have a result detail page
-        result = Result.objects.get(student=request.user, quiz=quiz)
         return redirect('quiz_result', result_id=result.id)
     
+    # The deadline lives on the server; reloading the page does not reset it
+    attempt = start_attempt(request.user, quiz)
+    
     if request.method == 'POST':
-        score = 0
-        total_questions = questions.count()
-        
-        for question in questions:
-            selected_option_id = request.POST.get(f'question_{question.id}')
-            if selected_option_id:
-                try:
-                    # Alabi's Note: CRITICAL FIX HERE!
-                    # We now check the selected option's 'is_correct' field.
-                    selected_option = Option.objects.get(id=selected_option_id)
-                    if selected_option.is_correct:
-                        score += 1
-                except Option.DoesNotExist:
-                    # Handle case where a user submits an invalid option ID
-                    pass
-        
-        percentage_score = (score / total_questions) * 100 if total_questions > 0 else 0
-        
-        result = Result.objects.create(
-            student=request.user,
-            quiz=quiz,
-            score=percentage_score
-        )
-        
+        # Answers were autosaved as the student went; this grades and seals them,
+        # taking any posted answers that did not make it through autosave.
+        result = submit_attempt(attempt, answers_from_post(request.POST))
+        return redirect('quiz_result', result_id=result.id)
+    
+    if not attempt.accepts_answers(settings.EXAM_SUBMIT_GRACE_SECONDS):
+        messages.warning(request, 'Time is up. Your saved answers have been submitted.')
+        result = submit_attempt(attempt)
         return redirect('quiz_result', result_id=result.id)
     
     return render(request, 'core/student/take_quiz.html', {
         'quiz': quiz,
-        'questions': questions
+        # Question markup comes pre-rendered from the cache (core.paper)
+        'paper': exam_paper_html(quiz, attempt),
+        'seconds_remaining': attempt.seconds_remaining(),
+        'saved_answers': saved_answers(attempt),
     })
 
+@login_required
+@student_required
+@require_POST
+def autosave_answer(request, quiz_id):
+    """Upserts a single answer for the student's open attempt. Accepts JSON or form data."""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    else:
+        data = request.POST
+
+    try:
+        question_id = int(data.get('question_id'))
+        option_id = int(data.get('option_id'))
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'question_id and option_id are required'}, status=400)
+
+    attempt = ExamAttempt.objects.filter(student=request.user, quiz_id=quiz_id).first()
+    if attempt is None:
+        return JsonResponse({'error': 'No exam in progress'}, status=404)
+
+    try:
+        save_answer(attempt, question_id, option_id)
+    except AttemptClosed as e:
+        return JsonResponse({'error': str(e)}, status=409)
+    except InvalidAnswer as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({'saved': True, 'seconds_remaining': attempt.seconds_remaining()})
+
 @login_required
 @student_required
 def quiz_result(request, result_id):
-    result = get_object_or_404(Result, id=result_id, student=request.user)
+    result = get_object_or_404(Result.objects.select_related('quiz', 'attempt'), id=result_id, student=request.user)
     quiz = result.quiz
     score = result.score
+
+    # Shared question payload (cached per quiz version) plus this attempt's picks;
+    # sampled attempts load only the questions they were given
+    attempt = getattr(result, 'attempt', None)
+    question_ids = attempt.selected_question_ids if attempt else None
+    payload = get_question_payload(quiz.id) if question_ids is None else get_question_subset(quiz.id, question_ids)
+    selected = dict(result.answers.values_list('question_id', 'option_id'))
+    questions = [
+        {**question, 'selected_option_id': selected.get(question['id'])}
+        for question in payload
+    ]
     
     if score >= 70:
         performance = {"status": "success", "message": "Excellent Performance!", "color_hex": "#4CAF50"}
@@ -277,35 +453,58 @@ def quiz_result(request, result_id):
         'quiz': quiz,
         'result': result,
         'performance': performance,
-        'questions': quiz.questions.prefetch_related('options') # Add questions to context
+        'questions': questions,
     }
     # Alabi's Note: Corrected the template path
     return render(request, 'core/student/quiz_result.html', context)
 
 @login_required
-def get_explanation_ai(request):
+async def get_explanation_ai(request):
+    """
+    Async, so under ASGI a slow Gemini call waits on the event loop rather
+    than holding a worker thread; the ORM calls use Django's async API.
+    """
     if request.method == 'GET':
         question_id = request.GET.get('question_id')
-        question = get_object_or_404(Question, id=question_id)
+        question = await aget_object_or_404(Question, id=question_id)
+        
+        # Check if we already have a rationale (human wrote it, AI generated it previously
+        # or the warm_rationales job filled it in ahead of the exam)
+        if has_usable_rationale(question.rationale):
+            return JsonResponse({'explanation': question.rationale, 'source': 'database'})
         
         # Find correct option
-        correct_option = question.options.filter(is_correct=True).first()
+        correct_option = await question.options.filter(is_correct=True).afirst()
         correct_text = correct_option.text if correct_option else "Unknown"
-        
-        # Check if we already have a rationale (human wrote it or AI generated it previously)
-        if question.rationale and len(question.rationale) > 10:
-            return JsonResponse({'explanation': question.rationale, 'source': 'database'})
             
         # Call AI
-        explanation, error = get_ai_explanation(question.text, correct_text)
+        explanation, error = await aget_ai_explanation(question.text, correct_text)
         
         if error:
             # Optionally save it to DB so we don't pay for it again!
              return JsonResponse({'error': error})
 
-        if explanation and "Could not" not in explanation:
+        if is_usable_explanation(explanation):
             question.rationale = explanation
-            question.save()
+            await question.asave()
             
         return JsonResponse({'explanation': explanation, 'source': 'ai'})
-    return JsonResponse({'error': 'Invalid request'}, status=400)
\ No newline at end of file
+    return JsonResponse({'error': 'Invalid request'}, status=400)
+
+
+# --- Operations ---
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint for this process's request, query, cache and
+    AI metrics (core.metrics). Staff only, or a scraper sending
+    "Authorization: Bearer <METRICS_TOKEN>".
+    """
+    token = settings.METRICS_TOKEN
+    auth = request.headers.get('Authorization', '')
+    authorized = request.user.is_authenticated and request.user.is_staff
+    if not authorized and token and auth.startswith('Bearer '):
+        authorized = constant_time_compare(auth[len('Bearer '):], token)
+    if not authorized:
+        return HttpResponseForbidden("You don't have permission to access this page.")
+    return HttpResponse(perf_metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,28 @@
+"""
+ASGI config for prep_cbt project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Served by uvicorn when APP_SERVER=asgi (see build.sh); the AI views are
+async, so slow Gemini calls wait on the event loop instead of holding a
+worker thread.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+"""
+
+import os
+import time
+
+_started = time.perf_counter()
+
+from django.core.asgi import get_asgi_application  # noqa: E402
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'prep_cbt.settings')
+
+application = get_asgi_application()
+
+# Warm the URL resolver, templates and hot answer keys before serving (core.startup).
+# Each uvicorn worker runs it on import, before it accepts connections.
+from core.startup import warm_up  # noqa: E402
+
+warm_up('asgi', time.perf_counter() - _started)
@@ -34,9 +34,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the whole stack (core.metrics / core.profiling)
+    'core.middleware.PerformanceMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoise, made async-capable so async views stay on the event loop under ASGI
+    'core.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -70,9 +73,17 @@ import dj_database_url
 DATABASES = {
     'default': dj_database_url.config(
         default=f'sqlite:///{BASE_DIR / "db.sqlite3"}',
-        conn_max_age=600
+        # Use 0 under ASGI: persistent connections belong to threads, which ASGI does not reuse per request
+        conn_max_age=int(os.getenv('CONN_MAX_AGE', 600))
     )
 }
+# SQLite: take the write lock at BEGIN and wait for it, so concurrent submissions queue
+# instead of failing with "database is locked" when a read transaction tries to write
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default'].setdefault('OPTIONS', {}).update({
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 20)),
+    })
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -100,7 +111,97 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache Configuration
+# Local memory by default; set CACHE_BACKEND/CACHE_LOCATION for a shared backend in production.
+# Invalidation goes through this cache, so with more than one process (web workers or the run_jobs
+# worker) it must be shared: check --deploy fails otherwise (core.checks).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'prepcbt'),
+    }
+}
+
+# Web worker processes (gunicorn and uvicorn read the same variable)
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+
+# Sessions are read from the cache and written through to the database; request.user comes from
+# the cache too (core.auth_backends.CachedModelBackend), for at most USER_CACHE_TIMEOUT seconds
+SESSION_ENGINE = os.getenv('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+AUTHENTICATION_BACKENDS = ['core.auth_backends.CachedModelBackend']
+USER_CACHE_TIMEOUT = int(os.getenv('USER_CACHE_TIMEOUT', 300))
+
+# Answer key / question payload cache (core.answer_cache)
+QUIZ_CACHE_LOCAL_SIZE = int(os.getenv('QUIZ_CACHE_LOCAL_SIZE', 128))
+QUIZ_CACHE_TIMEOUT = int(os.getenv('QUIZ_CACHE_TIMEOUT', 60 * 60))
+
+# Conditional GET for quiz content (core.conditional): log the hit ratio every N requests
+CONDITIONAL_LOG_EVERY = int(os.getenv('CONDITIONAL_LOG_EVERY', 100))
+
+# Seconds past an exam deadline during which autosaves and the final submit are still accepted
+EXAM_SUBMIT_GRACE_SECONDS = int(os.getenv('EXAM_SUBMIT_GRACE_SECONDS', 30))
+
+# Background jobs (core.jobs). When eager, jobs run inside the request instead of the run_jobs worker.
+BACKGROUND_JOBS_EAGER = os.getenv('BACKGROUND_JOBS_EAGER', '') == '1'
+
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
+GEMINI_API_URL = os.getenv(
+    'GEMINI_API_URL',
+    'https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent',
+)
+
+# Gemini HTTP client (core.ai_client): pooled connections, retries with backoff, circuit breaker
+GEMINI_CONNECT_TIMEOUT = float(os.getenv('GEMINI_CONNECT_TIMEOUT', 5))
+GEMINI_READ_TIMEOUT = float(os.getenv('GEMINI_READ_TIMEOUT', 30))
+GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', 2))
+GEMINI_BACKOFF_BASE = float(os.getenv('GEMINI_BACKOFF_BASE', 0.5))
+GEMINI_BACKOFF_MAX = float(os.getenv('GEMINI_BACKOFF_MAX', 8))
+GEMINI_POOL_SIZE = int(os.getenv('GEMINI_POOL_SIZE', 10))
+GEMINI_BREAKER_THRESHOLD = int(os.getenv('GEMINI_BREAKER_THRESHOLD', 5))
+GEMINI_BREAKER_RESET = float(os.getenv('GEMINI_BREAKER_RESET', 30))
+# Async client (core.ai_client.AsyncGeminiClient): calls in flight per process
+GEMINI_ASYNC_CONCURRENCY = int(os.getenv('GEMINI_ASYNC_CONCURRENCY', 100))
+
+# Prompt-hash AI response cache (core.ai_cache)
+AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', 7 * 24 * 60 * 60))
+AI_CACHE_LOCAL_SIZE = int(os.getenv('AI_CACHE_LOCAL_SIZE', 256))
+AI_CACHE_LOCK_TIMEOUT = int(os.getenv('AI_CACHE_LOCK_TIMEOUT', 60))
+
+# Rationale warm-up (core.rationales / warm_rationales command): parallel calls and calls per second
+RATIONALE_WARMUP_CONCURRENCY = int(os.getenv('RATIONALE_WARMUP_CONCURRENCY', 4))
+RATIONALE_WARMUP_RATE = float(os.getenv('RATIONALE_WARMUP_RATE', 2))
+
+# Near-duplicate questions on ingestion (core.dedup): skip, flag (Question.duplicate_of) or keep.
+# Threshold is the estimated Jaccard similarity of 3-word shingles; indexes are rebuilt after TTL seconds.
+QUESTION_DEDUP_MODE = os.getenv('QUESTION_DEDUP_MODE', 'skip')
+DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', 0.8))
+DEDUP_INDEX_TTL = int(os.getenv('DEDUP_INDEX_TTL', 600))
+
+# Large AI quizzes are generated in concurrent chunks (core.ai_utils.generate_quiz_content)
+AI_GENERATION_CHUNK_SIZE = int(os.getenv('AI_GENERATION_CHUNK_SIZE', 10))
+AI_GENERATION_CONCURRENCY = int(os.getenv('AI_GENERATION_CONCURRENCY', 4))
+AI_GENERATION_RETRIES = int(os.getenv('AI_GENERATION_RETRIES', 2))
+# Upper bound on questions per generation request (each chunk is a Gemini call)
+AI_GENERATION_MAX_QUESTIONS = int(os.getenv('AI_GENERATION_MAX_QUESTIONS', 50))
+
+# Per-request metrics (core.metrics): one JSON line per request on the core.perf logger at INFO,
+# off by default (PERF_LOG_LEVEL=INFO turns it on); /metrics/ serves Prometheus text to staff or this bearer token.
+PERF_LOG_LEVEL = os.getenv('PERF_LOG_LEVEL', 'WARNING')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Slow-request profiling (core.profiling): off unless PERF_PROFILE_VIEWS names views (comma-separated URL names).
+# Mode 'cprofile' writes .prof/.txt, 'sample' a folded-stack file for flame graphs.
+PERF_PROFILE_VIEWS = os.getenv('PERF_PROFILE_VIEWS', '')
+PERF_PROFILE_MODE = os.getenv('PERF_PROFILE_MODE', 'cprofile')
+PERF_PROFILE_SAMPLE_RATE = float(os.getenv('PERF_PROFILE_SAMPLE_RATE', 0.1))
+PERF_PROFILE_THRESHOLD_MS = int(os.getenv('PERF_PROFILE_THRESHOLD_MS', 500))
+PERF_PROFILE_INTERVAL_MS = float(os.getenv('PERF_PROFILE_INTERVAL_MS', 5))
+PERF_PROFILE_DIR = os.getenv('PERF_PROFILE_DIR', str(BASE_DIR / 'profiles'))
+
+# Worker start-up (core.startup): warm the URL resolver, templates and the answer keys of the
+# STARTUP_WARMUP_QUIZZES hottest quizzes when the WSGI/ASGI application is built
+STARTUP_WARMUP = os.getenv('STARTUP_WARMUP', '1') == '1'
+STARTUP_WARMUP_QUIZZES = int(os.getenv('STARTUP_WARMUP_QUIZZES', 10))
 
 # Custom user model
 AUTH_USER_MODEL = 'core.User'
@@ -115,6 +216,24 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.ApiCursorPagination',
+    'PAGE_SIZE': int(os.getenv('API_PAGE_SIZE', '20')),
+}
+
+# Logging: app loggers (core.*) to the console at LOG_LEVEL
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'core': {'handlers': ['console'], 'level': os.getenv('LOG_LEVEL', 'INFO')},
+        'core.perf': {'level': PERF_LOG_LEVEL},
+    },
 }
 
 # CORS Configuration
@@ -8,9 +8,18 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/wsgi/
 """
 
 import os
+import time
 
-from django.core.wsgi import get_wsgi_application
+_started = time.perf_counter()
+
+from django.core.wsgi import get_wsgi_application  # noqa: E402
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'prep_cbt.settings')
 
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+# Warm the URL resolver, templates and hot answer keys before serving (core.startup).
+# Under gunicorn --preload this runs once in the master, before the workers fork.
+from core.startup import warm_up  # noqa: E402
+
+warm_up('wsgi', time.perf_counter() - _started)